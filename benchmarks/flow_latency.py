@@ -0,0 +1,278 @@
+"""End-to-end latency benchmark for TransportationSystemFlow.
+
+Starts a stub Ollama server, replays scripted Spanish conversations through
+the conversation service at several concurrency levels, and reports
+p50/p95/p99 per flow step plus throughput. Results can be written as JSON
+and compared against a previous run to catch regressions.
+
+    python -m benchmarks.flow_latency --latency 0.5 --concurrency 1,4,16 \
+        --output bench.json --compare baseline.json
+"""
+import argparse
+import asyncio
+import contextlib
+import json
+import os
+import statistics
+import sys
+import threading
+import time
+from typing import Any, Dict, List, Optional
+
+from benchmarks.stub_ollama import CannedResponder, StubOllamaServer
+
+FLOW_STEPS = ["process_user_message", "check_completeness_and_respond", "create_final_summary"]
+
+# Each turn is (customer message, what the stub model extracts from it)
+SCRIPTS: List[List[tuple]] = [
+    [
+        ("Hola, soy Juan Pérez y necesito transporte al aeropuerto El Dorado",
+         {"nombre_solicitante": "Juan Pérez", "direccion_terminacion": "Aeropuerto El Dorado, Bogotá"}),
+        ("Me recogen en la Calle 100 #15-20, Bogotá",
+         {"direccion_inicio": "Calle 100 #15-20, Bogotá"}),
+        ("mañana a las 3 de la tarde, somos 4 con maletas", {}),
+        ("mi cédula es 1020304050 y mi celular 3001234567", {}),
+    ],
+    [
+        ("Buenas tardes, necesito un servicio de transporte", {}),
+        ("Soy Ana María Gómez, cc 52123456", {"nombre_solicitante": "Ana María Gómez"}),
+        ("Salimos del Hotel Dann Carlton en Medellín hacia el aeropuerto José María Córdova",
+         {"direccion_inicio": "Hotel Dann Carlton, Medellín",
+          "direccion_terminacion": "Aeropuerto José María Córdova, Rionegro"}),
+        ("el 15 de julio a las 6am, somos 2 sin equipaje", {}),
+        ("3109876543", {}),
+    ],
+    [
+        ("Quiero un servicio de transporte al aeropuerto mañana a las 3am.",
+         {"direccion_terminacion": "Aeropuerto"}),
+        ("Carlos Rodríguez, NIT 900.123.456-7, celular 315 555 1234",
+         {"nombre_solicitante": "Carlos Rodríguez"}),
+        ("Desde la Carrera 7 #72-41, Bogotá", {"direccion_inicio": "Carrera 7 #72-41, Bogotá"}),
+        ("vamos 3 personas", {}),
+    ],
+]
+
+
+def percentiles(values: List[float]) -> Dict[str, float]:
+    """p50/p95/p99/mean of a list of durations, in milliseconds"""
+    if not values:
+        return {"count": 0}
+    ordered = sorted(values)
+
+    def pick(q: float) -> float:
+        index = min(len(ordered) - 1, max(0, round(q * (len(ordered) - 1))))
+        return round(ordered[index] * 1000, 3)
+
+    return {
+        "count": len(ordered),
+        "mean": round(statistics.fmean(ordered) * 1000, 3),
+        "p50": pick(0.50),
+        "p95": pick(0.95),
+        "p99": pick(0.99),
+    }
+
+
+class StepRecorder:
+    """Collects wall time per flow step across threads"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.samples: Dict[str, List[float]] = {step: [] for step in FLOW_STEPS}
+
+    def record(self, step: str, seconds: float) -> None:
+        with self._lock:
+            self.samples[step].append(seconds)
+
+    def flow_factory(self):
+        from transportation_flow.main import TransportationSystemFlow
+
+        def build(**state):
+            flow = TransportationSystemFlow(**state)
+            for step in FLOW_STEPS:
+                original = getattr(flow, step)
+
+                def timed(*args, __step=step, __original=original, **kwargs):
+                    started = time.perf_counter()
+                    try:
+                        return __original(*args, **kwargs)
+                    finally:
+                        self.record(__step, time.perf_counter() - started)
+
+                # Cover both kickoff (registered methods) and continue_conversation
+                setattr(flow, step, timed)
+                flow._methods[step] = timed
+            return flow
+
+        return build
+
+
+async def _run_conversation(service, sender_id: str, script, turn_times: List[float]) -> bool:
+    result: Dict[str, Any] = {}
+    for message, _ in script:
+        started = time.perf_counter()
+        result = await service.handle_message(sender_id, message)
+        turn_times.append(time.perf_counter() - started)
+    return bool(result.get("final_result"))
+
+
+def run_level(stub: StubOllamaServer, concurrency: int, conversations: int) -> Dict[str, Any]:
+    """Run `conversations` conversations with `concurrency` turns in flight"""
+    from transportation_flow.extraction.cache import get_extraction_cache
+    from transportation_flow.service.conversations import ConversationService
+
+    get_extraction_cache().clear()
+    stub.reset_stats()
+    recorder = StepRecorder()
+    service = ConversationService(
+        max_concurrent_turns=concurrency,
+        flow_factory=recorder.flow_factory()
+    )
+    turn_times: List[float] = []
+
+    async def drive():
+        return await asyncio.gather(*[
+            _run_conversation(service, f"bench-{concurrency}-{i}", SCRIPTS[i % len(SCRIPTS)], turn_times)
+            for i in range(conversations)
+        ])
+
+    started = time.perf_counter()
+    completed = asyncio.run(drive())
+    wall = time.perf_counter() - started
+    service.shutdown()
+
+    return {
+        "concurrency": concurrency,
+        "conversations": conversations,
+        "completed": sum(completed),
+        "turns": len(turn_times),
+        "wall_seconds": round(wall, 3),
+        "turns_per_second": round(len(turn_times) / wall, 3),
+        "conversations_per_second": round(conversations / wall, 3),
+        "llm_requests": stub.stats["requests"],
+        "llm_requests_by_kind": dict(stub.stats["by_kind"]),
+        "llm_prompt_chars": stub.stats["prompt_chars"],
+        "turn": percentiles(turn_times),
+        "steps": {step: percentiles(samples) for step, samples in recorder.samples.items()},
+    }
+
+
+def warm_up(stub: StubOllamaServer) -> float:
+    """Run one discarded conversation; returns how long it took.
+
+    The first turn of a process imports crewAI and builds the crews, which
+    would otherwise land in the first level's tail percentiles.
+    """
+    started = time.perf_counter()
+    run_level(stub, concurrency=1, conversations=1)
+    return time.perf_counter() - started
+
+
+def compare(current: Dict[str, Any], baseline: Dict[str, Any], tolerance: float) -> List[str]:
+    """p95 regressions beyond `tolerance` (0.2 = 20% slower) per level and step"""
+    regressions = []
+    previous = {level["concurrency"]: level for level in baseline.get("levels", [])}
+    for level in current["levels"]:
+        old = previous.get(level["concurrency"])
+        if not old:
+            continue
+        pairs = [("turn", level["turn"], old.get("turn", {}))]
+        pairs += [(step, level["steps"][step], old.get("steps", {}).get(step, {})) for step in FLOW_STEPS]
+        for name, new_stats, old_stats in pairs:
+            if not new_stats.get("count") or not old_stats.get("count"):
+                continue
+            if new_stats["p95"] > old_stats["p95"] * (1 + tolerance):
+                regressions.append(
+                    f"c={level['concurrency']} {name}: p95 {old_stats['p95']}ms -> {new_stats['p95']}ms"
+                )
+    return regressions
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--latency", type=float, default=0.5, help="Stub model latency in seconds")
+    parser.add_argument("--jitter", type=float, default=0.0, help="Random extra latency in seconds")
+    parser.add_argument("--seconds-per-kchar", type=float, default=0.0,
+                        help="Extra stub latency per 1000 prompt characters")
+    parser.add_argument("--concurrency", default="1,4,16", help="Comma-separated concurrency levels")
+    parser.add_argument("--conversations", type=int, default=24, help="Conversations per level")
+    parser.add_argument("--question-mode", choices=["template", "llm", "combined"], default="template")
+    parser.add_argument("--summary-mode", choices=["template", "llm"], default="template")
+    parser.add_argument("--cache", action="store_true", help="Keep the extraction cache enabled")
+    parser.add_argument("--output", help="Write results as JSON to this file")
+    parser.add_argument("--compare", help="Baseline JSON to check p95 regressions against")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="Allowed p95 slowdown (0.2 = 20%%)")
+    parser.add_argument("--verbose", action="store_true", help="Show flow and crew output")
+    args = parser.parse_args(argv)
+
+    extractions = {message: fields for script in SCRIPTS for message, fields in script}
+    stub = StubOllamaServer(
+        CannedResponder(extractions),
+        latency=args.latency,
+        jitter=args.jitter,
+        seconds_per_kchar=args.seconds_per_kchar
+    ).start()
+
+    os.environ["OLLAMA_API_BASE"] = stub.url
+    os.environ["TRANSPORT_QUESTION_MODE"] = args.question_mode
+    os.environ["TRANSPORT_SUMMARY_MODE"] = args.summary_mode
+    if not args.cache:
+        os.environ["TRANSPORT_EXTRACTION_CACHE_SIZE"] = "0"
+    os.environ.setdefault("CREWAI_DISABLE_TELEMETRY", "true")
+    os.environ.setdefault("OTEL_SDK_DISABLED", "true")
+
+    from transportation_flow.settings import get_settings
+    get_settings.cache_clear()
+
+    levels = [int(level) for level in args.concurrency.split(",") if level.strip()]
+    results: Dict[str, Any] = {
+        "config": {
+            "latency": args.latency,
+            "jitter": args.jitter,
+            "seconds_per_kchar": args.seconds_per_kchar,
+            "conversations": args.conversations,
+            "question_mode": args.question_mode,
+            "summary_mode": args.summary_mode,
+            "cache": args.cache,
+        },
+        "levels": [],
+    }
+
+    try:
+        with open(os.devnull, "w") as devnull, \
+                contextlib.redirect_stdout(sys.stdout if args.verbose else devnull):
+            results["warmup_seconds"] = round(warm_up(stub), 3)
+        print(f"warm-up {results['warmup_seconds']}s (not measured)")
+        for level in levels:
+            with open(os.devnull, "w") as devnull, \
+                    contextlib.redirect_stdout(sys.stdout if args.verbose else devnull):
+                level_result = run_level(stub, level, args.conversations)
+            results["levels"].append(level_result)
+            turn = level_result["turn"]
+            print(
+                f"c={level:<3} turns/s={level_result['turns_per_second']:<8} "
+                f"turn p50={turn.get('p50')}ms p95={turn.get('p95')}ms p99={turn.get('p99')}ms "
+                f"llm_calls={level_result['llm_requests']} prompt_chars={level_result['llm_prompt_chars']} "
+                f"completed={level_result['completed']}/{level_result['conversations']}"
+            )
+            for step in FLOW_STEPS:
+                stats = level_result["steps"][step]
+                if stats.get("count"):
+                    print(f"      {step:<32} p50={stats['p50']}ms p95={stats['p95']}ms p99={stats['p99']}ms")
+    finally:
+        stub.stop()
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as file:
+            json.dump(results, file, indent=2, ensure_ascii=False)
+
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as file:
+            regressions = compare(results, json.load(file), args.tolerance)
+        for regression in regressions:
+            print(f"REGRESSION {regression}")
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
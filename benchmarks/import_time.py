@@ -0,0 +1,118 @@
+"""Import-time profile of the package's entry points.
+
+Runs `python -X importtime -c "import <module>"` in a fresh interpreter per
+entry point, best of several runs, and reports the total import time plus
+the packages that cost the most. Results can be written as JSON and compared
+against a previous run, like `flow_latency`.
+
+    python -m benchmarks.import_time --repeat 5 --output imports.json --compare baseline.json
+"""
+import argparse
+import json
+import re
+import subprocess
+import sys
+from typing import Any, Dict, List, Optional
+
+# What each kind of process imports first
+ENTRY_POINTS = {
+    "cli": "transportation_flow.cli",
+    "gateway": "transportation_flow.service.app",
+    "worker": "transportation_flow.service.sharding",
+    "flow": "transportation_flow.main",
+}
+
+IMPORT_LINE = re.compile(r"import time:\s+(\d+)\s+\|\s+(\d+)\s+\|(\s*)(\S+)")
+
+
+def parse_importtime(stderr: str) -> List[Dict[str, Any]]:
+    """Rows of `-X importtime` output: module, depth, self and cumulative microseconds"""
+    rows = []
+    for line in stderr.splitlines():
+        match = IMPORT_LINE.match(line)
+        if match:
+            rows.append({
+                "module": match.group(4),
+                "depth": (len(match.group(3)) - 1) // 2,
+                "self_us": int(match.group(1)),
+                "cumulative_us": int(match.group(2)),
+            })
+    return rows
+
+
+def by_package(rows: List[Dict[str, Any]]) -> Dict[str, int]:
+    """Self time summed per top-level package, in microseconds"""
+    totals: Dict[str, int] = {}
+    for row in rows:
+        package = row["module"].split(".")[0]
+        totals[package] = totals.get(package, 0) + row["self_us"]
+    return totals
+
+
+def profile(module: str) -> Dict[str, Any]:
+    """Import `module` in a fresh interpreter and summarize where the time went"""
+    completed = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        capture_output=True, text=True
+    )
+    if completed.returncode != 0:
+        raise RuntimeError(f"import {module} failed:\n{completed.stderr[-2000:]}")
+    rows = parse_importtime(completed.stderr)
+    target = next((row for row in reversed(rows) if row["module"] == module), None)
+    total_us = target["cumulative_us"] if target else sum(row["self_us"] for row in rows)
+    return {"total_us": total_us, "modules": len(rows), "packages": by_package(rows)}
+
+
+def best_of(module: str, repeat: int) -> Dict[str, Any]:
+    """Fastest of `repeat` runs, to keep disk-cache noise out"""
+    return min((profile(module) for _ in range(repeat)), key=lambda run: run["total_us"])
+
+
+def compare(current: Dict[str, Any], baseline: Dict[str, Any], tolerance: float) -> List[str]:
+    """Entry points whose import time grew beyond `tolerance` (0.2 = 20% slower)"""
+    regressions = []
+    for name, result in current["entry_points"].items():
+        old = baseline.get("entry_points", {}).get(name)
+        if old and result["total_us"] > old["total_us"] * (1 + tolerance):
+            regressions.append(
+                f"{name}: {old['total_us'] / 1000:.0f}ms -> {result['total_us'] / 1000:.0f}ms"
+            )
+    return regressions
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--entry-points", default=",".join(ENTRY_POINTS),
+                        help="Comma-separated subset of: " + ", ".join(ENTRY_POINTS))
+    parser.add_argument("--repeat", type=int, default=3, help="Runs per entry point; the fastest is kept")
+    parser.add_argument("--top", type=int, default=8, help="Heaviest packages to list per entry point")
+    parser.add_argument("--output", help="Write results as JSON to this file")
+    parser.add_argument("--compare", help="Baseline JSON to check regressions against")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="Allowed slowdown (0.2 = 20%%)")
+    args = parser.parse_args(argv)
+
+    results: Dict[str, Any] = {"python": sys.version.split()[0], "entry_points": {}}
+    for name in (name.strip() for name in args.entry_points.split(",") if name.strip()):
+        result = best_of(ENTRY_POINTS[name], args.repeat)
+        results["entry_points"][name] = result
+        print(f"{name:<8} {ENTRY_POINTS[name]:<34} {result['total_us'] / 1000:>8.1f}ms "
+              f"({result['modules']} modules)")
+        heaviest = sorted(result["packages"].items(), key=lambda item: item[1], reverse=True)
+        for package, self_us in heaviest[:args.top]:
+            print(f"      {package:<32} {self_us / 1000:>8.1f}ms")
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as file:
+            json.dump(results, file, indent=2)
+
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as file:
+            regressions = compare(results, json.load(file), args.tolerance)
+        for regression in regressions:
+            print(f"REGRESSION {regression}")
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
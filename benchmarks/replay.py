@@ -0,0 +1,300 @@
+"""Replays recorded conversations against TransportationSystemFlow.
+
+Reads a JSONL log with one inbound turn per line:
+
+    {"sender_id": "573001234567", "message": "Hola", "timestamp": "2025-07-01T09:00:00-05:00"}
+
+`timestamp` may also be epoch seconds. An optional `message_id` is passed
+to the service, and an optional `fields` object is what the stub model
+extracts from that message. Senders are replayed in parallel, each in its
+recorded order, at the original pace, scaled (`--speed 10` is ten times
+faster) or as fast as possible (`--speed max`), with at most `--senders`
+conversations in flight. The model is either the stub Ollama server or the
+real backend configured through `OLLAMA_API_BASE`. The report covers turn
+latency, the completion rate of conversations and LLM calls per completed
+request.
+
+    python -m benchmarks.replay conversations.jsonl --speed max --senders 32
+    python -m benchmarks.replay conversations.jsonl --speed 1 --backend real --output replay.json
+"""
+import argparse
+import asyncio
+import contextlib
+import json
+import os
+import sys
+import time
+from datetime import datetime
+from typing import Any, Awaitable, Callable, Dict, List, NamedTuple, Optional
+
+from benchmarks.flow_latency import SCRIPTS, percentiles
+from benchmarks.stub_ollama import CannedResponder, StubOllamaServer
+
+
+class Turn(NamedTuple):
+    sender_id: str
+    message: str
+    timestamp: float
+    message_id: Optional[str] = None
+    fields: Optional[Dict[str, Any]] = None
+
+
+class TurnRecord(NamedTuple):
+    sender_id: str
+    seconds: float
+    status: str
+    finished: bool
+
+
+def parse_timestamp(value: Any) -> float:
+    """Epoch seconds from a number or an ISO 8601 string"""
+    if isinstance(value, (int, float)):
+        return float(value)
+    text = str(value).strip()
+    try:
+        return float(text)
+    except ValueError:
+        return datetime.fromisoformat(text.replace("Z", "+00:00")).timestamp()
+
+
+def load_log(path: str) -> List[Turn]:
+    """Recorded turns in arrival order"""
+    turns = []
+    with open(path, encoding="utf-8") as file:
+        for line in file:
+            if not line.strip():
+                continue
+            entry = json.loads(line)
+            turns.append(Turn(
+                sender_id=str(entry["sender_id"]),
+                message=entry["message"],
+                timestamp=parse_timestamp(entry["timestamp"]),
+                message_id=entry.get("message_id"),
+                fields=entry.get("fields")
+            ))
+    # sorted() is stable, so turns with equal timestamps keep their recorded order
+    return sorted(turns, key=lambda turn: turn.timestamp)
+
+
+def group_by_sender(turns: List[Turn]) -> Dict[str, List[Turn]]:
+    """Each sender's turns, senders ordered by their first message"""
+    senders: Dict[str, List[Turn]] = {}
+    for turn in turns:
+        senders.setdefault(turn.sender_id, []).append(turn)
+    return senders
+
+
+def write_sample(path: str, gap_seconds: float = 20.0) -> int:
+    """Write the benchmark scripts as a recorded log, one sender per script"""
+    lines = []
+    start = datetime(2025, 7, 1, 9, 0).timestamp()
+    for i, script in enumerate(SCRIPTS):
+        for j, (message, fields) in enumerate(script):
+            lines.append(json.dumps({
+                "sender_id": f"57300000000{i}",
+                "message": message,
+                "timestamp": start + i * 7 + j * gap_seconds,
+                "fields": fields,
+            }, ensure_ascii=False))
+    with open(path, "w", encoding="utf-8") as file:
+        file.write("\n".join(lines) + "\n")
+    return len(lines)
+
+
+async def replay(
+    turns: List[Turn],
+    handle: Callable[[Turn], Awaitable[Dict[str, Any]]],
+    speed: Optional[float] = 1.0,
+    senders: int = 16
+) -> List[TurnRecord]:
+    """Send every turn through `handle`; `speed=None` replays without pauses"""
+    if speed is not None and not speed > 0:
+        raise ValueError(f"speed must be positive, got {speed}")
+    if not turns:
+        return []
+    loop = asyncio.get_running_loop()
+    started = loop.time()
+    origin = turns[0].timestamp
+    gate = asyncio.Semaphore(senders)
+    records: List[TurnRecord] = []
+
+    async def sleep_until(deadline: float) -> None:
+        delay = deadline - loop.time()
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+    async def run_sender(sender_turns: List[Turn]) -> None:
+        first = sender_turns[0].timestamp
+        if speed is not None:
+            await sleep_until(started + (first - origin) / speed)
+        async with gate:
+            # Keep the sender's own pacing from the moment it gets a slot
+            admitted = loop.time()
+            for turn in sender_turns:
+                if speed is not None:
+                    await sleep_until(admitted + (turn.timestamp - first) / speed)
+                turn_started = time.perf_counter()
+                result = await handle(turn)
+                records.append(TurnRecord(
+                    turn.sender_id,
+                    time.perf_counter() - turn_started,
+                    result.get("status", "error"),
+                    bool(result.get("final_result"))
+                ))
+
+    await asyncio.gather(*[run_sender(sender_turns) for sender_turns in group_by_sender(turns).values()])
+    return records
+
+
+def summarize(records: List[TurnRecord], llm_calls: int, wall_seconds: float) -> Dict[str, Any]:
+    """Latency, completion and LLM-cost figures for a replay"""
+    by_status: Dict[str, int] = {}
+    conversations: List[Dict[str, Any]] = []
+    open_turns: Dict[str, int] = {}
+    for record in records:
+        by_status[record.status] = by_status.get(record.status, 0) + 1
+        open_turns[record.sender_id] = open_turns.get(record.sender_id, 0) + 1
+        if record.finished:
+            conversations.append({
+                "sender_id": record.sender_id,
+                "turns": open_turns.pop(record.sender_id),
+                "completed": True
+            })
+    # Senders whose last conversation never reached a summary
+    conversations += [
+        {"sender_id": sender_id, "turns": turns, "completed": False}
+        for sender_id, turns in open_turns.items()
+    ]
+
+    completed = [c for c in conversations if c["completed"]]
+    return {
+        "turns": len(records),
+        "wall_seconds": round(wall_seconds, 3),
+        "turns_per_second": round(len(records) / wall_seconds, 3) if wall_seconds else None,
+        "turn": percentiles([record.seconds for record in records]),
+        "by_status": by_status,
+        "conversations": len(conversations),
+        "completed": len(completed),
+        "completion_rate": round(len(completed) / len(conversations), 3) if conversations else None,
+        "turns_per_completed": round(
+            sum(c["turns"] for c in completed) / len(completed), 2
+        ) if completed else None,
+        "llm_calls": llm_calls,
+        "llm_calls_per_completed": round(llm_calls / len(completed), 2) if completed else None,
+        "per_conversation": conversations,
+    }
+
+
+def parse_speed(value: str) -> Optional[float]:
+    """`--speed` value: a positive factor, or None for 'max'"""
+    if value == "max":
+        return None
+    try:
+        speed = float(value)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"expected a number or 'max', got {value!r}")
+    if not speed > 0:
+        raise argparse.ArgumentTypeError(f"speed must be positive, got {value}")
+    return speed
+
+
+def _crew_calls() -> int:
+    from transportation_flow.crews.pool import get_crew_pool
+    from transportation_flow.metrics import LLM_CALL_SECONDS
+
+    return sum(LLM_CALL_SECONDS.count(crew=name) for name in get_crew_pool().stats())
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("log", help="JSONL log of recorded turns")
+    parser.add_argument("--speed", type=parse_speed, default="1",
+                        help="Replay speed factor (1 = original pace) or 'max' for no pauses")
+    parser.add_argument("--senders", type=int, default=16, help="Conversations replayed at once")
+    parser.add_argument("--max-concurrent-turns", type=int, default=8,
+                        help="Turns the conversation service runs at once")
+    parser.add_argument("--backend", choices=["stub", "real"], default="stub",
+                        help="Stub Ollama server, or the backend at OLLAMA_API_BASE")
+    parser.add_argument("--latency", type=float, default=0.5, help="Stub model latency in seconds")
+    parser.add_argument("--jitter", type=float, default=0.0, help="Random extra stub latency in seconds")
+    parser.add_argument("--question-mode", choices=["template", "llm", "combined"])
+    parser.add_argument("--summary-mode", choices=["template", "llm"])
+    parser.add_argument("--output", help="Write the report as JSON to this file")
+    parser.add_argument("--write-sample", action="store_true",
+                        help="Write the benchmark scripts to LOG as a recorded log and exit")
+    parser.add_argument("--verbose", action="store_true", help="Show flow and crew output")
+    args = parser.parse_args(argv)
+
+    if args.write_sample:
+        print(f"Wrote {write_sample(args.log)} turns to {args.log}")
+        return 0
+
+    turns = load_log(args.log)
+
+    stub = None
+    if args.backend == "stub":
+        extractions = {turn.message: turn.fields for turn in turns if turn.fields}
+        stub = StubOllamaServer(
+            CannedResponder(extractions), latency=args.latency, jitter=args.jitter
+        ).start()
+        os.environ["OLLAMA_API_BASE"] = stub.url
+    if args.question_mode:
+        os.environ["TRANSPORT_QUESTION_MODE"] = args.question_mode
+    if args.summary_mode:
+        os.environ["TRANSPORT_SUMMARY_MODE"] = args.summary_mode
+    os.environ.setdefault("CREWAI_DISABLE_TELEMETRY", "true")
+    os.environ.setdefault("OTEL_SDK_DISABLED", "true")
+
+    from transportation_flow.service.conversations import ConversationService
+    from transportation_flow.settings import get_settings
+    get_settings.cache_clear()
+
+    service = ConversationService(max_concurrent_turns=args.max_concurrent_turns)
+
+    async def handle(turn: Turn) -> Dict[str, Any]:
+        return await service.handle_message(turn.sender_id, turn.message, turn.message_id)
+
+    calls_before = _crew_calls()
+    started = time.perf_counter()
+    try:
+        with open(os.devnull, "w") as devnull, \
+                contextlib.redirect_stdout(sys.stdout if args.verbose else devnull):
+            records = asyncio.run(replay(turns, handle, speed=args.speed, senders=args.senders))
+    finally:
+        service.shutdown()
+        if stub is not None:
+            stub.stop()
+    wall = time.perf_counter() - started
+
+    # The stub sees every model request; with a real backend, count crew calls
+    llm_calls = stub.stats["requests"] if stub is not None else _crew_calls() - calls_before
+    report = summarize(records, llm_calls, wall)
+    report["config"] = {
+        "log": args.log,
+        "speed": args.speed if args.speed is not None else "max",
+        "senders": args.senders,
+        "backend": args.backend,
+        "latency": args.latency if stub is not None else None,
+        "llm_calls_counted": "model requests" if stub is not None else "crew calls",
+    }
+
+    turn = report["turn"]
+    print(
+        f"turns={report['turns']} turns/s={report['turns_per_second']} "
+        f"p50={turn.get('p50')}ms p95={turn.get('p95')}ms p99={turn.get('p99')}ms"
+    )
+    print(
+        f"completed={report['completed']}/{report['conversations']} "
+        f"({report['completion_rate']}) turns/completed={report['turns_per_completed']} "
+        f"llm_calls={report['llm_calls']} llm_calls/completed={report['llm_calls_per_completed']}"
+    )
+    print(f"statuses: {report['by_status']}")
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as file:
+            json.dump(report, file, indent=2, ensure_ascii=False)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
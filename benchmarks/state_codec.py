@@ -0,0 +1,79 @@
+"""Encode/decode cost of persisted conversation state, by format.
+
+Builds realistic mid-conversation states and times a save/load round of
+each: the JSON path the Redis store used (`model_dump_json` and
+`model_validate_json`), plain and zlib-compressed, against the binary
+snapshot codec, uncompressed and zlib-compressed, along with the bytes each
+snapshot takes.
+
+    python -m benchmarks.state_codec --conversations 2000 --turns 3
+"""
+import argparse
+import sys
+import time
+import zlib
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from benchmarks.state_size import build_state
+from transportation_flow.schemas.conversation_state import ConversationState
+from transportation_flow.schemas.state_codec import decode_state, encode_state
+
+Codec = Tuple[Callable[[ConversationState], Any], Callable[[Any], ConversationState]]
+
+CODECS: Dict[str, Codec] = {
+    "json": (
+        lambda state: state.model_dump_json().encode("utf-8"),
+        ConversationState.model_validate_json
+    ),
+    "json+zlib": (
+        lambda state: zlib.compress(state.model_dump_json().encode("utf-8"), 1),
+        lambda payload: ConversationState.model_validate_json(zlib.decompress(payload))
+    ),
+    "codec": (lambda state: encode_state(state, compress_over=None), decode_state),
+    "codec+zlib": (lambda state: encode_state(state, compress_over=0), decode_state),
+}
+
+
+def _best_per_item(run: Callable[[], Any], items: int, repeat: int) -> float:
+    """Fastest of `repeat` runs, in microseconds per item"""
+    best = float("inf")
+    for _ in range(repeat):
+        started = time.perf_counter()
+        run()
+        best = min(best, time.perf_counter() - started)
+    return round(best / items * 1e6, 2)
+
+
+def measure(conversations: int, turns: int, repeat: int = 3) -> Dict[str, Dict[str, float]]:
+    """Encode/decode microseconds and bytes per conversation for each format"""
+    states = [build_state(i, turns) for i in range(conversations)]
+    results = {}
+    for name, (encode, decode) in CODECS.items():
+        payloads = [encode(state) for state in states]
+        results[name] = {
+            "encode_us": _best_per_item(lambda: [encode(s) for s in states], conversations, repeat),
+            "decode_us": _best_per_item(lambda: [decode(p) for p in payloads], conversations, repeat),
+            "bytes": round(sum(len(p) for p in payloads) / conversations, 1),
+        }
+    return results
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--conversations", type=int, default=2000)
+    parser.add_argument("--turns", type=int, default=3, help="Exchanges before the state is saved")
+    parser.add_argument("--repeat", type=int, default=3, help="Runs per measurement; the best counts")
+    args = parser.parse_args(argv)
+
+    results = measure(args.conversations, args.turns, args.repeat)
+    baseline = results["json"]
+    for name, stats in results.items():
+        print(
+            f"{name:<11} encode {stats['encode_us']:>8.2f}us  decode {stats['decode_us']:>8.2f}us  "
+            f"{stats['bytes']:>8.1f} bytes  ({stats['bytes'] / baseline['bytes']:.0%} of json)"
+        )
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,95 @@
+"""Memory held per parked conversation, by representation.
+
+Builds many realistic mid-conversation states and measures, with
+tracemalloc, the bytes retained per conversation when kept as full pydantic
+models, as JSON strings and as ParkedConversation objects.
+
+    python -m benchmarks.state_size --conversations 10000
+"""
+import argparse
+import gc
+import sys
+import tracemalloc
+import uuid
+from typing import Any, Callable, Dict, List, Optional
+
+from transportation_flow.schemas.conversation_state import ConversationState
+from transportation_flow.schemas.parked_state import ParkedConversation
+
+TURNS = [
+    ("Hola, soy Juan Pérez y necesito transporte al aeropuerto El Dorado",
+     "¡Perfecto, Juan! ¿Desde qué dirección lo recogemos? Incluya la ciudad, por favor."),
+    ("Me recogen en la Calle 100 #15-20, Bogotá",
+     "¡Listo, Juan! ¿Para qué fecha y a qué hora necesita el servicio? (por ejemplo, 15 de julio a las 3:00 PM)"),
+    ("mañana a las 3 de la tarde, somos 4 con maletas",
+     "Gracias, Juan. ¿Me regala su cédula o NIT y un número de celular de contacto?"),
+]
+
+
+def build_state(index: int, turns: int) -> ConversationState:
+    """A conversation parked after `turns` question/answer exchanges"""
+    state = ConversationState(
+        sender_id=f"57300{index:07d}",
+        conversation_id=str(uuid.uuid4()),
+    )
+    for turn in range(turns):
+        message, question = TURNS[turn % len(TURNS)]
+        # Real conversations do not share message text
+        message, question = f"{message} #{index}", f"{question} #{index}"
+        state.add_message("user", message)
+        state.update_from_partial({
+            "nombre_solicitante": "Juan Pérez",
+            "direccion_terminacion": "Aeropuerto El Dorado, Bogotá",
+            "direccion_inicio": "Calle 100 #15-20, Bogotá" if turn else None,
+        })
+        state.current_message = message
+        state.add_message("assistant", question)
+        state.current_question = question
+        state.attempts += 1
+    return state
+
+
+def retained_bytes(
+    conversations: int, turns: int, park: Callable[[ConversationState], Any]
+) -> int:
+    """Bytes still allocated after building and parking every conversation"""
+    gc.collect()
+    tracemalloc.start()
+    before = tracemalloc.take_snapshot()
+    parked = [park(build_state(i, turns)) for i in range(conversations)]
+    gc.collect()
+    after = tracemalloc.take_snapshot()
+    tracemalloc.stop()
+    total = sum(stat.size_diff for stat in after.compare_to(before, "filename"))
+    # The list itself is not part of any representation
+    return total - sys.getsizeof(parked)
+
+
+def measure(conversations: int, turns: int) -> Dict[str, float]:
+    """Bytes per conversation for each way of holding a parked conversation"""
+    representations = {
+        "pydantic": lambda state: state,
+        "json": lambda state: state.model_dump_json(),
+        "parked": ParkedConversation.from_state,
+    }
+    return {
+        name: round(retained_bytes(conversations, turns, park) / conversations, 1)
+        for name, park in representations.items()
+    }
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--conversations", type=int, default=10000)
+    parser.add_argument("--turns", type=int, default=3, help="Exchanges before the conversation parks")
+    args = parser.parse_args(argv)
+
+    results = measure(args.conversations, args.turns)
+    baseline = results["pydantic"]
+    for name, size in results.items():
+        print(f"{name:<10} {size:>10.1f} bytes/conversation  ({size / baseline:.0%} of pydantic)")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
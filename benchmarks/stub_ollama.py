@@ -0,0 +1,183 @@
+"""Local stand-in for an Ollama server, for benchmarks and offline runs.
+
+Serves `/api/generate`, `/api/chat` and the OpenAI-compatible
+`/v1/chat/completions` with a configurable delay and canned replies, so the
+flow can be driven end to end without a model. Point crews at it with
+`OLLAMA_API_BASE=http://127.0.0.1:<port>`.
+"""
+import json
+import random
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable, Dict, Optional
+
+MESSAGE_LINE = re.compile(r"Message:\s*(.+)")
+
+DEFAULT_QUESTION = "¿Me regala su nombre y número de celular?"
+DEFAULT_SUMMARY = "¡Perfecto! He registrado su solicitud de servicio. Procederé a generar su cotización..."
+
+
+def classify_prompt(prompt: str) -> str:
+    """Which crew task a prompt belongs to"""
+    if "Fields still missing before this message" in prompt:
+        return "combined"
+    if "Missing required fields" in prompt:
+        return "question"
+    if "professional summary" in prompt:
+        return "summary"
+    if "Message:" in prompt:
+        return "extraction"
+    return "other"
+
+
+class CannedResponder:
+    """Answers extraction prompts from a message -> fields table"""
+
+    def __init__(self, extractions: Optional[Dict[str, dict]] = None):
+        self.extractions = dict(extractions or {})
+
+    def __call__(self, prompt: str) -> str:
+        kind = classify_prompt(prompt)
+        if kind == "question":
+            return DEFAULT_QUESTION
+        if kind == "summary":
+            return DEFAULT_SUMMARY
+        if kind in ("extraction", "combined"):
+            match = MESSAGE_LINE.search(prompt)
+            fields = self.extractions.get(match.group(1).strip() if match else "", {})
+            if kind == "combined":
+                return json.dumps({"fields": fields, "question": DEFAULT_QUESTION}, ensure_ascii=False)
+            return json.dumps(fields, ensure_ascii=False)
+        return "OK"
+
+
+class StubOllamaServer:
+    """Threaded HTTP server answering like Ollama after a simulated delay"""
+
+    def __init__(
+        self,
+        responder: Callable[[str], str] = CannedResponder(),
+        latency: float = 0.5,
+        jitter: float = 0.0,
+        seconds_per_kchar: float = 0.0,
+        host: str = "127.0.0.1",
+        port: int = 0
+    ):
+        self.responder = responder
+        self.latency = latency
+        self.jitter = jitter
+        self.seconds_per_kchar = seconds_per_kchar
+        self.stats = {"requests": 0, "prompt_chars": 0, "by_kind": {}}
+        self._lock = threading.Lock()
+        self._server = ThreadingHTTPServer((host, port), self._handler_class())
+        self._server.daemon_threads = True
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self) -> "StubOllamaServer":
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self) -> "StubOllamaServer":
+        return self.start()
+
+    def __exit__(self, *exc) -> None:
+        self.stop()
+
+    def reset_stats(self) -> None:
+        with self._lock:
+            self.stats = {"requests": 0, "prompt_chars": 0, "by_kind": {}}
+
+    def _answer(self, prompt: str) -> str:
+        kind = classify_prompt(prompt)
+        with self._lock:
+            self.stats["requests"] += 1
+            self.stats["prompt_chars"] += len(prompt)
+            self.stats["by_kind"][kind] = self.stats["by_kind"].get(kind, 0) + 1
+
+        delay = self.latency + random.uniform(0, self.jitter)
+        delay += self.seconds_per_kchar * len(prompt) / 1000
+        time.sleep(delay)
+        # crewAI agents expect the ReAct-style final answer marker
+        return f"Thought: I now can give a great answer\nFinal Answer: {self.responder(prompt)}"
+
+    def _handler_class(self):
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, format, *args):
+                pass
+
+            def _send(self, payload: dict) -> None:
+                body = json.dumps(payload).encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def _read_json(self) -> dict:
+                length = int(self.headers.get("Content-Length") or 0)
+                return json.loads(self.rfile.read(length) or b"{}")
+
+            def do_GET(self):
+                if self.path.startswith("/api/tags"):
+                    self._send({"models": [{"name": "qwen3:8b"}, {"name": "phi3:3.8b"}]})
+                else:
+                    self._send({"status": "ok"})
+
+            def do_POST(self):
+                request = self._read_json()
+                model = request.get("model", "stub")
+                if self.path.startswith("/api/show"):
+                    self._send({"model_info": {"llama.context_length": 8192}, "template": ""})
+                    return
+
+                if self.path.startswith("/api/generate"):
+                    prompt = request.get("prompt", "")
+                    content = stub._answer(prompt)
+                    self._send({
+                        "model": model, "response": content, "done": True,
+                        "prompt_eval_count": len(prompt) // 4,
+                        "eval_count": len(content) // 4,
+                    })
+                    return
+
+                messages = request.get("messages") or []
+                prompt = "\n".join(str(m.get("content", "")) for m in messages)
+                content = stub._answer(prompt)
+                if self.path.startswith("/api/chat"):
+                    self._send({
+                        "model": model, "done": True,
+                        "message": {"role": "assistant", "content": content},
+                        "prompt_eval_count": len(prompt) // 4,
+                        "eval_count": len(content) // 4,
+                    })
+                else:
+                    self._send({
+                        "id": "stub", "object": "chat.completion", "model": model,
+                        "choices": [{
+                            "index": 0, "finish_reason": "stop",
+                            "message": {"role": "assistant", "content": content},
+                        }],
+                        "usage": {
+                            "prompt_tokens": len(prompt) // 4,
+                            "completion_tokens": len(content) // 4,
+                            "total_tokens": (len(prompt) + len(content)) // 4,
+                        },
+                    })
+
+        return Handler
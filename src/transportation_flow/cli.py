@@ -0,0 +1,57 @@
+"""Entry points for the `kickoff` and `plot` scripts.
+
+Importing the flow pulls in crewAI, LiteLLM and their dependencies, which
+takes seconds. This module only needs the standard library and dotenv, so
+the menu shows up at once. The flow module is imported on a background
+thread while the user picks a mode, and is only waited on when it is used.
+"""
+import threading
+from types import ModuleType
+from typing import Optional
+
+from dotenv import load_dotenv
+
+_preload: Optional[threading.Thread] = None
+
+
+def _import_flow() -> None:
+    import transportation_flow.main  # noqa: F401
+
+
+def preload_flow() -> threading.Thread:
+    """Start importing the flow module in the background"""
+    global _preload
+    if _preload is None:
+        _preload = threading.Thread(target=_import_flow, name="flow-preload", daemon=True)
+        _preload.start()
+    return _preload
+
+
+def _flow_module():
+    preload_flow().join()
+    import transportation_flow.main as main
+    return main
+
+
+def kickoff(flow_module: Optional[ModuleType] = None):
+    """Main entry point; `flow_module` is the flow module when it is already loaded"""
+    load_dotenv()
+    if flow_module is None:
+        preload_flow()
+    print("Choose test mode:")
+    print("1. Single message test")
+    print("2. Interactive conversation")
+
+    choice = input("\nEnter choice (1 or 2): ").strip()
+
+    main = flow_module or _flow_module()
+    if choice == "1":
+        main.test_single_message()
+    else:
+        main.interactive_conversation()
+
+
+def plot():
+    """Generate flow diagram"""
+    load_dotenv()
+    return _flow_module().plot()
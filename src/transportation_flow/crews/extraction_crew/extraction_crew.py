@@ -1,7 +1,11 @@
 from crewai import Agent, Crew, Process, Task
 from crewai.project import CrewBase, agent, crew, task
 from crewai.agents.agent_builder.base_agent import BaseAgent
-from typing import Optional, Dict, Any, List
+from transportation_flow.settings import get_settings
+from transportation_flow.crews.ollama import build_llm
+from transportation_flow.extraction.structured import ExtractAndAskOutput, ExtractedFields
+from pydantic import BaseModel
+from typing import Optional, Dict, Any, List, Type
 
 @CrewBase
 class ExtractionCrew():
@@ -13,36 +17,69 @@ class ExtractionCrew():
     def information_extractor(self) -> Agent:
         return Agent(
             config=self.agents_config['information_extractor'],
-            verbose=True
+            llm=build_llm(self.agents_config['information_extractor'].get('llm')),
+            verbose=get_settings().crew_verbose
         )
     
     @agent
     def conversation_manager(self) -> Agent:
         return Agent(
             config=self.agents_config['conversation_manager'],
-            verbose=True
+            llm=build_llm(self.agents_config['conversation_manager'].get('llm')),
+            verbose=get_settings().crew_verbose
         )
     
+    def _extraction_task(self, name: str, schema: Type[BaseModel]) -> Task:
+        """Extraction task whose model may only emit JSON matching `schema`"""
+        config = self.tasks_config[name]
+        if not get_settings().extraction_structured_output:
+            return Task(config=config)
+        # Constrained at decoding time; the flow parses the raw output itself, so a
+        # reply that still comes out malformed is salvaged rather than re-asked
+        extractor_config = self.agents_config['information_extractor']
+        extractor = Agent(
+            config=extractor_config,
+            llm=build_llm(extractor_config.get('llm'), schema.model_json_schema()),
+            verbose=get_settings().crew_verbose
+        )
+        return Task(config=config, agent=extractor)
+    
     @task
     def extract_information(self) -> Task:
-        return Task(
-            config=self.tasks_config['extract_information']
-        )
+        return self._extraction_task('extract_information', ExtractedFields)
+    
+    @task
+    def extract_and_ask(self) -> Task:
+        return self._extraction_task('extract_and_ask', ExtractAndAskOutput)
     
     @task
     def request_missing_information(self) -> Task:
+        # The customer answers in a later turn; never wait for input on a worker thread
         return Task(
-            config=self.tasks_config['request_missing_information']
+            config=self.tasks_config['request_missing_information'],
+            human_input=False
         )
     
     @crew
     def extraction_crew(self) -> Crew:
         """Crew for information extraction only"""
+        task = self.extract_information()
+        return Crew(
+            agents=[task.agent],
+            tasks=[task],
+            process=Process.sequential,
+            verbose=get_settings().crew_verbose
+        )
+    
+    @crew
+    def extract_and_ask_crew(self) -> Crew:
+        """Crew extracting information and asking for the rest in one call"""
+        task = self.extract_and_ask()
         return Crew(
-            agents=[self.information_extractor()],
-            tasks=[self.extract_information()],
+            agents=[task.agent],
+            tasks=[task],
             process=Process.sequential,
-            verbose=True
+            verbose=get_settings().crew_verbose
         )
     
     @crew
@@ -52,5 +89,5 @@ class ExtractionCrew():
             agents=[self.conversation_manager()],
             tasks=[self.request_missing_information()],
             process=Process.sequential,
-            verbose=True
+            verbose=get_settings().crew_verbose
         )
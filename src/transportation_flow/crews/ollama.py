@@ -0,0 +1,212 @@
+"""Ollama model warm-up, keep-alive and a shared HTTP connection pool.
+
+Ollama loads a model on its first request and unloads it after `keep_alive`
+of inactivity, so the first turn after a deploy or a quiet spell waits for
+qwen3:8b to load. At startup the models named in the crews' agents.yaml are
+loaded with a long keep-alive, every crew call repeats that keep-alive, and
+every crew LLM hands LiteLLM the same pooled httpx client, so calls reuse
+keep-alive connections instead of opening one per call. `READINESS` says
+when the models are warm.
+"""
+import threading
+import time
+from pathlib import Path
+from typing import TYPE_CHECKING, Any, Dict, List, Optional
+
+from transportation_flow.crews.pool import load_yaml_once
+from transportation_flow.settings import get_settings
+
+if TYPE_CHECKING:
+    import httpx
+
+CREWS_DIR = Path(__file__).parent
+OLLAMA_PREFIX = "ollama/"
+
+
+def configured_models() -> List[str]:
+    """Ollama models used by the crews' agents, in first-seen order"""
+    models: List[str] = []
+    for config_path in sorted(CREWS_DIR.glob("*/config/agents.yaml")):
+        for agent in load_yaml_once(config_path).values():
+            llm = agent.get("llm") if isinstance(agent, dict) else None
+            if isinstance(llm, str) and llm.startswith(OLLAMA_PREFIX):
+                model = llm[len(OLLAMA_PREFIX):]
+                if model not in models:
+                    models.append(model)
+    return models
+
+
+def build_llm(llm: Any, output_schema: Optional[Dict[str, Any]] = None) -> Any:
+    """crewAI LLM for an agents.yaml `llm` entry, keeping Ollama models loaded.
+
+    With `output_schema`, Ollama constrains decoding to that JSON schema.
+    """
+    if not isinstance(llm, str) or not llm.startswith(OLLAMA_PREFIX):
+        return llm
+    from crewai import LLM
+
+    settings = get_settings()
+    extra: Dict[str, Any] = {}
+    if output_schema is not None:
+        # Ollama's own `format`, passed through by LiteLLM; crewAI's response_format
+        # is refused for Ollama models
+        extra["format"] = output_schema
+    return LLM(
+        model=llm,
+        base_url=settings.ollama_base_url,
+        keep_alive=settings.ollama_keep_alive,
+        # Forwarded to litellm.completion, whose Ollama handler sends the request through it
+        client=get_llm_client(),
+        **extra
+    )
+
+
+_http_client: Optional["httpx.Client"] = None
+_llm_client: Any = None
+_http_client_lock = threading.RLock()
+
+
+def get_http_client() -> "httpx.Client":
+    """Process-wide pooled HTTP client for talking to Ollama"""
+    global _http_client
+    if _http_client is None:
+        with _http_client_lock:
+            if _http_client is None:
+                import httpx
+
+                settings = get_settings()
+                _http_client = httpx.Client(
+                    limits=httpx.Limits(
+                        max_connections=settings.ollama_max_connections,
+                        max_keepalive_connections=settings.ollama_max_connections
+                    ),
+                    timeout=httpx.Timeout(settings.ollama_timeout_seconds, connect=5.0)
+                )
+    return _http_client
+
+
+def get_llm_client() -> Any:
+    """LiteLLM HTTP handler wrapping the pooled client, shared by every crew LLM"""
+    global _llm_client
+    if _llm_client is None:
+        with _http_client_lock:
+            if _llm_client is None:
+                from litellm.llms.custom_httpx.http_handler import HTTPHandler
+
+                _llm_client = HTTPHandler(client=get_http_client())
+    return _llm_client
+
+
+class Readiness:
+    """Load state of each configured model, for the readiness probe"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._models: Dict[str, str] = {}
+
+    def expect(self, models: List[str]) -> None:
+        """Require `models` to be loaded before reporting ready"""
+        with self._lock:
+            for model in models:
+                self._models.setdefault(model, "pending")
+
+    def mark(self, model: str, status: str) -> None:
+        with self._lock:
+            self._models[model] = status
+
+    @property
+    def ready(self) -> bool:
+        with self._lock:
+            return all(status == "ready" for status in self._models.values())
+
+    def pending(self) -> List[str]:
+        """Models not loaded yet"""
+        with self._lock:
+            return [model for model, status in self._models.items() if status != "ready"]
+
+    def report(self) -> Dict[str, Any]:
+        with self._lock:
+            models = dict(self._models)
+        return {"ready": all(status == "ready" for status in models.values()), "models": models}
+
+    def reset(self) -> None:
+        with self._lock:
+            self._models.clear()
+
+
+READINESS = Readiness()
+
+
+def warm_up_model(model: str, client: Optional["httpx.Client"] = None) -> None:
+    """Load `model` into Ollama's memory with the configured keep-alive"""
+    settings = get_settings()
+    client = client or get_http_client()
+    # A generate request without a prompt only loads the model
+    response = client.post(
+        f"{settings.ollama_base_url.rstrip('/')}/api/generate",
+        json={"model": model, "keep_alive": settings.ollama_keep_alive},
+        timeout=settings.ollama_warmup_timeout_seconds
+    )
+    response.raise_for_status()
+
+
+def warm_up_models(
+    models: Optional[List[str]] = None,
+    readiness: Readiness = READINESS,
+    client: Optional["httpx.Client"] = None
+) -> bool:
+    """Load the models still pending; True when all of them are loaded"""
+    if models is None:
+        models = configured_models()
+    readiness.expect(models)
+    for model in readiness.pending():
+        readiness.mark(model, "loading")
+        started = time.perf_counter()
+        try:
+            warm_up_model(model, client)
+        except Exception as e:
+            print(f"⚠️ Warm-up of {model} failed: {e}")
+            readiness.mark(model, "failed")
+            continue
+        readiness.mark(model, "ready")
+        print(f"🔥 {model} loaded in {time.perf_counter() - started:.1f}s")
+    return readiness.ready
+
+
+class ModelWarmer:
+    """Background thread that loads the models, retrying until all are warm"""
+
+    def __init__(
+        self,
+        models: Optional[List[str]] = None,
+        readiness: Readiness = READINESS,
+        retry_seconds: Optional[float] = None
+    ):
+        self.models = models
+        self.readiness = readiness
+        self.retry_seconds = (
+            get_settings().ollama_warmup_retry_seconds if retry_seconds is None else retry_seconds
+        )
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def _run(self) -> None:
+        while not self._stop.is_set():
+            if warm_up_models(self.models, self.readiness):
+                return
+            self._stop.wait(self.retry_seconds)
+
+    def start(self) -> "ModelWarmer":
+        self.readiness.expect(self.models if self.models is not None else configured_models())
+        self._thread = threading.Thread(target=self._run, name="ollama-warmup", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self._stop.set()
+
+    def wait(self, timeout: Optional[float] = None) -> bool:
+        """Block until the warm-up finished or stopped; True when ready"""
+        if self._thread is not None:
+            self._thread.join(timeout)
+        return self.readiness.ready
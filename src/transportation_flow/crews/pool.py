@@ -0,0 +1,200 @@
+"""Process-wide pool of pre-built crews.
+
+Building a crew re-reads its YAML configs and creates new Agent, Task and LLM
+objects. The pool keeps built crews around and hands them out one request at
+a time, so that cost is paid once per crew instead of once per message.
+"""
+import copy
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from functools import lru_cache
+from pathlib import Path
+from typing import Any, Callable, Deque, Dict, Iterator, Optional
+
+import yaml
+
+CrewFactory = Callable[[], Any]
+
+
+@lru_cache(maxsize=None)
+def _parse_yaml(config_path: str) -> dict:
+    with open(config_path, "r", encoding="utf-8") as file:
+        return yaml.safe_load(file) or {}
+
+
+def load_yaml_once(config_path: Path) -> dict:
+    """Parse a config file once and return a private copy of it.
+
+    CrewBase mutates the loaded dicts (LLM names become LLM objects), so every
+    crew instance gets its own deep copy of the cached parse.
+    """
+    return copy.deepcopy(_parse_yaml(str(config_path)))
+
+
+def share_parsed_configs(crew_class: type) -> type:
+    """Make a @CrewBase class load its YAML configs through the shared cache"""
+    crew_class.load_yaml = staticmethod(load_yaml_once)
+    return crew_class
+
+
+def reset_crew(crew: Any) -> None:
+    """Clear per-run state so a crew can serve the next request"""
+    for task in getattr(crew, "tasks", None) or []:
+        task.output = None
+    for agent in getattr(crew, "agents", None) or []:
+        if hasattr(agent, "tools_results"):
+            agent.tools_results = []
+    if hasattr(crew, "_inputs"):
+        crew._inputs = None
+
+
+class CrewPool:
+    """Thread-safe pool of reusable crews, keyed by name"""
+
+    def __init__(
+        self,
+        max_idle: int = 4,
+        reset: Callable[[Any], None] = reset_crew
+    ):
+        self.max_idle = max_idle
+        self._reset = reset
+        self._factories: Dict[str, CrewFactory] = {}
+        self._idle: Dict[str, Deque[Any]] = {}
+        self._lock = threading.Lock()
+        self._stats: Dict[str, Dict[str, float]] = {}
+
+    def register(self, name: str, factory: CrewFactory) -> None:
+        """Register how to build the crew called `name`"""
+        with self._lock:
+            self._factories[name] = factory
+            self._idle.setdefault(name, deque())
+            self._stats.setdefault(name, {
+                "hits": 0,
+                "misses": 0,
+                "in_use": 0,
+                "discarded": 0,
+                # Misses and warm() both build; the average is over every build
+                "builds": 0,
+                "build_seconds": 0.0,
+            })
+
+    def _build(self, name: str) -> Any:
+        factory = self._factories[name]
+        started = time.perf_counter()
+        crew = factory()
+        elapsed = time.perf_counter() - started
+        with self._lock:
+            self._stats[name]["builds"] += 1
+            self._stats[name]["build_seconds"] += elapsed
+        return crew
+
+    def acquire(self, name: str) -> Any:
+        """Take a crew out of the pool, building one if none is idle"""
+        with self._lock:
+            if name not in self._factories:
+                raise KeyError(f"No crew registered as '{name}'")
+            stats = self._stats[name]
+            stats["in_use"] += 1
+            idle = self._idle[name]
+            if idle:
+                stats["hits"] += 1
+                return idle.pop()
+            stats["misses"] += 1
+
+        try:
+            return self._build(name)
+        except Exception:
+            with self._lock:
+                self._stats[name]["in_use"] -= 1
+            raise
+
+    def release(self, name: str, crew: Any) -> None:
+        """Reset a crew and return it to the pool"""
+        try:
+            self._reset(crew)
+            reusable = True
+        except Exception:
+            reusable = False
+
+        with self._lock:
+            stats = self._stats[name]
+            stats["in_use"] -= 1
+            if reusable and len(self._idle[name]) < self.max_idle:
+                self._idle[name].append(crew)
+            else:
+                stats["discarded"] += 1
+
+    @contextmanager
+    def checkout(self, name: str) -> Iterator[Any]:
+        """Borrow a crew for the duration of a `with` block"""
+        crew = self.acquire(name)
+        try:
+            yield crew
+        finally:
+            self.release(name, crew)
+
+    def warm(self, name: str, count: int = 1) -> None:
+        """Pre-build idle crews so the first requests are pool hits"""
+        for _ in range(count):
+            crew = self._build(name)
+            with self._lock:
+                if len(self._idle[name]) >= self.max_idle:
+                    break
+                self._idle[name].append(crew)
+
+    def clear(self) -> None:
+        """Drop every idle crew"""
+        with self._lock:
+            for idle in self._idle.values():
+                idle.clear()
+
+    def stats(self) -> Dict[str, Dict[str, float]]:
+        """Hit/miss counters and build times per crew"""
+        with self._lock:
+            report = {}
+            for name, stats in self._stats.items():
+                builds = stats["builds"]
+                requests = stats["hits"] + stats["misses"]
+                report[name] = {
+                    **stats,
+                    "idle": len(self._idle[name]),
+                    "hit_rate": stats["hits"] / requests if requests else 0.0,
+                    "avg_build_seconds": stats["build_seconds"] / builds if builds else 0.0,
+                }
+            return report
+
+
+_crew_pool: Optional[CrewPool] = None
+_crew_pool_lock = threading.Lock()
+
+
+def _register_default_crews(pool: CrewPool) -> None:
+    from transportation_flow.crews.extraction_crew.extraction_crew import ExtractionCrew
+    from transportation_flow.crews.summary_crew.summary_crew import SummaryCrew
+
+    share_parsed_configs(ExtractionCrew)
+    share_parsed_configs(SummaryCrew)
+
+    pool.register("extraction", lambda: ExtractionCrew().extraction_crew())
+    pool.register("extract_and_ask", lambda: ExtractionCrew().extract_and_ask_crew())
+    pool.register("conversation", lambda: ExtractionCrew().conversation_crew())
+    pool.register("summary", lambda: SummaryCrew().crew())
+
+
+def get_crew_pool() -> CrewPool:
+    """Return the process-wide crew pool with the flow's crews registered"""
+    global _crew_pool
+    if _crew_pool is None:
+        with _crew_pool_lock:
+            if _crew_pool is None:
+                pool = CrewPool()
+                _register_default_crews(pool)
+                _crew_pool = pool
+    return _crew_pool
+
+
+def existing_crew_pool() -> Optional[CrewPool]:
+    """The process-wide pool if a turn has built it, without building it"""
+    return _crew_pool
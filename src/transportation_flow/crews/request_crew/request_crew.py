@@ -5,6 +5,7 @@ from transportation_flow.schemas.transportation_models import (
     PartialRequest, ValidationResult
 )
 from crewai.agents.agent_builder.base_agent import BaseAgent
+from transportation_flow.settings import get_settings
 import json
 
 @CrewBase
@@ -17,14 +18,14 @@ class RequestCrew():
     def request_analyzer(self) -> Agent:
         return Agent(
             config=self.agents_config['request_analyzer'],
-            verbose=True
+            verbose=get_settings().crew_verbose
         )
 
     @agent 
     def information_validator(self) -> Agent:
         return Agent(
             config=self.agents_config['information_validator'],
-            verbose=True
+            verbose=get_settings().crew_verbose
         )
 
     @task
@@ -46,5 +47,5 @@ class RequestCrew():
             agents=self.agents,
             tasks=self.tasks,
             process=Process.sequential,
-            verbose=True
+            verbose=get_settings().crew_verbose
         )
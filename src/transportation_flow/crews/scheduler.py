@@ -0,0 +1,135 @@
+"""Priority admission for crew calls in front of the model server.
+
+Ollama serves a handful of requests at once; past that, every extra call
+slows all the others down. The scheduler hands out a fixed number of LLM
+slots. Callers beyond that wait in a priority queue where conversations with
+fewer missing fields go first, so nearly finished requests complete and free
+their state. When the queue is full, or a caller has waited too long, the
+call is refused with `SchedulerBusy` carrying a retry hint instead of piling
+more load on the model.
+"""
+import heapq
+import itertools
+import math
+import threading
+import time
+from contextlib import contextmanager
+from typing import Iterator, List, Optional, Tuple
+
+from transportation_flow.metrics import LLM_QUEUE_REJECTIONS, LLM_QUEUE_WAIT_SECONDS
+
+
+class SchedulerBusy(RuntimeError):
+    """The LLM queue cannot take more work right now"""
+
+    def __init__(self, reason: str, retry_after: float):
+        super().__init__(f"LLM queue busy ({reason}), retry in {retry_after:.0f}s")
+        self.reason = reason
+        self.retry_after = retry_after
+
+
+class CrewScheduler:
+    """Bounded LLM slots with a priority wait queue; lower priority values go first"""
+
+    def __init__(self, capacity: int = 2, max_queue: int = 32, timeout: float = 30.0):
+        self.capacity = max(1, capacity)
+        self.max_queue = max_queue
+        self.timeout = timeout
+        self._cond = threading.Condition()
+        self._in_use = 0
+        self._waiting: List[Tuple[int, int]] = []
+        self._tickets = itertools.count()
+        # Moving average of how long a slot is held, for retry hints
+        self._hold_seconds = 5.0
+
+    @property
+    def depth(self) -> int:
+        """Callers waiting for a slot"""
+        return len(self._waiting)
+
+    @property
+    def in_use(self) -> int:
+        return self._in_use
+
+    def saturated(self) -> bool:
+        """Whether new work would be refused"""
+        with self._cond:
+            return len(self._waiting) >= self.max_queue
+
+    def retry_after(self, queued: int = 0) -> float:
+        """Rough seconds until a new caller gets a slot, with `queued` more waiting upstream"""
+        waiting = len(self._waiting) + queued
+        return float(math.ceil(self._hold_seconds * (waiting + 1) / self.capacity))
+
+    def _reject(self, reason: str, crew: str) -> SchedulerBusy:
+        LLM_QUEUE_REJECTIONS.inc(reason=reason, crew=crew)
+        return SchedulerBusy(reason, self.retry_after())
+
+    def acquire(self, priority: int = 0, crew: str = "") -> None:
+        """Wait for a slot; raises `SchedulerBusy` when the queue is full or the wait times out"""
+        started = time.perf_counter()
+        with self._cond:
+            if self._in_use < self.capacity and not self._waiting:
+                self._in_use += 1
+                LLM_QUEUE_WAIT_SECONDS.observe(0.0, crew=crew)
+                return
+            if len(self._waiting) >= self.max_queue:
+                raise self._reject("queue_full", crew)
+
+            ticket = (priority, next(self._tickets))
+            heapq.heappush(self._waiting, ticket)
+            deadline = started + self.timeout
+            try:
+                while self._in_use >= self.capacity or self._waiting[0] != ticket:
+                    remaining = deadline - time.perf_counter()
+                    if remaining <= 0:
+                        raise self._reject("timeout", crew)
+                    self._cond.wait(remaining)
+            except BaseException:
+                self._waiting.remove(ticket)
+                heapq.heapify(self._waiting)
+                self._cond.notify_all()
+                raise
+            heapq.heappop(self._waiting)
+            self._in_use += 1
+            # The next ticket may fit in a slot that is still free
+            self._cond.notify_all()
+        LLM_QUEUE_WAIT_SECONDS.observe(time.perf_counter() - started, crew=crew)
+
+    def release(self, held_seconds: Optional[float] = None) -> None:
+        with self._cond:
+            self._in_use -= 1
+            if held_seconds is not None:
+                self._hold_seconds = 0.8 * self._hold_seconds + 0.2 * held_seconds
+            self._cond.notify_all()
+
+    @contextmanager
+    def slot(self, priority: int = 0, crew: str = "") -> Iterator[None]:
+        """Hold an LLM slot for the duration of a `with` block"""
+        self.acquire(priority, crew)
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.release(time.perf_counter() - started)
+
+
+_scheduler: Optional[CrewScheduler] = None
+_scheduler_lock = threading.Lock()
+
+
+def get_scheduler() -> CrewScheduler:
+    """Process-wide scheduler sized from the settings"""
+    global _scheduler
+    if _scheduler is None:
+        with _scheduler_lock:
+            if _scheduler is None:
+                from transportation_flow.settings import get_settings
+
+                settings = get_settings()
+                _scheduler = CrewScheduler(
+                    capacity=settings.llm_max_concurrent_calls,
+                    max_queue=settings.llm_queue_max,
+                    timeout=settings.llm_queue_timeout_seconds
+                )
+    return _scheduler
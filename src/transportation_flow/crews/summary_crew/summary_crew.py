@@ -1,6 +1,8 @@
 from crewai import Agent, Crew, Process, Task
 from crewai.project import CrewBase, agent, crew, task
 from crewai.agents.agent_builder.base_agent import BaseAgent
+from transportation_flow.settings import get_settings
+from transportation_flow.crews.ollama import build_llm
 from typing import List
 
 @CrewBase
@@ -13,7 +15,8 @@ class SummaryCrew():
     def service_summarizer(self) -> Agent:
         return Agent(
             config=self.agents_config['service_summarizer'],
-            verbose=True
+            llm=build_llm(self.agents_config['service_summarizer'].get('llm')),
+            verbose=get_settings().crew_verbose
         )
     
     @task
@@ -29,5 +32,5 @@ class SummaryCrew():
             agents=[self.service_summarizer()],
             tasks=[self.create_summary()],
             process=Process.sequential,
-            verbose=True
+            verbose=get_settings().crew_verbose
         )
@@ -0,0 +1,141 @@
+"""Cache for extraction crew results.
+
+Many inbound messages repeat ("Hola, necesito un servicio de transporte",
+"al aeropuerto", "sí, con maletas"). Results are cached on a normalized form
+of the message plus the conversation context it was extracted in, so a repeat
+costs a dictionary lookup instead of an LLM call.
+"""
+import hashlib
+import json
+import re
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+
+from transportation_flow.extraction.rules import normalize_text
+
+_PUNCTUATION = re.compile(r"[^\w\s+]")
+
+
+def normalize_message(text: str) -> str:
+    """Canonical form used for cache keys: lowercase, no accents or punctuation"""
+    text = _PUNCTUATION.sub(" ", normalize_text(text or ""))
+    return " ".join(text.split())
+
+
+def cache_key(message: str, context: str = "") -> str:
+    """Stable key for a message extracted in a given context"""
+    raw = f"{normalize_message(message)}\x00{normalize_message(context)}"
+    return hashlib.sha1(raw.encode("utf-8")).hexdigest()
+
+
+class ExtractionCache:
+    """Size-capped LRU with TTL, optionally backed by Redis for all workers"""
+
+    def __init__(
+        self,
+        max_entries: int = 1024,
+        ttl_seconds: float = 3600,
+        redis_client=None,
+        prefix: str = "transport:extraction"
+    ):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.redis = redis_client
+        self.prefix = prefix
+        self._entries: "OrderedDict[str, Tuple[float, Dict[str, Any]]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._stats = {"hits": 0, "redis_hits": 0, "misses": 0, "evictions": 0}
+
+    def get(self, message: str, context: str = "") -> Optional[Dict[str, Any]]:
+        """Cached extraction for this message and context, if any"""
+        key = cache_key(message, context)
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                expires_at, value = entry
+                if expires_at > now:
+                    self._entries.move_to_end(key)
+                    self._stats["hits"] += 1
+                    return dict(value)
+                del self._entries[key]
+
+        if self.redis is not None:
+            try:
+                payload = self.redis.get(f"{self.prefix}:{key}")
+            except Exception:
+                # A shared-cache outage must not fail the turn
+                payload = None
+            if payload is not None:
+                value = json.loads(payload)
+                self._store_local(key, value)
+                with self._lock:
+                    self._stats["redis_hits"] += 1
+                return dict(value)
+
+        with self._lock:
+            self._stats["misses"] += 1
+        return None
+
+    def set(self, message: str, context: str, value: Dict[str, Any]) -> None:
+        """Remember the extraction result for this message and context"""
+        key = cache_key(message, context)
+        self._store_local(key, dict(value))
+        if self.redis is not None:
+            try:
+                self.redis.set(
+                    f"{self.prefix}:{key}",
+                    json.dumps(value, ensure_ascii=False),
+                    ex=int(self.ttl_seconds)
+                )
+            except Exception:
+                pass
+
+    def _store_local(self, key: str, value: Dict[str, Any]) -> None:
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl_seconds, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self._stats["evictions"] += 1
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> Dict[str, float]:
+        """Hit/miss counters and hit rate"""
+        with self._lock:
+            stats = dict(self._stats)
+            stats["size"] = len(self._entries)
+        lookups = stats["hits"] + stats["redis_hits"] + stats["misses"]
+        stats["hit_rate"] = (stats["hits"] + stats["redis_hits"]) / lookups if lookups else 0.0
+        return stats
+
+
+_extraction_cache: Optional[ExtractionCache] = None
+_extraction_cache_lock = threading.Lock()
+
+
+def get_extraction_cache() -> ExtractionCache:
+    """Process-wide extraction cache configured from settings"""
+    global _extraction_cache
+    if _extraction_cache is None:
+        with _extraction_cache_lock:
+            if _extraction_cache is None:
+                from transportation_flow.settings import get_settings
+
+                settings = get_settings()
+                redis_client = None
+                if settings.extraction_cache_shared and settings.redis_url:
+                    import redis
+
+                    redis_client = redis.Redis.from_url(settings.redis_url)
+                _extraction_cache = ExtractionCache(
+                    max_entries=settings.extraction_cache_size,
+                    ttl_seconds=settings.extraction_cache_ttl_seconds,
+                    redis_client=redis_client
+                )
+    return _extraction_cache
@@ -0,0 +1,263 @@
+"""Offline gazetteer of Colombian places for address normalization.
+
+Pickup and drop-off addresses arrive as free text ("Aeropuerto El Dorado",
+"cll 10 # 43-20, Medellin", "terminal del salitre"). Matching them against a
+local list of municipalities (DANE codes), airports (IATA codes) and
+landmarks turns them into stable city and place codes without a model call.
+Names and aliases live in a character trie: addresses are scanned for the
+longest name starting at each word, and when nothing matches exactly, a
+bounded edit-distance walk over the same trie absorbs typos. That walk only
+tries word runs that could be a name and stops after a fixed number of trie
+nodes, so an address naming no place costs a fraction of a millisecond. The
+index is built on first use, and resolved addresses are memoized.
+"""
+import threading
+from functools import lru_cache
+from pathlib import Path
+from typing import Dict, Iterable, List, NamedTuple, Optional, Tuple
+
+from transportation_flow.extraction.cache import normalize_message
+from transportation_flow.metrics import PLACE_LOOKUPS
+
+GAZETTEER_PATH = Path(__file__).parent / "data" / "places.tsv"
+
+# More specific places win over the municipality they sit in
+KIND_RANK = {"airport": 0, "landmark": 1, "municipality": 2}
+
+# Address words that are never place names, even one typo away from one
+ADDRESS_WORDS = {
+    "calle", "cll", "carrera", "cra", "kra", "avenida", "av", "diagonal",
+    "transversal", "barrio", "edificio", "torre", "apartamento", "apto",
+    "casa", "local", "oficina", "piso", "sector", "vereda", "kilometro",
+    "km", "norte", "sur", "oriente", "occidente", "numero", "entre", "frente",
+}
+
+# Connector words: a run of them, or a run ending in one, is never a place name
+STOPWORDS = {
+    "a", "al", "de", "del", "el", "en", "la", "las", "lo", "los", "mi", "mis",
+    "su", "sus", "un", "una", "y", "con", "por", "para", "que", "cerca",
+}
+
+# Trie nodes the fuzzy pass may visit per address before giving up
+FUZZY_BUDGET = 600
+
+# Trie key holding the places whose name ends at a node
+_END = ""
+_ENYE = str.maketrans("ñ", "n")
+
+
+def normalize_place(text: str) -> str:
+    """Lowercase, accent- and punctuation-free form names are indexed under"""
+    return normalize_message(text).translate(_ENYE)
+
+
+def max_typos(name: str) -> int:
+    """Edit distance tolerated for a name of this length"""
+    if len(name) < 6:
+        return 0
+    return 1 if len(name) < 10 else 2
+
+
+class Place(NamedTuple):
+    code: str
+    name: str
+    kind: str
+    city_code: str
+    department: str
+
+
+class PlaceMatch(NamedTuple):
+    place: Place
+    text: str
+    distance: int
+
+
+class Gazetteer:
+    """Place names and aliases indexed in a character trie"""
+
+    def __init__(self, entries: Iterable[Tuple[Place, Iterable[str]]] = ()):
+        self._trie: Dict[str, dict] = {}
+        self._places: Dict[str, Place] = {}
+        # Longest name, in words, starting with each first word
+        self._max_words: Dict[str, int] = {}
+        for place, aliases in entries:
+            self.add(place, aliases)
+        self.resolve = lru_cache(maxsize=4096)(self._resolve)
+
+    @classmethod
+    def load(cls, path: Path = GAZETTEER_PATH) -> "Gazetteer":
+        """Read a tab-separated gazetteer: kind, code, name, city_code, department, aliases"""
+        entries = []
+        with open(path, encoding="utf-8") as f:
+            for line in f:
+                if not line.strip() or line.startswith("#"):
+                    continue
+                columns = line.rstrip("\n").split("\t")
+                kind, code, name, city_code, department = columns[:5]
+                aliases = columns[5].split("|") if len(columns) > 5 and columns[5] else []
+                entries.append((Place(code, name, kind, city_code, department), aliases))
+        return cls(entries)
+
+    def __len__(self) -> int:
+        return len(self._places)
+
+    def get(self, code: str) -> Optional[Place]:
+        return self._places.get(code)
+
+    def city_of(self, place: Place) -> Optional[Place]:
+        """Municipality a place belongs to"""
+        return self._places.get(place.city_code)
+
+    def add(self, place: Place, aliases: Iterable[str] = ()) -> None:
+        self._places[place.code] = place
+        for key in {normalize_place(place.name), *map(normalize_place, aliases)}:
+            if not key:
+                continue
+            node = self._trie
+            for char in key:
+                node = node.setdefault(char, {})
+            node.setdefault(_END, []).append(place)
+            words = key.split(" ")
+            self._max_words[words[0]] = max(self._max_words.get(words[0], 1), len(words))
+        if hasattr(self, "resolve"):
+            self.resolve.cache_clear()
+
+    def lookup(self, name: str) -> List[Place]:
+        """Places whose name or alias is exactly `name`, ignoring case and accents"""
+        node = self._trie
+        for char in normalize_place(name):
+            node = node.get(char)
+            if node is None:
+                return []
+        return list(node.get(_END, ()))
+
+    def scan(self, text: str) -> List[PlaceMatch]:
+        """Longest exact place names in `text`, starting and ending at word boundaries"""
+        text = normalize_place(text)
+        matches = []
+        start, length = 0, len(text)
+        while start < length:
+            node, end, found = self._trie, start, None
+            while end < length:
+                node = node.get(text[end])
+                if node is None:
+                    break
+                end += 1
+                if _END in node and (end == length or text[end] == " "):
+                    found = (end, node[_END])
+            if found:
+                end, places = found
+                matches.extend(PlaceMatch(place, text[start:end], 0) for place in places)
+                start = end + 1
+            else:
+                next_space = text.find(" ", start)
+                start = length if next_space < 0 else next_space + 1
+        return matches
+
+    def fuzzy(self, name: str, max_distance: Optional[int] = None) -> List[PlaceMatch]:
+        """Places within `max_distance` edits of `name`; the first letter must match"""
+        name = normalize_place(name)
+        if max_distance is None:
+            max_distance = max_typos(name)
+        return sorted(self._walk(name, max_distance)[0], key=lambda match: match.distance)
+
+    def _walk(self, name: str, max_distance: int,
+              budget: Optional[int] = None) -> Tuple[List[PlaceMatch], int]:
+        """Fuzzy matches for a normalized name, and the trie nodes visited finding them"""
+        if not name or name[0] not in self._trie:
+            return [], 0
+
+        # Levenshtein rows computed once per trie node, shared by every name below it
+        matches = []
+        columns = len(name) + 1
+        first_row = list(range(columns))
+        far = max_distance + 1
+        stack = [(self._trie[name[0]], name[0], first_row)]
+        visited = 0
+        while stack and (budget is None or visited < budget):
+            visited += 1
+            node, char, previous = stack.pop()
+            depth = previous[0] + 1
+            # Cells further than max_distance from the diagonal can never come back under it
+            row = [depth] + [far] * (columns - 1)
+            for i in range(max(1, depth - max_distance), min(columns, depth + max_distance + 1)):
+                row[i] = min(
+                    row[i - 1] + 1,
+                    previous[i] + 1,
+                    previous[i - 1] + (name[i - 1] != char)
+                )
+            if row[-1] <= max_distance and _END in node:
+                matches.extend(PlaceMatch(place, name, row[-1]) for place in node[_END])
+            if min(row) <= max_distance:
+                stack.extend(
+                    (child, child_char, row)
+                    for child_char, child in node.items() if child_char != _END
+                )
+        return matches, visited
+
+    def _fuzzy_candidates(self, address: str) -> List[str]:
+        """Word n-grams of `address` that could be a misspelled place name"""
+        candidates: Dict[str, None] = {}
+        for segment in address.split(","):
+            words = normalize_place(segment).split()
+            for i, first in enumerate(words):
+                if first in ADDRESS_WORDS or first[0].isdigit():
+                    continue
+                # Longer runs are only tried up to the longest name starting with this word
+                for size in range(1, self._max_words.get(first, 1) + 1):
+                    gram = words[i:i + size]
+                    if len(gram) < size:
+                        break
+                    if gram[-1] in STOPWORDS:
+                        continue
+                    candidates[" ".join(gram)] = None
+        return [candidate for candidate in candidates if max_typos(candidate)]
+
+    def _resolve(self, address: str) -> Optional[PlaceMatch]:
+        matches = self.scan(address)
+        if not matches:
+            budget = FUZZY_BUDGET
+            for candidate in self._fuzzy_candidates(address):
+                found, visited = self._walk(candidate, max_typos(candidate), budget)
+                matches.extend(found)
+                budget -= visited
+                if budget <= 0:
+                    break
+        if not matches:
+            return None
+
+        # A named city settles which of several same-named places is meant
+        cities = {match.place.code for match in matches if match.place.kind == "municipality"}
+        return min(matches, key=lambda match: (
+            match.distance,
+            KIND_RANK.get(match.place.kind, len(KIND_RANK)),
+            match.place.city_code not in cities,
+            -len(match.text)
+        ))
+
+
+def address_codes(address: Optional[str]) -> Tuple[Optional[str], Optional[str]]:
+    """(municipality code, airport/landmark code) for a free-text address"""
+    if not address:
+        return None, None
+    match = get_gazetteer().resolve(address)
+    if match is None:
+        PLACE_LOOKUPS.inc(outcome="miss")
+        return None, None
+    PLACE_LOOKUPS.inc(outcome="fuzzy" if match.distance else "exact")
+    place = match.place
+    return place.city_code, None if place.kind == "municipality" else place.code
+
+
+_gazetteer: Optional[Gazetteer] = None
+_gazetteer_lock = threading.Lock()
+
+
+def get_gazetteer() -> Gazetteer:
+    """Process-wide gazetteer, loaded from the bundled data on first use"""
+    global _gazetteer
+    if _gazetteer is None:
+        with _gazetteer_lock:
+            if _gazetteer is None:
+                _gazetteer = Gazetteer.load()
+    return _gazetteer
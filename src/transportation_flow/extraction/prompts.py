@@ -0,0 +1,62 @@
+"""Builds the field list of the extraction prompt from what is still unknown.
+
+The extraction task used to describe all eleven fields on every turn. Prompt
+length dominates local model latency, so the prompt now lists only the fields
+the conversation still needs and passes the known values as one compact line.
+"""
+import json
+from typing import Any, Dict, List, Tuple
+
+# Prompt line per request field, in the order they are asked
+FIELD_DESCRIPTIONS = {
+    'nombre_solicitante': "client's full name",
+    'cc_nit': "ID or NIT number",
+    'celular_contacto': "phone number",
+    'fecha_inicio_servicio': "service start date",
+    'hora_inicio_servicio': "service start time",
+    'direccion_inicio': "pickup address with city",
+    'direccion_terminacion': "destination address with city",
+    'cantidad_pasajeros': "number of passengers as integer",
+    'equipaje_carga': (
+        "true if luggage/cargo mentioned, false if explicitly no luggage, "
+        "null if not mentioned"
+    ),
+}
+
+# The field list the prompt carried before it was narrowed
+LEGACY_FIELD_LINES = [
+    "- nombre_solicitante (client's full name)",
+    "- cc_nit (ID or NIT number)",
+    "- celular_contacto (phone number)",
+    "- quien_solicita (who is requesting - person/role)",
+    "- fecha_inicio_servicio (service start date)",
+    "- hora_inicio_servicio (service start time)",
+    "- direccion_inicio (pickup address with city)",
+    "- direccion_terminacion (destination address with city)",
+    "- cantidad_pasajeros (number of passengers as integer)",
+    "- equipaje_carga (true if luggage/cargo mentioned, false if explicitly no luggage, null if not mentioned)",
+    "- caracteristicas_servicio (any special requirements mentioned)",
+]
+LEGACY_PROMPT_CHARS = len("\n".join(LEGACY_FIELD_LINES))
+
+# Rough size of a token for Spanish/English prompt text
+CHARS_PER_TOKEN = 4
+
+
+def fields_to_extract(known_info: Dict[str, Any]) -> List[str]:
+    """Request fields without a value yet, required and optional"""
+    return [field for field in FIELD_DESCRIPTIONS if known_info.get(field) is None]
+
+
+def build_field_prompt(known_info: Dict[str, Any]) -> Tuple[str, str]:
+    """(`fields_to_extract`, `known_info`) task inputs for the extraction prompt"""
+    fields = fields_to_extract(known_info)
+    field_lines = "\n".join(f"- {field} ({FIELD_DESCRIPTIONS[field]})" for field in fields)
+    known = {k: v for k, v in known_info.items() if k in FIELD_DESCRIPTIONS and v is not None}
+    known_line = json.dumps(known, ensure_ascii=False, separators=(",", ":")) if known else "none"
+    return field_lines, known_line
+
+
+def estimated_tokens_saved(field_lines: str, known_line: str) -> int:
+    """Prompt tokens saved against the full eleven-field list"""
+    return max(0, (LEGACY_PROMPT_CHARS - len(field_lines) - len(known_line)) // CHARS_PER_TOKEN)
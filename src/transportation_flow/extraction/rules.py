@@ -0,0 +1,425 @@
+"""Rule-based fast path for extracting request fields from Spanish messages.
+
+Runs before the ExtractionCrew so that short follow-up answers ("3001234567",
+"somos 4", "sin maletas") never pay for an LLM round trip. The same date and
+time rules normalize what the model returns for those fields ("pasado
+mañana", "3 PM"), so the state always holds an ISO date and an HH:MM time.
+"""
+import re
+from datetime import date, datetime, time, timedelta, timezone
+from functools import lru_cache
+from typing import Any, Dict, List, Optional, Tuple
+
+from pydantic import BaseModel, Field
+
+# Fields this extractor knows how to fill
+RULE_FIELDS = [
+    'celular_contacto', 'cc_nit', 'cantidad_pasajeros',
+    'hora_inicio_servicio', 'fecha_inicio_servicio', 'equipaje_carga'
+]
+
+try:
+    from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
+    SERVICE_TIMEZONE = ZoneInfo("America/Bogota")
+except ZoneInfoNotFoundError:
+    # No tz database (e.g. Windows without tzdata); Colombia keeps UTC-5 all year
+    SERVICE_TIMEZONE = timezone(timedelta(hours=-5), "America/Bogota")
+
+# One-to-one character map so match offsets stay valid on the original text
+_ACCENTS = str.maketrans("áéíóúüÁÉÍÓÚÜ", "aeiouuaeiouu")
+
+NUMBER_WORDS = {
+    'un': 1, 'una': 1, 'uno': 1, 'dos': 2, 'tres': 3, 'cuatro': 4,
+    'cinco': 5, 'seis': 6, 'siete': 7, 'ocho': 8, 'nueve': 9, 'diez': 10,
+    'once': 11, 'doce': 12, 'trece': 13, 'catorce': 14, 'quince': 15,
+    'dieciseis': 16, 'diecisiete': 17, 'dieciocho': 18, 'diecinueve': 19,
+    'veinte': 20, 'treinta': 30, 'cuarenta': 40, 'cincuenta': 50,
+}
+
+MONTHS = {
+    'enero': 1, 'febrero': 2, 'marzo': 3, 'abril': 4, 'mayo': 5, 'junio': 6,
+    'julio': 7, 'agosto': 8, 'septiembre': 9, 'setiembre': 9, 'octubre': 10,
+    'noviembre': 11, 'diciembre': 12,
+}
+
+WEEKDAYS = {
+    'lunes': 0, 'martes': 1, 'miercoles': 2, 'jueves': 3,
+    'viernes': 4, 'sabado': 5, 'domingo': 6,
+}
+
+# Words that carry no request information on their own. If nothing else is
+# left after removing the matched spans, the LLM has nothing to add.
+FILLER_WORDS = {
+    'hola', 'buenas', 'buenos', 'dias', 'tardes', 'noches', 'si', 'no', 'ok',
+    'vale', 'listo', 'claro', 'gracias', 'muchas', 'por', 'favor', 'porfa',
+    'es', 'son', 'seria', 'serian', 'sera', 'mi', 'mis', 'el', 'la', 'los',
+    'las', 'lo', 'de', 'del', 'a', 'al', 'para', 'con', 'y', 'o', 'e', 'en',
+    'un', 'una', 'unos', 'unas', 'que', 'ya', 'bueno', 'perfecto', 'dale',
+    'numero', 'celular', 'cel', 'telefono', 'whatsapp', 'contacto', 'cedula',
+    'cc', 'nit', 'documento', 'identificacion', 'somos', 'seremos', 'vamos',
+    'necesito', 'necesitamos', 'quiero', 'queremos', 'quisiera', 'servicio',
+    'transporte', 'solicitar', 'solicito', 'me', 'nos', 'te', 'le', 'eso',
+    'esto', 'correcto', 'exacto', 'hora', 'fecha', 'dia', 'pasajeros',
+    'personas', 'equipaje', 'maletas', 'sera', 'aproximadamente', 'como',
+}
+
+_NUMBER_WORD_RE = '|'.join(sorted(NUMBER_WORDS, key=len, reverse=True))
+_MONTH_RE = '|'.join(MONTHS)
+_WEEKDAY_RE = '|'.join(WEEKDAYS)
+_LUGGAGE_RE = r'(?:equipaje|maletas?|maletines?|valijas?|morrales?|carga|bultos?)'
+
+PHONE_PATTERN = re.compile(
+    r'(?<![\d.])(?:\+?\s?57[\s.-]?)?(3\d{2})[\s.-]?(\d{3})[\s.-]?(\d{4})(?![\d-])'
+)
+NIT_PATTERN = re.compile(
+    r'(?<![\d.])(\d{3}\.?\d{3}\.?\d{3})\s?-\s?(\d)(?!\d)'
+)
+CUED_ID_PATTERN = re.compile(
+    r'\b(?:c\.?\s?c\.?|cedula|nit|documento|identificacion)'
+    r'\s*(?:es|:|no\.?|numero|#)?\s*(?:es\s*)?(\d[\d.\s]{4,14}\d)(?!\d)'
+)
+BARE_ID_PATTERN = re.compile(
+    r'(?<![\d.:/-])(\d{1,3}(?:\.\d{3}){1,3}|\d{6,10})(?![\d:/]|\s?(?:am|pm|h\b))'
+)
+PASSENGERS_PATTERNS = [
+    re.compile(
+        r'\b(\d{1,3}|' + _NUMBER_WORD_RE + r')\s+(?:personas|pasajeros|pax|adultos'
+        r'|viajeros|personitas|ocupantes)\b'
+    ),
+    re.compile(
+        r'\b(?:somos|seremos|vamos|viajamos|van|viajan)\s+(\d{1,3}|' + _NUMBER_WORD_RE + r')\b'
+    ),
+    re.compile(
+        r'\b(?:pasajeros|cantidad de pasajeros|personas)\s*(?::|son|seran)?\s*(\d{1,3})\b'
+    ),
+]
+# Optional "a las" / "desde las" lead-in, consumed together with the time
+_AT = r'(?:\ba\s+las?\s+|\bdesde\s+las?\s+)?\b'
+SOLO_PATTERN = re.compile(r'\b(?:voy sol[oa]|solo yo|yo sol[oa]|viajo sol[oa])\b')
+# Hour with optional ":30" or "y media" / "y cuarto" / "menos cuarto"
+_HOUR = r'(?P<hour>\d{1,2})(?::(?P<minute>\d{2})|\s+(?P<fraction>y\s+media|y\s+cuarto|menos\s+cuarto)\b)?'
+FRACTION_MINUTES = {'y media': 30, 'y cuarto': 15, 'menos cuarto': -15}
+TIME_PATTERNS = [
+    # 3am, 3:30 pm, 10 a.m.
+    (re.compile(_AT + _HOUR + r'\s*(?P<marker>a\.?\s?m\.?|p\.?\s?m\.?)(?![a-z])'), 'ampm'),
+    # 3 de la tarde, 7 y media en la mañana, 12 del dia
+    (re.compile(
+        _AT + _HOUR + r'\s*(?:(?:de|en|por)\s+la|del)\s+(?P<marker>mañana|tarde|noche|madrugada|dia)\b'
+    ), 'period'),
+    # 15:30, 07:00
+    (re.compile(_AT + r'(?P<hour>\d{1,2}):(?P<minute>\d{2})\b'), 'clock'),
+    # a las 15h, 15 horas
+    (re.compile(_AT + _HOUR + r'\s*(?:h|hrs|horas)\b'), 'clock'),
+    # a las 15, a las 15 y media
+    (re.compile(r'\ba\s+las\s+' + _HOUR + r'\b(?!\s*(?:de|del|personas|pasajeros))'), 'bare'),
+]
+NOON_PATTERN = re.compile(r'\b(mediodia|medio dia|medianoche|media noche)\b')
+DATE_PATTERNS = [
+    (re.compile(r'\bpasado\s+mañana\b'), 'relative'),
+    (re.compile(
+        r'\b(?:en|dentro\s+de)\s+(\d{1,2}|' + _NUMBER_WORD_RE + r')\s+dias\b'
+    ), 'in_days'),
+    (re.compile(r'(?<!de la )(?<!en la )(?<!por la )(?<!esta )\b(hoy|mañana)\b'), 'relative'),
+    (re.compile(
+        r'\b(\d{1,2})\s+de\s+(' + _MONTH_RE + r')(?:\s+(?:de|del)\s+(\d{4}))?\b'
+    ), 'day_month'),
+    (re.compile(r'(?<![\d:])(\d{1,2})/(\d{1,2})(?:/(\d{2,4}))?(?![\d:])'), 'numeric'),
+    (re.compile(
+        r'\b(?:el\s+|este\s+|el\s+proximo\s+|proximo\s+)?(' + _WEEKDAY_RE + r')\b'
+    ), 'weekday'),
+]
+LUGGAGE_NEGATIVE_PATTERN = re.compile(
+    r'\b(?:sin|no(?:\s+(?:llevamos|llevo|llevan|tenemos|tengo|hay|traemos|traigo))?)\s+'
+    r'(?:ningun\s+|nada\s+de\s+)?' + _LUGGAGE_RE + r'\b'
+)
+LUGGAGE_POSITIVE_PATTERN = re.compile(
+    r'\b(?:(?:con|llevamos|llevo|llevan|traemos|traigo|tenemos|tengo)\s+'
+    r'(?:[\w]+\s+){0,2}?)?' + _LUGGAGE_RE + r'\b'
+)
+WORD_PATTERN = re.compile(r"[a-zñ]+|\d+")
+
+
+class RuleExtraction(BaseModel):
+    """Result of the rule-based extraction pass"""
+    fields: Dict[str, Any] = Field(default_factory=dict, description="Fields filled by rules")
+    residual: str = Field(default="", description="Text left after removing matched spans")
+    needs_llm: bool = Field(default=True, description="Whether the LLM may still find more")
+
+
+def normalize_text(text: str) -> str:
+    """Lowercase and strip accents (keeping ñ) without changing offsets"""
+    return text.lower().translate(_ACCENTS)
+
+
+def _to_int(token: str) -> Optional[int]:
+    if token.isdigit():
+        return int(token)
+    return NUMBER_WORDS.get(token)
+
+
+def _format_time(hour: int, minute: int) -> Optional[str]:
+    if 0 <= hour <= 23 and 0 <= minute <= 59:
+        return f"{hour:02d}:{minute:02d}"
+    return None
+
+
+def local_today() -> date:
+    """Today's date where the service runs"""
+    return datetime.now(SERVICE_TIMEZONE).date()
+
+
+def _resolve_date(year: int, month: int, day: int) -> Optional[date]:
+    try:
+        return date(year, month, day)
+    except ValueError:
+        return None
+
+
+class RuleBasedExtractor:
+    """Deterministic extractor for the fields that have a regular shape"""
+
+    def __init__(self, today: Optional[date] = None):
+        self._today = today
+
+    @property
+    def today(self) -> date:
+        return self._today or local_today()
+
+    def extract(self, message: str) -> RuleExtraction:
+        """Extract known fields from a message"""
+        text = normalize_text(message or "")
+        spans: List[Tuple[int, int]] = []
+        fields: Dict[str, Any] = {}
+
+        def claim(match: re.Match) -> None:
+            spans.append(match.span())
+
+        def free(match: re.Match) -> bool:
+            start, end = match.span()
+            return all(end <= s or start >= e for s, e in spans)
+
+        # Phone numbers first: they are the most distinctive 10-digit shape
+        for match in PHONE_PATTERN.finditer(text):
+            if free(match):
+                fields['celular_contacto'] = "".join(match.groups())
+                claim(match)
+                break
+
+        for match in NIT_PATTERN.finditer(text):
+            if free(match):
+                digits = re.sub(r'\D', '', match.group(1))
+                fields['cc_nit'] = f"{digits}-{match.group(2)}"
+                claim(match)
+                break
+
+        if 'cc_nit' not in fields:
+            for match in CUED_ID_PATTERN.finditer(text):
+                if free(match):
+                    fields['cc_nit'] = re.sub(r'\D', '', match.group(1))
+                    claim(match)
+                    break
+
+        self._extract_time(text, fields, claim, free)
+        self._extract_date(text, fields, claim, free)
+        self._extract_passengers(text, fields, claim, free)
+        self._extract_luggage(text, fields, claim, free)
+
+        # A bare long number that is not a phone, date or time is an ID
+        if 'cc_nit' not in fields:
+            for match in BARE_ID_PATTERN.finditer(text):
+                if free(match):
+                    digits = re.sub(r'\D', '', match.group(1))
+                    if 6 <= len(digits) <= 10:
+                        fields['cc_nit'] = digits
+                        claim(match)
+                        break
+
+        residual = self._residual(text, spans)
+        # Leftover digits mean something the rules could not place ("a las 3")
+        needs_llm = any(
+            word not in FILLER_WORDS for word in WORD_PATTERN.findall(residual)
+        )
+        return RuleExtraction(fields=fields, residual=residual, needs_llm=needs_llm)
+
+    def _extract_time(self, text, fields, claim, free) -> None:
+        for pattern, kind in TIME_PATTERNS:
+            for match in pattern.finditer(text):
+                if not free(match):
+                    continue
+                groups = match.groupdict()
+                hour = int(groups['hour'])
+                minute = int(groups['minute'] or 0)
+                marker = groups.get('marker') or ""
+                if groups.get('fraction'):
+                    minute = FRACTION_MINUTES[" ".join(groups['fraction'].split())]
+                    if minute < 0:
+                        # "1 menos cuarto" is 12:45 of the same period
+                        hour, minute = hour - 1 if hour != 1 else 12, 60 + minute
+                if kind == 'ampm':
+                    is_pm = marker.startswith('p')
+                    if hour > 12:
+                        continue
+                    hour = hour % 12 + (12 if is_pm else 0)
+                elif kind == 'period':
+                    if hour > 12:
+                        continue
+                    if marker in ('tarde', 'noche') and hour < 12:
+                        hour += 12
+                    elif marker in ('mañana', 'madrugada', 'noche') and hour == 12:
+                        # "12 de la noche" is midnight, like "12 de la madrugada"
+                        hour = 0
+                elif kind == 'bare' and 1 <= hour <= 12:
+                    # "a las 3" could be AM or PM; leave it to the LLM
+                    continue
+                value = _format_time(hour, minute)
+                if value:
+                    fields['hora_inicio_servicio'] = value
+                    claim(match)
+                    return
+
+        match = NOON_PATTERN.search(text)
+        if match and free(match):
+            fields['hora_inicio_servicio'] = "00:00" if "noche" in match.group(1) else "12:00"
+            claim(match)
+
+    def _extract_date(self, text, fields, claim, free) -> None:
+        today = self.today
+        for pattern, kind in DATE_PATTERNS:
+            for match in pattern.finditer(text):
+                if not free(match):
+                    continue
+                value = None
+                if kind == 'relative':
+                    word = match.group(0)
+                    if word.startswith('pasado'):
+                        value = today + timedelta(days=2)
+                    elif word == 'hoy':
+                        value = today
+                    else:
+                        value = today + timedelta(days=1)
+                elif kind == 'in_days':
+                    days = _to_int(match.group(1))
+                    value = today + timedelta(days=days) if days is not None else None
+                elif kind == 'day_month':
+                    day, month = int(match.group(1)), MONTHS[match.group(2)]
+                    year = int(match.group(3)) if match.group(3) else today.year
+                    value = _resolve_date(year, month, day)
+                    if value and not match.group(3) and value < today:
+                        value = _resolve_date(year + 1, month, day)
+                elif kind == 'numeric':
+                    day, month = int(match.group(1)), int(match.group(2))
+                    year = match.group(3)
+                    if year:
+                        year = int(year) + (2000 if len(year) == 2 else 0)
+                    value = _resolve_date(year or today.year, month, day)
+                    if value and not year and value < today:
+                        value = _resolve_date(today.year + 1, month, day)
+                elif kind == 'weekday':
+                    ahead = (WEEKDAYS[match.group(1)] - today.weekday()) % 7 or 7
+                    value = today + timedelta(days=ahead)
+                if value:
+                    fields['fecha_inicio_servicio'] = value.isoformat()
+                    claim(match)
+                    return
+
+    def _extract_passengers(self, text, fields, claim, free) -> None:
+        for pattern in PASSENGERS_PATTERNS:
+            for match in pattern.finditer(text):
+                if not free(match):
+                    continue
+                count = _to_int(match.group(1))
+                if count and 0 < count <= 200:
+                    fields['cantidad_pasajeros'] = count
+                    claim(match)
+                    return
+
+        match = SOLO_PATTERN.search(text)
+        if match and free(match):
+            fields['cantidad_pasajeros'] = 1
+            claim(match)
+
+    def _extract_luggage(self, text, fields, claim, free) -> None:
+        match = LUGGAGE_NEGATIVE_PATTERN.search(text)
+        if match and free(match):
+            fields['equipaje_carga'] = False
+            claim(match)
+            return
+
+        match = LUGGAGE_POSITIVE_PATTERN.search(text)
+        if match and free(match):
+            fields['equipaje_carga'] = True
+            claim(match)
+
+    @staticmethod
+    def _residual(text: str, spans: List[Tuple[int, int]]) -> str:
+        if not spans:
+            return text.strip()
+        parts = []
+        cursor = 0
+        for start, end in sorted(spans):
+            parts.append(text[cursor:start])
+            cursor = max(cursor, end)
+        parts.append(text[cursor:])
+        return " ".join(" ".join(parts).split())
+
+
+_default_extractor = RuleBasedExtractor()
+
+
+def extract_fields(message: str) -> RuleExtraction:
+    """Run the shared rule-based extractor on a message"""
+    return _default_extractor.extract(message)
+
+
+def _claim_nothing(match: re.Match) -> None:
+    pass
+
+
+def _always_free(match: re.Match) -> bool:
+    return True
+
+
+@lru_cache(maxsize=1024)
+def _parse_date(text: str, today: date) -> Optional[str]:
+    fields: Dict[str, Any] = {}
+    RuleBasedExtractor(today)._extract_date(text, fields, _claim_nothing, _always_free)
+    return fields.get('fecha_inicio_servicio')
+
+
+@lru_cache(maxsize=1024)
+def _parse_time(text: str) -> Optional[str]:
+    fields: Dict[str, Any] = {}
+    _default_extractor._extract_time(text, fields, _claim_nothing, _always_free)
+    return fields.get('hora_inicio_servicio')
+
+
+def normalize_date(value: Optional[str], today: Optional[date] = None) -> Optional[str]:
+    """ISO date for a Spanish date expression; text that is not one is returned as given"""
+    if not value:
+        return value
+    try:
+        return date.fromisoformat(value.strip()[:10]).isoformat()
+    except ValueError:
+        pass
+    return _parse_date(normalize_text(value), today or local_today()) or value
+
+
+def normalize_time(value: Optional[str]) -> Optional[str]:
+    """HH:MM for a Spanish time expression; text that is not one is returned as given"""
+    if not value:
+        return value
+    try:
+        return time.fromisoformat(value.strip()).strftime("%H:%M")
+    except ValueError:
+        pass
+    return _parse_time(normalize_text(value)) or value
+
+
+def normalize_schedule(fields: Dict[str, Any], today: Optional[date] = None) -> Dict[str, Any]:
+    """Copy of `fields` with the service date and time in ISO date / HH:MM form"""
+    fields = dict(fields)
+    if isinstance(fields.get('fecha_inicio_servicio'), str):
+        fields['fecha_inicio_servicio'] = normalize_date(fields['fecha_inicio_servicio'], today)
+    if isinstance(fields.get('hora_inicio_servicio'), str):
+        fields['hora_inicio_servicio'] = normalize_time(fields['hora_inicio_servicio'])
+    return fields
@@ -0,0 +1,130 @@
+"""Structured output for the extraction crews.
+
+The extraction agents hand Ollama a JSON schema derived from `PartialRequest`
+as its `format`, so decoding is constrained to exactly that shape. Models
+behind other servers, or cut off at the token limit, still wrap JSON in
+markdown fences, add prose around it, emit `<think>` blocks or stop
+mid-object; instead of failing the turn on `json.loads`, the raw output is
+salvaged: the first JSON object is located,
+trailing commas are dropped and a truncated object is closed after its last
+complete member.
+"""
+import json
+import re
+from typing import Any, Dict, List, Optional, Tuple
+
+from pydantic import BaseModel, Field, TypeAdapter, ValidationError, create_model
+
+from transportation_flow.schemas.transportation_models import PLACE_CODE_FIELDS, PartialRequest
+
+# Every request field the model may fill, with PartialRequest's types
+ExtractedFields = create_model(
+    "ExtractedFields",
+    **{
+        name: (field.annotation, None)
+        for name, field in PartialRequest.model_fields.items()
+        if name != "raw_message" and name not in PLACE_CODE_FIELDS
+    }
+)
+
+
+class ExtractAndAskOutput(BaseModel):
+    """Output of the combined extract-and-ask task"""
+    fields: ExtractedFields = Field(default_factory=ExtractedFields)
+    question: Optional[str] = None
+
+
+_FIELD_ADAPTERS = {
+    name: TypeAdapter(field.annotation) for name, field in ExtractedFields.model_fields.items()
+}
+# Text fields models like to answer with bare numbers (cc_nit, celular_contacto)
+_TEXT_FIELDS = {
+    name for name, field in ExtractedFields.model_fields.items()
+    if field.annotation == Optional[str]
+}
+
+_THINK_BLOCK = re.compile(r"<think>.*?(?:</think>|$)", re.DOTALL)
+_TRAILING_COMMA = re.compile(r",\s*([}\]])")
+
+
+def _loads_object(raw: str) -> Dict[str, Any]:
+    data = json.loads(_TRAILING_COMMA.sub(r"\1", raw))
+    if not isinstance(data, dict):
+        raise json.JSONDecodeError("Expected a JSON object", raw, 0)
+    return data
+
+
+def salvage_json(text: str) -> Dict[str, Any]:
+    """First JSON object in `text`, repaired if it was decorated or cut off"""
+    text = _THINK_BLOCK.sub("", text)
+    start = text.find("{")
+    if start < 0:
+        raise json.JSONDecodeError("No JSON object in output", text, 0)
+
+    stack: List[str] = []
+    in_string = escaped = False
+    # End of the last complete member and the brackets open at that point
+    safe_end, safe_stack = start + 1, ["}"]
+    for index in range(start, len(text)):
+        char = text[index]
+        if in_string:
+            if escaped:
+                escaped = False
+            elif char == "\\":
+                escaped = True
+            elif char == '"':
+                in_string = False
+            continue
+        if char == '"':
+            in_string = True
+        elif char in "{[":
+            stack.append("}" if char == "{" else "]")
+        elif char in "}]":
+            if not stack or stack[-1] != char:
+                break
+            stack.pop()
+            if not stack:
+                return _loads_object(text[start:index + 1])
+        elif char == ",":
+            safe_end, safe_stack = index, list(stack)
+
+    # Cut off mid-object: keep the complete members and close what is open
+    return _loads_object(text[start:safe_end] + "".join(reversed(safe_stack)))
+
+
+def parse_crew_output(result: Any) -> Tuple[Dict[str, Any], str]:
+    """(data, how) for a crew result; `how` is 'structured', 'json' or 'salvaged'
+
+    Raises `json.JSONDecodeError` when no object can be recovered.
+    """
+    structured = getattr(result, "json_dict", None)
+    if isinstance(structured, dict):
+        return structured, "structured"
+    model = getattr(result, "pydantic", None)
+    if isinstance(model, BaseModel):
+        return model.model_dump(), "structured"
+
+    raw = str(result)
+    try:
+        data = json.loads(raw)
+        if isinstance(data, dict):
+            return data, "json"
+    except json.JSONDecodeError:
+        pass
+    return salvage_json(raw), "salvaged"
+
+
+def coerce_fields(data: Dict[str, Any]) -> Dict[str, Any]:
+    """Known request fields converted to their types; unusable values are dropped"""
+    fields = {}
+    for name, adapter in _FIELD_ADAPTERS.items():
+        value = data.get(name)
+        if value is None:
+            continue
+        if name in _TEXT_FIELDS and isinstance(value, (int, float)) and not isinstance(value, bool):
+            value = str(value)
+        try:
+            fields[name] = adapter.validate_python(value)
+        except ValidationError:
+            continue
+    return fields
@@ -1,20 +1,40 @@
 #!/usr/bin/env python
-import os
 import json
+import os
 import uuid
-from datetime import datetime
-from crewai.flow.flow import Flow, start, listen
-from dotenv import load_dotenv
-from transportation_flow.schemas.conversation_state import ConversationState
-from transportation_flow.crews.extraction_crew.extraction_crew import ExtractionCrew
-from transportation_flow.crews.summary_crew.summary_crew import SummaryCrew
+from typing import Optional
 
-load_dotenv()
+# Subclassing Flow needs crewAI, and crewAI imports LiteLLM, which fetches its
+# model price map over the network at import unless told to use the bundled
+# copy. Prices do not apply to local Ollama models, so skip the fetch.
+os.environ.setdefault("LITELLM_LOCAL_MODEL_COST_MAP", "True")
+from crewai.flow.flow import Flow, start, listen  # noqa: E402
+from transportation_flow.schemas.conversation_state import ConversationState
+from transportation_flow.extraction.rules import extract_fields, normalize_schedule
+from transportation_flow.extraction.cache import get_extraction_cache
+from transportation_flow.extraction.gazetteer import address_codes
+from transportation_flow.extraction.prompts import (
+    build_field_prompt, estimated_tokens_saved, fields_to_extract
+)
+from transportation_flow.extraction.structured import coerce_fields, parse_crew_output
+from transportation_flow.crews.pool import get_crew_pool
+from transportation_flow.crews.scheduler import SchedulerBusy, get_scheduler
+from transportation_flow.responses.questions import FIELD_NAMES, compose_question
+from transportation_flow.responses.summary import render_summary
+from transportation_flow.schemas.transportation_models import PLACE_CODE_FIELDS
+from transportation_flow.settings import get_settings
+from transportation_flow.metrics import (
+    EXTRACTIONS, EXTRACTION_PARSES, EXTRACTION_PROMPT_TOKENS_SAVED,
+    HISTORY_SIZE, instrumented_kickoff, instrumented_step
+)
+from transportation_flow.service.conversations import run_turn
+from transportation_flow.service.state_store import InMemoryStateStore
 
 class TransportationSystemFlow(Flow[ConversationState]):
     """Simple conversational flow for transportation requests"""
     
     @start()
+    @instrumented_step("initialize_conversation")
     def initialize_conversation(self):
         """Initialize the conversation - this is the entry point"""
         print(f"\n{'='*60}")
@@ -32,6 +52,7 @@ class TransportationSystemFlow(Flow[ConversationState]):
         return "Flow initialized successfully"
     
     @listen("initialize_conversation")
+    @instrumented_step("process_user_message")
     def process_user_message(self, init_result):
         """Process the user's message with extraction crew"""
         # Get the message from state (passed via kickoff inputs)
@@ -46,55 +67,111 @@ class TransportationSystemFlow(Flow[ConversationState]):
                 "status": "error"
             }
         
-        # Add message to history
+        # The customer answered; the conversation is collecting again
+        self.state.status = "collecting_info"
+        
+        # Add message to history, folding older turns into the rolling summary
+        settings = get_settings()
         self.state.add_message("user", message)
+        self.state.compact_history(settings.history_max_messages, settings.history_summary_chars)
+        HISTORY_SIZE.observe(self.state.history_size())
         
-        # Build context from previous messages for better extraction
-        context = ""
-        if len(self.state.messages) > 1:
-            recent_messages = self.state.messages[-4:-1]  # Last 3 messages excluding current
-            context = "\n".join([
-                f"{msg['role']}: {msg['content']}" 
-                for msg in recent_messages
-            ])
+        # Build context from the summary and previous messages for better extraction
+        context_lines = []
+        if self.state.history_summary:
+            context_lines.append(f"earlier: {self.state.history_summary}")
+        recent_messages = self.state.messages[-4:-1]  # Last 3 messages excluding current
+        context_lines += [f"{msg['role']}: {msg['content']}" for msg in recent_messages]
+        context = "\n".join(context_lines)
         
-        # Extract information using crew
+        # Fast path: fill regular-shaped fields (phone, ID, date...) with rules
+        rule_result = extract_fields(message)
+        if rule_result.fields:
+            print(f"⚡ Rule-based extraction: {rule_result.fields}")
+        # Always merge, even when empty, so missing_fields is recomputed
+        self.state.update_from_partial(rule_result.fields)
+        self._locate_places()
+        
+        if not rule_result.needs_llm or not self.state.missing_fields:
+            EXTRACTIONS.inc(source="rules")
+            return {
+                "extraction_result": rule_result.fields,
+                "status": "extracted",
+                "source": "rules"
+            }
+        
+        # Extract the remaining information using crew, asking only for unknown fields
+        current_info = self._current_info()
+        field_lines, known_line = build_field_prompt(current_info)
+        prompt_inputs = {
+            "message": message,
+            "context": context,
+            "fields_to_extract": field_lines,
+            "known_info": known_line
+        }
+        # The same message asked for different fields is a different prompt
+        cache_context = f"{context}\n{' '.join(fields_to_extract(current_info))}"
         try:
-            extraction_crew = ExtractionCrew().extraction_crew()
-            result = extraction_crew.kickoff(inputs={
-                "message": message,
-                "context": context
-            })
+            cache = get_extraction_cache()
+            extracted_data = cache.get(message, cache_context)
+            question = None
+            if extracted_data is None:
+                if settings.question_mode == "combined":
+                    # One round trip returns the fields and the follow-up question
+                    extracted_data, question = self._extract_and_ask(prompt_inputs)
+                else:
+                    result = self._run_crew("extraction", prompt_inputs)
+                    
+                    # Parse extracted information, salvaging JSON wrapped in prose or fences
+                    data, parsed_as = parse_crew_output(result)
+                    EXTRACTION_PARSES.inc(outcome=parsed_as)
+                    extracted_data = coerce_fields(data)
+                cache.set(message, cache_context, extracted_data)
+                EXTRACTIONS.inc(source="llm")
+                EXTRACTION_PROMPT_TOKENS_SAVED.inc(estimated_tokens_saved(field_lines, known_line))
+            else:
+                print("♻️ Extraction cache hit")
+                EXTRACTIONS.inc(source="cache")
             
-            # Parse extracted information
-            extracted_data = json.loads(str(result))
+            # Resolve "mañana" or "3 PM" from the model to a concrete date and time
+            extracted_data = normalize_schedule(extracted_data)
+            # Rule matches are deterministic, so they win over the model's guesses
+            extracted_data.update(rule_result.fields)
             print(f"📊 Extracted data: {json.dumps(extracted_data, indent=2)}")
             
             # Update state with new information
             self.state.update_from_partial(extracted_data)
+            self._locate_places()
             
             return {
                 "extraction_result": extracted_data,
-                "status": "extracted"
+                "status": "extracted",
+                "source": "llm",
+                "question": question
             }
             
         except json.JSONDecodeError as e:
             print(f"❌ Failed to parse extraction result: {e}")
+            EXTRACTION_PARSES.inc(outcome="failed")
             return {
                 "error": f"Extraction parsing failed: {e}",
                 "status": "error"
             }
+        except SchedulerBusy as e:
+            return self._busy(e)
         except Exception as e:
             print(f"❌ Extraction crew failed: {e}")
+            EXTRACTION_PARSES.inc(outcome="failed")
             return {
                 "error": f"Extraction failed: {e}",
                 "status": "error"
             }
     
     @listen("process_user_message")
+    @instrumented_step("check_completeness_and_respond")
     def check_completeness_and_respond(self, extraction_result):
         """Check if we have all information or need to ask for more"""
-        if extraction_result.get("status") == "error":
+        if extraction_result.get("status") in ("error", "busy"):
             return extraction_result
         
         missing = self.state.missing_fields
@@ -113,38 +190,35 @@ class TransportationSystemFlow(Flow[ConversationState]):
         self.state.attempts += 1
         
         # Prepare current information for conversation crew
-        current_info = {
-            k: v for k, v in self.state.partial_request.model_dump().items()
-            if v is not None and k != "raw_message"
-        }
+        current_info = self._current_info()
         
-        # Use conversation crew to ask for missing info
+        # Ask for the missing info from templates, or the conversation crew if configured
         try:
-            conversation_crew = ExtractionCrew().conversation_crew()
-            
-            # Format missing fields in Spanish
-            field_names = {
-                'nombre_solicitante': 'nombre completo',
-                'cc_nit': 'cédula o NIT',
-                'celular_contacto': 'número de celular',
-                'fecha_inicio_servicio': 'fecha del servicio',
-                'hora_inicio_servicio': 'hora de inicio',
-                'direccion_inicio': 'dirección de recogida',
-                'direccion_terminacion': 'dirección de destino',
-                'cantidad_pasajeros': 'cantidad de pasajeros',
-                'equipaje_carga': 'si llevan equipaje'
-            }
-            
-            missing_fields_spanish = [field_names.get(f, f) for f in missing[:3]]
-            
-            # Generate question
-            question = conversation_crew.kickoff(inputs={
-                "current_info": json.dumps(current_info, ensure_ascii=False),
-                "missing_fields": ", ".join(missing_fields_spanish)
-            })
+            question_mode = get_settings().question_mode
+            if question_mode == "combined" and extraction_result.get("question"):
+                # Already phrased by the combined extraction call
+                question = extraction_result["question"]
+            elif question_mode == "llm":
+                missing_fields_spanish = [FIELD_NAMES.get(f, f) for f in missing[:3]]
+                
+                # Generate question
+                question = self._run_crew("conversation", {
+                    "current_info": json.dumps(current_info, ensure_ascii=False),
+                    "missing_fields": ", ".join(missing_fields_spanish)
+                })
+            else:
+                # Also combined-mode turns that made no model call (rules only, cache hit),
+                # so they stay at zero calls instead of paying for a separate question
+                question = compose_question(
+                    missing,
+                    current_info,
+                    attempt=self.state.attempts,
+                    conversation_id=self.state.conversation_id or ""
+                )
             
-            # Store the question
+            # Store the question; the run ends here and the answer resumes from saved state
             self.state.current_question = str(question)
+            self.state.status = "waiting_for_response"
             self.state.add_message("assistant", str(question))
             
             print(f"\n🤖 Assistant: {question}")
@@ -156,6 +230,8 @@ class TransportationSystemFlow(Flow[ConversationState]):
                 "conversation_id": self.state.conversation_id
             }
             
+        except SchedulerBusy as e:
+            return self._busy(e)
         except Exception as e:
             print(f"❌ Conversation crew failed: {e}")
             return {
@@ -164,6 +240,7 @@ class TransportationSystemFlow(Flow[ConversationState]):
             }
     
     @listen("check_completeness_and_respond")
+    @instrumented_step("create_final_summary")
     def create_final_summary(self, completion_result):
         """Create final summary if all information is complete"""
         if completion_result.get("status") != "complete":
@@ -175,11 +252,13 @@ class TransportationSystemFlow(Flow[ConversationState]):
         request_data = self.state.partial_request.model_dump()
         
         try:
-            # Use summary crew
-            summary_crew = SummaryCrew().crew()
-            summary = summary_crew.kickoff(inputs={
-                "request_data": json.dumps(request_data, ensure_ascii=False)
-            })
+            if get_settings().summary_mode == "llm":
+                # Use summary crew
+                summary = self._run_crew("summary", {
+                    "request_data": json.dumps(request_data, ensure_ascii=False)
+                })
+            else:
+                summary = render_summary(self.state.partial_request)
             
             # Add summary to conversation
             self.state.add_message("assistant", str(summary))
@@ -194,12 +273,69 @@ class TransportationSystemFlow(Flow[ConversationState]):
                 "final_result": True
             }
             
+        except SchedulerBusy as e:
+            return self._busy(e)
         except Exception as e:
             print(f"❌ Summary creation failed: {e}")
             return {
                 "error": f"Summary creation failed: {e}",
                 "status": "error"
             }
+    
+    def _current_info(self):
+        """Collected request fields, without empty values"""
+        return {
+            k: v for k, v in self.state.partial_request.model_dump().items()
+            if v is not None and k != "raw_message" and k not in PLACE_CODE_FIELDS
+        }
+    
+    def _locate_places(self):
+        """Normalize the pickup and drop-off addresses to gazetteer city/place codes"""
+        partial = self.state.partial_request
+        for end in ("inicio", "terminacion"):
+            city_code, place_code = address_codes(getattr(partial, f"direccion_{end}"))
+            setattr(partial, f"codigo_ciudad_{end}", city_code)
+            setattr(partial, f"codigo_lugar_{end}", place_code)
+    
+    def _run_crew(self, crew_name: str, inputs: dict):
+        """Kick off a pooled crew once the scheduler grants an LLM slot"""
+        # Conversations closer to done go first, so they finish and free their state
+        with get_scheduler().slot(priority=len(self.state.missing_fields), crew=crew_name):
+            with get_crew_pool().checkout(crew_name) as crew:
+                return instrumented_kickoff(crew_name, crew, inputs)
+    
+    def _busy(self, error: SchedulerBusy):
+        """Turn result telling the caller to retry later"""
+        print(f"⏳ {error}")
+        return {
+            "error": str(error),
+            "status": "busy",
+            "retry_after": error.retry_after
+        }
+    
+    def _extract_and_ask(self, prompt_inputs: dict):
+        """Extract fields and phrase the follow-up question in a single crew call"""
+        result = self._run_crew("extract_and_ask", prompt_inputs)
+        
+        data, parsed_as = parse_crew_output(result)
+        EXTRACTION_PARSES.inc(outcome=parsed_as)
+        question = data.pop("question", None)
+        # Tolerate models that return the fields without the wrapper object
+        fields = data.get("fields", data)
+        return coerce_fields(fields) if isinstance(fields, dict) else {}, question
+    
+    def continue_conversation(self, message: str, conversation_id: Optional[str] = None):
+        """Resume a restored conversation at process_user_message with a new message"""
+        if conversation_id and conversation_id != self.state.conversation_id:
+            return {
+                "error": f"Unknown conversation: {conversation_id}",
+                "status": "error"
+            }
+        
+        self.state.current_message = message
+        result = self.process_user_message("continuing")
+        result = self.check_completeness_and_respond(result)
+        return self.create_final_summary(result)
 
 
 def test_single_message():
@@ -228,7 +364,8 @@ def interactive_conversation():
     print("🚀 Starting Transportation System Interactive Test")
     print("Type 'exit' to quit, 'new' to start fresh conversation\n")
     
-    flow = None
+    store = InMemoryStateStore()
+    sender_id = "interactive_user"
     
     while True:
         # Get user input
@@ -240,28 +377,14 @@ def interactive_conversation():
         
         if message.lower() == 'new':
             print("\n🔄 Starting new conversation...")
-            flow = None
+            store.delete(sender_id)
             continue
         
-        if not flow:
-            # Start new conversation
-            flow = TransportationSystemFlow()
-            result = flow.kickoff(inputs={
-                "current_message": message,
-                "sender_id": "interactive_user"
-            })
-        else:
-            # Continue existing conversation
-            # Update the state with new message and re-run from process_user_message
-            flow.state.current_message = message
-            result = flow.process_user_message("continuing")
-            
-            # Process the result through the chain
-            if result.get("status") == "extracted":
-                result = flow.check_completeness_and_respond(result)
-                
-                if result.get("status") == "complete":
-                    result = flow.create_final_summary(result)
+        # Start a new conversation or resume the stored one
+        result, state = run_turn(
+            TransportationSystemFlow, store.load(sender_id), sender_id, message
+        )
+        store.save(state)
         
         # Handle result
         if isinstance(result, dict):
@@ -272,26 +395,12 @@ def interactive_conversation():
                 # Service complete
                 print("\n🎉 Service request complete!")
                 print("\nType 'new' for a new request or 'exit' to quit.")
-                flow = None
+                store.delete(sender_id)
             elif result.get("status") == "error":
                 print(f"\n❌ Error: {result.get('error')}")
                 print("Please try again or type 'new' to start over.")
 
 
-def kickoff():
-    """Main entry point"""
-    print("Choose test mode:")
-    print("1. Single message test")
-    print("2. Interactive conversation")
-    
-    choice = input("\nEnter choice (1 or 2): ").strip()
-    
-    if choice == "1":
-        test_single_message()
-    else:
-        interactive_conversation()
-
-
 def plot():
     """Generate flow diagram"""
     flow = TransportationSystemFlow()
@@ -299,4 +408,9 @@ def plot():
 
 
 if __name__ == "__main__":
-    kickoff()
+    import sys
+
+    from transportation_flow.cli import kickoff
+
+    # Hand over this module, already imported as __main__, so cli does not load it again
+    kickoff(sys.modules[__name__])
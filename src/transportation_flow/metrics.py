@@ -0,0 +1,330 @@
+"""Lightweight instrumentation for the flow and its crews.
+
+Metrics are kept in process and rendered in the Prometheus text format
+(served by the HTTP gateway at `/metrics`). Recording is a lock plus a few
+additions, cheap enough to leave on in production. Spans are emitted through
+OpenTelemetry only when `TRANSPORT_OTEL_ENABLED` is set and the API is
+installed.
+"""
+import bisect
+import functools
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+
+def _format_labels(names: Tuple[str, ...], values: Tuple[str, ...], extra: str = "") -> str:
+    pairs = [f'{name}="{value}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+class Counter:
+    """Monotonic counter with optional labels"""
+
+    def __init__(self, name: str, help_text: str, labels: Tuple[str, ...] = ()):
+        self.name = name
+        self.help_text = help_text
+        self.labels = labels
+        self._values: Dict[Tuple[str, ...], float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1.0, **labels: str) -> None:
+        key = tuple(str(labels.get(label, "")) for label in self.labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def value(self, **labels: str) -> float:
+        key = tuple(str(labels.get(label, "")) for label in self.labels)
+        return self._values.get(key, 0.0)
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            items = sorted(self._values.items())
+        for key, value in items:
+            lines.append(f"{self.name}{_format_labels(self.labels, key)} {value:g}")
+        return lines
+
+
+class Histogram:
+    """Cumulative-bucket histogram with optional labels"""
+
+    def __init__(
+        self,
+        name: str,
+        help_text: str,
+        labels: Tuple[str, ...] = (),
+        buckets: Tuple[float, ...] = DEFAULT_BUCKETS
+    ):
+        self.name = name
+        self.help_text = help_text
+        self.labels = labels
+        self.buckets = tuple(sorted(buckets))
+        self._series: Dict[Tuple[str, ...], List[float]] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, **labels: str) -> None:
+        key = tuple(str(labels.get(label, "")) for label in self.labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                # one slot per bucket, then +Inf, sum and count
+                series = self._series[key] = [0.0] * (len(self.buckets) + 3)
+            series[index] += 1
+            series[-2] += value
+            series[-1] += 1
+
+    def count(self, **labels: str) -> int:
+        key = tuple(str(labels.get(label, "")) for label in self.labels)
+        series = self._series.get(key)
+        return int(series[-1]) if series else 0
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            items = sorted((key, list(series)) for key, series in self._series.items())
+        for key, series in items:
+            cumulative = 0.0
+            for bound, hits in zip(self.buckets + (float("inf"),), series):
+                cumulative += hits
+                le = "+Inf" if bound == float("inf") else f"{bound:g}"
+                labels = _format_labels(self.labels, key, 'le="' + le + '"')
+                lines.append(f"{self.name}_bucket{labels} {cumulative:g}")
+            lines.append(f"{self.name}_sum{_format_labels(self.labels, key)} {series[-2]:g}")
+            lines.append(f"{self.name}_count{_format_labels(self.labels, key)} {series[-1]:g}")
+        return lines
+
+
+class Registry:
+    """Holds metrics and pull-style collectors, renders them for scraping"""
+
+    def __init__(self):
+        self._metrics: List[Any] = []
+        self._collectors: List[Callable[[], List[str]]] = []
+
+    def counter(self, name: str, help_text: str, labels: Tuple[str, ...] = ()) -> Counter:
+        metric = Counter(name, help_text, labels)
+        self._metrics.append(metric)
+        return metric
+
+    def histogram(self, name: str, help_text: str, labels: Tuple[str, ...] = (),
+                  buckets: Tuple[float, ...] = DEFAULT_BUCKETS) -> Histogram:
+        metric = Histogram(name, help_text, labels, buckets)
+        self._metrics.append(metric)
+        return metric
+
+    def add_collector(self, collector: Callable[[], List[str]]) -> None:
+        """Register a function producing extra exposition lines at scrape time"""
+        self._collectors.append(collector)
+
+    def render(self) -> str:
+        lines: List[str] = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        for collector in self._collectors:
+            try:
+                lines.extend(collector())
+            except Exception:
+                continue
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+FLOW_STEP_SECONDS = REGISTRY.histogram(
+    "transport_flow_step_seconds", "Wall time per flow method", ("step",)
+)
+LLM_CALL_SECONDS = REGISTRY.histogram(
+    "transport_llm_call_seconds", "Crew kickoff latency", ("crew",)
+)
+LLM_TOKENS = REGISTRY.counter(
+    "transport_llm_tokens_total", "Tokens used per crew", ("crew", "kind")
+)
+LLM_PROMPT_TOKENS = REGISTRY.histogram(
+    "transport_llm_prompt_tokens", "Prompt tokens per crew call", ("crew",),
+    buckets=(64, 128, 256, 512, 1024, 2048, 4096, 8192)
+)
+LLM_QUEUE_WAIT_SECONDS = REGISTRY.histogram(
+    "transport_llm_queue_wait_seconds", "Time a crew call waited for an LLM slot", ("crew",)
+)
+LLM_QUEUE_REJECTIONS = REGISTRY.counter(
+    "transport_llm_queue_rejections_total",
+    "Crew calls refused by the scheduler (queue_full, timeout)", ("reason", "crew")
+)
+LLM_CALL_ERRORS = REGISTRY.counter(
+    "transport_llm_call_errors_total", "Crew kickoffs that raised", ("crew",)
+)
+EXTRACTIONS = REGISTRY.counter(
+    "transport_extractions_total", "Extraction passes by source (rules, cache, llm)", ("source",)
+)
+EXTRACTION_PARSES = REGISTRY.counter(
+    "transport_extraction_parses_total",
+    "Extraction outputs by how they were read (structured, json, salvaged, failed)",
+    ("outcome",)
+)
+EXTRACTION_PROMPT_TOKENS_SAVED = REGISTRY.counter(
+    "transport_extraction_prompt_tokens_saved_total",
+    "Estimated prompt tokens saved by listing only the still-missing fields"
+)
+PLACE_LOOKUPS = REGISTRY.counter(
+    "transport_place_lookups_total",
+    "Addresses resolved against the place gazetteer (exact, fuzzy, miss)",
+    ("outcome",)
+)
+DUPLICATE_MESSAGES = REGISTRY.counter(
+    "transport_duplicate_messages_total", "Inbound messages dropped as webhook retries"
+)
+COALESCED_MESSAGES = REGISTRY.counter(
+    "transport_coalesced_messages_total", "Inbound messages folded into a later message's turn"
+)
+COALESCED_BURST_SIZE = REGISTRY.histogram(
+    "transport_coalesced_burst_messages", "Inbound messages handled by one flow turn",
+    buckets=(1, 2, 3, 4, 6, 8, 12)
+)
+STREAM_MESSAGES = REGISTRY.counter(
+    "transport_stream_messages_total", "Inbound stream entries a worker ran, by turn status", ("status",)
+)
+SHARD_HANDOVERS = REGISTRY.counter(
+    "transport_shard_handovers_total",
+    "Shards a worker took over or handed off (gained, lost, stolen)", ("direction",)
+)
+HISTORY_SIZE = REGISTRY.histogram(
+    "transport_conversation_history_chars",
+    "Characters held in a conversation's history after each turn",
+    buckets=(256, 512, 1024, 2048, 4096, 8192, 16384, 32768)
+)
+
+
+def _cache_collector() -> List[str]:
+    from transportation_flow.extraction.cache import get_extraction_cache
+
+    stats = get_extraction_cache().stats()
+    name = "transport_extraction_cache_lookups_total"
+    return [
+        f"# HELP {name} Extraction cache lookups by result",
+        f"# TYPE {name} counter",
+        f'{name}{{result="hit"}} {stats["hits"]:g}',
+        f'{name}{{result="redis_hit"}} {stats["redis_hits"]:g}',
+        f'{name}{{result="miss"}} {stats["misses"]:g}',
+    ]
+
+
+def _crew_pool_collector() -> List[str]:
+    from transportation_flow.crews.pool import existing_crew_pool
+
+    # Building the pool imports crewAI; a process that never ran a turn has nothing to report
+    pool = existing_crew_pool()
+    if pool is None:
+        return []
+    name = "transport_crew_pool_checkouts_total"
+    lines = [f"# HELP {name} Crew pool checkouts by result", f"# TYPE {name} counter"]
+    for crew, stats in pool.stats().items():
+        lines.append(f'{name}{{crew="{crew}",result="hit"}} {stats["hits"]:g}')
+        lines.append(f'{name}{{crew="{crew}",result="miss"}} {stats["misses"]:g}')
+    return lines
+
+
+def _scheduler_collector() -> List[str]:
+    from transportation_flow.crews.scheduler import get_scheduler
+
+    scheduler = get_scheduler()
+    return [
+        "# HELP transport_llm_queue_depth Crew calls waiting for an LLM slot",
+        "# TYPE transport_llm_queue_depth gauge",
+        f"transport_llm_queue_depth {scheduler.depth:g}",
+        "# HELP transport_llm_slots_in_use LLM slots currently held",
+        "# TYPE transport_llm_slots_in_use gauge",
+        f"transport_llm_slots_in_use {scheduler.in_use:g}",
+    ]
+
+
+REGISTRY.add_collector(_cache_collector)
+REGISTRY.add_collector(_crew_pool_collector)
+REGISTRY.add_collector(_scheduler_collector)
+
+
+def render_metrics() -> str:
+    """All metrics in the Prometheus text exposition format"""
+    return REGISTRY.render()
+
+
+_tracer: Any = None
+_tracer_checked = False
+
+
+def _get_tracer() -> Optional[Any]:
+    global _tracer, _tracer_checked
+    if not _tracer_checked:
+        _tracer_checked = True
+        from transportation_flow.settings import get_settings
+
+        if get_settings().otel_enabled:
+            try:
+                from opentelemetry import trace
+
+                _tracer = trace.get_tracer("transportation_flow")
+            except ImportError:
+                _tracer = None
+    return _tracer
+
+
+@contextmanager
+def span(name: str, **attributes: Any) -> Iterator[None]:
+    """OpenTelemetry span when enabled, no-op otherwise"""
+    tracer = _get_tracer()
+    if tracer is None:
+        yield
+        return
+    with tracer.start_as_current_span(name, attributes=attributes):
+        yield
+
+
+def instrumented_step(step: str) -> Callable:
+    """Decorator recording wall time (and a span) for a flow method"""
+    def decorator(func: Callable) -> Callable:
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            started = time.perf_counter()
+            try:
+                with span(f"flow.{step}"):
+                    return func(*args, **kwargs)
+            finally:
+                FLOW_STEP_SECONDS.observe(time.perf_counter() - started, step=step)
+        return wrapper
+    return decorator
+
+
+def _token_totals(crew: Any) -> Tuple[int, int]:
+    try:
+        usage = crew.calculate_usage_metrics()
+        return usage.prompt_tokens, usage.completion_tokens
+    except Exception:
+        return 0, 0
+
+
+def instrumented_kickoff(crew_name: str, crew: Any, inputs: Dict[str, Any]) -> Any:
+    """Kick off a crew, recording latency, errors and the tokens this run used"""
+    # Pooled agents accumulate token counts across runs, so record the delta
+    prompt_before, completion_before = _token_totals(crew)
+    started = time.perf_counter()
+    try:
+        with span(f"crew.{crew_name}"):
+            result = crew.kickoff(inputs=inputs)
+    except Exception:
+        LLM_CALL_ERRORS.inc(crew=crew_name)
+        raise
+    finally:
+        LLM_CALL_SECONDS.observe(time.perf_counter() - started, crew=crew_name)
+
+    prompt_after, completion_after = _token_totals(crew)
+    prompt_tokens = max(0, prompt_after - prompt_before)
+    LLM_TOKENS.inc(prompt_tokens, crew=crew_name, kind="prompt")
+    LLM_PROMPT_TOKENS.observe(prompt_tokens, crew=crew_name)
+    LLM_TOKENS.inc(max(0, completion_after - completion_before), crew=crew_name, kind="completion")
+    return result
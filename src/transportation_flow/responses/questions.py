@@ -0,0 +1,223 @@
+"""Template-based follow-up questions for missing request fields.
+
+`check_completeness_and_respond` already knows which fields are missing, so
+phrasing the question does not need a model. Questions are composed from
+hand-written Colombian-Spanish templates: natural pairings for fields that
+are usually asked together, single-field questions for the rest, and a few
+list-style frames, with variation picked deterministically per conversation.
+"""
+import random
+from typing import Any, Dict, FrozenSet, List, Optional
+
+# Spanish labels for request fields
+FIELD_NAMES = {
+    'nombre_solicitante': 'nombre completo',
+    'cc_nit': 'cédula o NIT',
+    'celular_contacto': 'número de celular',
+    'fecha_inicio_servicio': 'fecha del servicio',
+    'hora_inicio_servicio': 'hora de inicio',
+    'direccion_inicio': 'dirección de recogida',
+    'direccion_terminacion': 'dirección de destino',
+    'cantidad_pasajeros': 'cantidad de pasajeros',
+    'equipaje_carga': 'si llevan equipaje'
+}
+
+# Ask for at most this many fields per turn
+MAX_FIELDS_PER_QUESTION = 3
+
+SINGLE_QUESTIONS: Dict[str, List[str]] = {
+    'nombre_solicitante': [
+        "¿Me regala su nombre completo?",
+        "¿A nombre de quién registramos el servicio?",
+        "¿Con quién tengo el gusto? Me regala su nombre completo, por favor.",
+    ],
+    'cc_nit': [
+        "¿Me regala su número de cédula o NIT?",
+        "¿A qué cédula o NIT facturamos el servicio?",
+        "¿Me confirma el número de cédula o NIT, por favor?",
+    ],
+    'celular_contacto': [
+        "¿A qué número de celular lo podemos contactar?",
+        "¿Me regala un número de celular de contacto?",
+        "¿Me comparte su celular para coordinar el servicio?",
+    ],
+    'fecha_inicio_servicio': [
+        "¿Para qué fecha necesita el servicio? (por ejemplo, 15 de julio)",
+        "¿Qué día sería el servicio? Puede decirme algo como \"15 de julio\".",
+        "¿Para cuándo necesita el transporte? (por ejemplo, 15 de julio)",
+    ],
+    'hora_inicio_servicio': [
+        "¿A qué hora lo recogemos? (por ejemplo, 3:00 PM)",
+        "¿A qué hora necesita el servicio? Puede ser algo como \"3:00 PM\".",
+        "¿Qué hora le queda bien para la recogida? (por ejemplo, 3:00 PM)",
+    ],
+    'direccion_inicio': [
+        "¿Desde qué dirección lo recogemos? Incluya la ciudad, por favor.",
+        "¿Cuál es la dirección de recogida (con la ciudad)?",
+        "¿Dónde lo recogemos? Me regala la dirección y la ciudad.",
+    ],
+    'direccion_terminacion': [
+        "¿Hacia dónde se dirigen? Me regala la dirección de destino con la ciudad.",
+        "¿Cuál es la dirección de destino?",
+        "¿A qué dirección los llevamos?",
+    ],
+    'cantidad_pasajeros': [
+        "¿Cuántas personas van a viajar?",
+        "¿Cuántos pasajeros serían en total?",
+        "¿Para cuántas personas es el servicio?",
+    ],
+    'equipaje_carga': [
+        "¿Van a llevar equipaje o carga?",
+        "¿Llevan maletas o alguna carga?",
+        "¿El servicio incluye equipaje o carga?",
+    ],
+}
+
+PAIR_QUESTIONS: Dict[FrozenSet[str], List[str]] = {
+    frozenset({'nombre_solicitante', 'celular_contacto'}): [
+        "¿Me regala su nombre y número de celular?",
+        "¿A nombre de quién registro el servicio y a qué celular lo contactamos?",
+        "¿Me comparte su nombre completo y un celular de contacto?",
+    ],
+    frozenset({'nombre_solicitante', 'cc_nit'}): [
+        "¿Me regala su nombre completo y número de cédula o NIT?",
+        "¿A nombre de quién y con qué cédula o NIT registramos el servicio?",
+    ],
+    frozenset({'cc_nit', 'celular_contacto'}): [
+        "¿Me regala su cédula o NIT y un número de celular de contacto?",
+        "¿Me confirma su número de cédula o NIT y su celular, por favor?",
+    ],
+    frozenset({'fecha_inicio_servicio', 'hora_inicio_servicio'}): [
+        "¿Para qué fecha y a qué hora necesita el servicio? (por ejemplo, 15 de julio a las 3:00 PM)",
+        "¿Qué día y a qué hora lo recogemos? Puede ser algo como \"15 de julio, 3:00 PM\".",
+        "¿Cuándo sería el servicio? Me regala la fecha y la hora (por ejemplo, 15 de julio a las 3:00 PM).",
+    ],
+    frozenset({'direccion_inicio', 'direccion_terminacion'}): [
+        "¿Desde dónde lo recogemos y hacia dónde se dirige? Incluya las ciudades, por favor.",
+        "¿Cuál es la dirección de recogida y la de destino (con ciudad)?",
+        "¿De dónde sale el servicio y a dónde van?",
+    ],
+    frozenset({'cantidad_pasajeros', 'equipaje_carga'}): [
+        "¿Cuántas personas van a viajar y llevan equipaje?",
+        "¿Cuántos pasajeros serían y van con maletas o carga?",
+    ],
+}
+
+# Noun phrases for list-style questions ("¿Me podría indicar A, B y C?")
+NOUN_PHRASES = {
+    'nombre_solicitante': "su nombre completo",
+    'cc_nit': "su número de cédula o NIT",
+    'celular_contacto': "un celular de contacto",
+    'fecha_inicio_servicio': "la fecha del servicio",
+    'hora_inicio_servicio': "la hora de recogida",
+    'direccion_inicio': "la dirección de recogida",
+    'direccion_terminacion': "la dirección de destino",
+    'cantidad_pasajeros': "la cantidad de pasajeros",
+}
+
+LIST_FRAMES = [
+    "¿Me podría indicar {fields}?",
+    "Para continuar, ¿me regala {fields}?",
+    "¿Me ayuda con {fields}, por favor?",
+]
+
+CONNECTORS = ["Además, ", "También, ", "Y por último, "]
+
+GREETINGS = [
+    "¡Hola! Con gusto le ayudo con su servicio de transporte. ",
+    "¡Buenas! Con mucho gusto le colaboro con el transporte. ",
+]
+
+ACKNOWLEDGEMENTS = [
+    "¡Perfecto{name}! ",
+    "¡Listo{name}! ",
+    "Muy bien{name}. ",
+    "Gracias{name}. ",
+]
+
+
+def _lower_first(text: str) -> str:
+    # Keep the opening "¿" and lowercase the first letter after it
+    if text.startswith("¿") and len(text) > 1:
+        return "¿" + text[1].lower() + text[2:]
+    return text[0].lower() + text[1:] if text else text
+
+
+def _join_phrases(phrases: List[str]) -> str:
+    if len(phrases) == 1:
+        return phrases[0]
+    return ", ".join(phrases[:-1]) + " y " + phrases[-1]
+
+
+class QuestionComposer:
+    """Builds the follow-up question for a set of missing fields"""
+
+    def __init__(self, max_fields: int = MAX_FIELDS_PER_QUESTION):
+        self.max_fields = max_fields
+
+    def compose(
+        self,
+        missing_fields: List[str],
+        current_info: Optional[Dict[str, Any]] = None,
+        attempt: int = 0,
+        conversation_id: str = ""
+    ) -> str:
+        """Question asking for the first `max_fields` missing fields"""
+        fields = [f for f in missing_fields if f in SINGLE_QUESTIONS][:self.max_fields]
+        if not fields:
+            return "¿Hay algo más que debamos tener en cuenta para su servicio?"
+
+        # Same conversation and attempt always get the same wording
+        rng = random.Random(f"{conversation_id}:{attempt}:{'|'.join(fields)}")
+        current_info = current_info or {}
+
+        if len(fields) > 1 and all(f in NOUN_PHRASES for f in fields) and rng.random() < 0.3:
+            phrases = [NOUN_PHRASES[f] for f in fields]
+            body = rng.choice(LIST_FRAMES).format(fields=_join_phrases(phrases))
+        else:
+            body = self._compose_segments(fields, rng)
+
+        return self._opening(current_info, attempt, rng) + body
+
+    def _compose_segments(self, fields: List[str], rng: random.Random) -> str:
+        segments = []
+        remaining = list(fields)
+        while remaining:
+            first = remaining.pop(0)
+            partner = next(
+                (f for f in remaining if frozenset({first, f}) in PAIR_QUESTIONS),
+                None
+            )
+            if partner:
+                remaining.remove(partner)
+                segments.append(rng.choice(PAIR_QUESTIONS[frozenset({first, partner})]))
+            else:
+                segments.append(rng.choice(SINGLE_QUESTIONS[first]))
+
+        text = segments[0]
+        for index, segment in enumerate(segments[1:], start=1):
+            connector = CONNECTORS[2] if index == len(segments) - 1 and index > 1 \
+                else rng.choice(CONNECTORS[:2])
+            text += " " + connector + _lower_first(segment)
+        return text
+
+    @staticmethod
+    def _opening(current_info: Dict[str, Any], attempt: int, rng: random.Random) -> str:
+        if not current_info and attempt <= 1:
+            return rng.choice(GREETINGS)
+        name_parts = str(current_info.get('nombre_solicitante') or "").split()
+        first_name = f", {name_parts[0]}" if name_parts else ""
+        return rng.choice(ACKNOWLEDGEMENTS).format(name=first_name)
+
+
+_default_composer = QuestionComposer()
+
+
+def compose_question(
+    missing_fields: List[str],
+    current_info: Optional[Dict[str, Any]] = None,
+    attempt: int = 0,
+    conversation_id: str = ""
+) -> str:
+    """Compose a follow-up question with the shared composer"""
+    return _default_composer.compose(missing_fields, current_info, attempt, conversation_id)
@@ -0,0 +1,71 @@
+"""Built-in renderer for the service summary.
+
+Produces the same summary the summary crew is asked to write (see the format
+example in `summary_crew/config/tasks.yaml`) directly from a PartialRequest.
+"""
+from datetime import date, time
+from typing import Optional
+
+from transportation_flow.schemas.transportation_models import PartialRequest
+
+MONTH_NAMES = [
+    'enero', 'febrero', 'marzo', 'abril', 'mayo', 'junio', 'julio',
+    'agosto', 'septiembre', 'octubre', 'noviembre', 'diciembre'
+]
+
+NOT_PROVIDED = "Por confirmar"
+
+SUMMARY_TEMPLATE = """¡Perfecto! He registrado su solicitud de servicio:
+
+📋 **Detalles del Servicio:**
+- Cliente: {cliente}
+- Fecha: {fecha}
+- Hora: {hora}
+- Recogida: {recogida}
+- Destino: {destino}
+- Pasajeros: {pasajeros}
+- Equipaje: {equipaje}
+
+Procederé a generar su cotización..."""
+
+
+def format_date(value: Optional[str]) -> str:
+    """'2025-07-15' -> '15 de julio de 2025'; other text is kept as given"""
+    if not value:
+        return NOT_PROVIDED
+    try:
+        parsed = date.fromisoformat(value)
+    except ValueError:
+        return value
+    return f"{parsed.day} de {MONTH_NAMES[parsed.month - 1]} de {parsed.year}"
+
+
+def format_time(value: Optional[str]) -> str:
+    """'15:00' -> '3:00 PM'; other text is kept as given"""
+    if not value:
+        return NOT_PROVIDED
+    try:
+        parsed = time.fromisoformat(value)
+    except ValueError:
+        return value
+    hour = parsed.hour % 12 or 12
+    return f"{hour}:{parsed.minute:02d} {'PM' if parsed.hour >= 12 else 'AM'}"
+
+
+def format_luggage(value: Optional[bool]) -> str:
+    if value is None:
+        return NOT_PROVIDED
+    return "Sí" if value else "No"
+
+
+def render_summary(request: PartialRequest) -> str:
+    """Render the confirmation summary for a collected request"""
+    return SUMMARY_TEMPLATE.format(
+        cliente=request.nombre_solicitante or NOT_PROVIDED,
+        fecha=format_date(request.fecha_inicio_servicio),
+        hora=format_time(request.hora_inicio_servicio),
+        recogida=request.direccion_inicio or NOT_PROVIDED,
+        destino=request.direccion_terminacion or NOT_PROVIDED,
+        pasajeros=request.cantidad_pasajeros if request.cantidad_pasajeros is not None else NOT_PROVIDED,
+        equipaje=format_luggage(request.equipaje_carga),
+    )
@@ -0,0 +1,17 @@
+from pydantic import BaseModel, Field
+from typing import Optional, List
+
+class InboundMessage(BaseModel):
+    """Message received from a customer (e.g. a WhatsApp webhook)"""
+    message: str = Field(description="Message text")
+    message_id: Optional[str] = Field(None, description="Provider message identifier")
+
+class TurnResponse(BaseModel):
+    """Outcome of one conversation turn"""
+    sender_id: str
+    conversation_id: Optional[str] = None
+    status: str
+    reply: Optional[str] = Field(None, description="Question or summary to send back")
+    missing_fields: List[str] = Field(default_factory=list)
+    error: Optional[str] = None
+    retry_after: Optional[float] = Field(None, description="Seconds to wait before resending when busy")
@@ -5,6 +5,9 @@ from transportation_flow.schemas.transportation_models import (
     TransportationRequest, PartialRequest
 )
 
+# Folded messages keep at most this many characters each
+SUMMARY_SNIPPET_CHARS = 120
+
 class ConversationState(BaseModel):
     """State model for transportation request conversations"""
     
@@ -30,6 +33,10 @@ class ConversationState(BaseModel):
         default_factory=list,
         description="Conversation history"
     )
+    history_summary: str = Field(
+        default="",
+        description="Compact summary of messages folded out of the history"
+    )
     current_question: Optional[str] = Field(
         None,
         description="Current question waiting for answer"
@@ -53,6 +60,34 @@ class ConversationState(BaseModel):
             "timestamp": datetime.now().isoformat()
         })
     
+    def compact_history(self, max_messages: int, max_summary_chars: int = 600) -> int:
+        """Keep the last `max_messages` verbatim and fold older ones into the summary"""
+        if max_messages <= 0 or len(self.messages) <= max_messages:
+            return 0
+        
+        folded = self.messages[:-max_messages]
+        self.messages = self.messages[-max_messages:]
+        
+        # Assistant turns are questions regenerated from missing_fields, so only
+        # what the customer said is worth keeping
+        parts = [self.history_summary] if self.history_summary else []
+        for msg in folded:
+            if msg.get("role") == "user":
+                content = " ".join(str(msg.get("content", "")).split())
+                parts.append(content[:SUMMARY_SNIPPET_CHARS])
+        summary = " | ".join(parts)
+        if len(summary) > max_summary_chars:
+            summary = "…" + summary[-(max_summary_chars - 1):]
+        self.history_summary = summary
+        return len(folded)
+    
+    def history_size(self) -> int:
+        """Approximate characters held by the history and its summary"""
+        return len(self.history_summary) + sum(
+            len(str(msg.get("content", ""))) + len(str(msg.get("timestamp", "")))
+            for msg in self.messages
+        )
+    
     def update_from_partial(self, new_data: dict):
         """Update partial request with new data"""
         for key, value in new_data.items():
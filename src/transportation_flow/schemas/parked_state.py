@@ -0,0 +1,159 @@
+"""Compact form of a ConversationState for conversations waiting on the customer.
+
+Most open conversations sit idle between turns. Holding each one as a full
+pydantic model (a nested PartialRequest, a list of per-message dicts with ISO
+timestamp strings, duplicated `current_message`/`current_question`) costs
+several kilobytes; the parked form keeps the same information in a slotted
+object with array-backed roles, microsecond timestamps and message offsets
+into a single UTF-8 buffer, and is turned back into a ConversationState only
+when the next turn starts. `current_message` and `current_question` are kept
+as pointers to the message they repeat, or as text when they repeat none.
+"""
+import sys
+from array import array
+from datetime import datetime, timedelta
+from typing import Optional, Sequence, Tuple, Union
+
+from transportation_flow.schemas.conversation_state import ConversationState
+from transportation_flow.schemas.transportation_models import PartialRequest
+
+ROLES = ("user", "assistant", "system")
+ROLE_CODES = {role: code for code, role in enumerate(ROLES)}
+
+REQUEST_FIELDS = tuple(PartialRequest.model_fields)
+
+# Timestamps are naive local wall-clock times (see ConversationState.add_message),
+# kept as microseconds from this origin so they round-trip without a timezone
+EPOCH = datetime(1970, 1, 1)
+MICROSECOND = timedelta(microseconds=1)
+# Timestamp of a message that had none, or one that was not an ISO string
+NO_TIMESTAMP = -(2 ** 63)
+
+# A message index, literal text, or None
+Pointer = Union[int, str, None]
+
+
+def _micros(timestamp: Optional[str]) -> int:
+    try:
+        moment = datetime.fromisoformat(timestamp)
+    except (TypeError, ValueError):
+        return NO_TIMESTAMP
+    if moment.tzinfo is not None:
+        moment = moment.astimezone().replace(tzinfo=None)
+    return (moment - EPOCH) // MICROSECOND
+
+
+def message_pointer(messages: Sequence[dict], role: str, text: Optional[str]) -> Pointer:
+    """Index of the last `role` message that is exactly `text`, else the text itself"""
+    if not text:
+        return text
+    for index in range(len(messages) - 1, -1, -1):
+        message = messages[index]
+        if message.get("role") == role and message.get("content") == text:
+            return index
+    return text
+
+
+class ParkedConversation:
+    """Slotted, array-backed snapshot of a conversation between turns"""
+
+    __slots__ = (
+        "sender_id", "conversation_id", "status", "attempts", "request",
+        "roles", "timestamps", "ends", "text", "history_summary", "question", "current",
+    )
+
+    def __init__(
+        self,
+        sender_id: str,
+        conversation_id: str,
+        status: str,
+        attempts: int,
+        request: Tuple,
+        roles: array,
+        timestamps: array,
+        ends: array,
+        text: bytes,
+        history_summary: str = "",
+        question: Pointer = None,
+        current: Pointer = ""
+    ):
+        self.sender_id = sender_id
+        self.conversation_id = conversation_id
+        self.status = status
+        self.attempts = attempts
+        self.request = request
+        self.roles = roles
+        self.timestamps = timestamps
+        self.ends = ends
+        self.text = text
+        self.history_summary = history_summary
+        self.question = question
+        self.current = current
+
+    @classmethod
+    def from_state(cls, state: ConversationState) -> "ParkedConversation":
+        """Park a conversation"""
+        roles = array("b")
+        timestamps = array("q")
+        ends = array("I")
+        chunks = []
+        size = 0
+        for message in state.messages:
+            roles.append(ROLE_CODES.get(message.get("role"), ROLE_CODES["system"]))
+            timestamps.append(_micros(message.get("timestamp")))
+            encoded = str(message.get("content", "")).encode("utf-8")
+            chunks.append(encoded)
+            size += len(encoded)
+            ends.append(size)
+
+        partial = state.partial_request
+        return cls(
+            sender_id=state.sender_id or "",
+            conversation_id=state.conversation_id or "",
+            status=sys.intern(state.status),
+            attempts=state.attempts,
+            request=tuple(getattr(partial, field) for field in REQUEST_FIELDS),
+            roles=roles,
+            timestamps=timestamps,
+            ends=ends,
+            text=b"".join(chunks),
+            history_summary=state.history_summary,
+            # The pending question and the last message are usually in the history already
+            question=message_pointer(state.messages, "assistant", state.current_question),
+            current=message_pointer(state.messages, "user", state.current_message)
+        )
+
+    def missing_count(self) -> int:
+        """How many required fields the conversation still lacks, without rebuilding it"""
+        partial = PartialRequest.model_construct(**dict(zip(REQUEST_FIELDS, self.request)))
+        return len(partial.get_missing_fields())
+
+    def to_state(self) -> ConversationState:
+        """Rebuild the full pydantic state for an active turn"""
+        messages = []
+        start = 0
+        for role, micros, end in zip(self.roles, self.timestamps, self.ends):
+            message = {"role": ROLES[role], "content": self.text[start:end].decode("utf-8")}
+            if micros != NO_TIMESTAMP:
+                message["timestamp"] = (EPOCH + micros * MICROSECOND).isoformat()
+            messages.append(message)
+            start = end
+        question, current = (
+            messages[pointer]["content"] if isinstance(pointer, int) else pointer
+            for pointer in (self.question, self.current)
+        )
+        state = ConversationState.model_validate({
+            "current_message": current,
+            "sender_id": self.sender_id,
+            "conversation_id": self.conversation_id,
+            "partial_request": {
+                field: value for field, value in zip(REQUEST_FIELDS, self.request) if value is not None
+            },
+            "messages": messages,
+            "history_summary": self.history_summary,
+            "current_question": question,
+            "status": self.status,
+            "attempts": self.attempts,
+        })
+        state.missing_fields = state.partial_request.get_missing_fields()
+        return state
@@ -0,0 +1,314 @@
+"""Binary snapshot codec for ConversationState persistence.
+
+Shared stores used to save every turn as `model_dump_json()` of the full
+state: the nested request, every message as a dict with its keys spelled
+out, and `current_message`/`current_question` repeating message text. A
+snapshot instead holds a few fixed-size counters, one byte per message role
+and request value type, and every string (message text and timestamps,
+request field names and values) in a single UTF-8 table with character
+offsets. Decoding is one `decode()` of that table, slicing, and a single
+`model_validate` of the rebuilt dict, which is cheaper than parsing the JSON.
+`current_message` and `current_question` point at the message they repeat.
+
+Every snapshot starts with a magic tag, the schema version and a flags byte.
+Request fields are stored by name, so adding a field to PartialRequest keeps
+older snapshots readable. Snapshots above a size threshold are compressed
+with zlib.
+"""
+import json
+import struct
+import sys
+import zlib
+from array import array
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+
+from transportation_flow.schemas.conversation_state import ConversationState
+from transportation_flow.schemas.parked_state import (
+    REQUEST_FIELDS, ROLE_CODES, ROLES, Pointer, message_pointer
+)
+
+MAGIC = b"TFS"
+# 2: string table, exact timestamps and current_message (1 truncated timestamps to seconds)
+CODEC_VERSION = 2
+FLAG_ZLIB = 0x01
+# Below this many bytes compression costs more time than it saves space
+DEFAULT_COMPRESS_OVER = 1024
+
+_HEADER = struct.Struct("<3sBB")
+# attempts, messages, request fields, missing fields, question pointer, current message pointer
+_COUNTS = struct.Struct("<iIIIii")
+_U32 = struct.Struct("<I")
+_I32 = struct.Struct("<i")
+_I64 = struct.Struct("<q")
+
+# Type tags of request field values
+_FALSE, _TRUE, _INT, _STR, _JSON = range(5)
+_KNOWN_FIELDS = set(REQUEST_FIELDS)
+# Pointer markers; a message index otherwise
+_NONE, _LITERAL = -1, -2
+# sender_id, conversation_id, status, history_summary, literal question, literal current message
+_HEAD_STRINGS = 6
+
+
+class StateCodecError(ValueError):
+    """A snapshot that this codec cannot read"""
+
+
+def is_snapshot(data: bytes) -> bool:
+    """Whether `data` was written by this codec (as opposed to legacy JSON)"""
+    return data[:len(MAGIC)] == MAGIC
+
+
+def _pack_pointer(pointer: Pointer) -> Tuple[int, str]:
+    """Pointer marker or message index, and the literal text it stands for"""
+    if pointer is None:
+        return _NONE, ""
+    if isinstance(pointer, int):
+        return pointer, ""
+    return _LITERAL, pointer
+
+
+def _request_value(value: Any) -> Tuple[int, str]:
+    if isinstance(value, bool):
+        return (_TRUE if value else _FALSE), ""
+    if isinstance(value, int):
+        return _INT, str(value)
+    if isinstance(value, str):
+        return _STR, value
+    return _JSON, json.dumps(value, ensure_ascii=False, default=str)
+
+
+def encode_state(state: ConversationState, compress_over: Optional[int] = DEFAULT_COMPRESS_OVER) -> bytes:
+    """Binary snapshot of a conversation between turns; `compress_over=None` never compresses"""
+    messages = state.messages
+    question, question_text = _pack_pointer(message_pointer(messages, "assistant", state.current_question))
+    current, current_text = _pack_pointer(message_pointer(messages, "user", state.current_message))
+    strings = [
+        state.sender_id or "", state.conversation_id or "", state.status,
+        state.history_summary, question_text, current_text,
+    ]
+    roles = bytearray()
+    for message in messages:
+        roles.append(ROLE_CODES.get(message.get("role"), ROLE_CODES["system"]))
+        strings.append(str(message.get("content", "")))
+        strings.append(message.get("timestamp") or "")
+
+    types = bytearray()
+    partial = state.partial_request
+    for name in REQUEST_FIELDS:
+        value = getattr(partial, name)
+        if value is not None:
+            tag, text = _request_value(value)
+            types.append(tag)
+            strings.append(name)
+            strings.append(text)
+    strings.extend(state.missing_fields)
+
+    ends = array("I")
+    end = 0
+    for text in strings:
+        end += len(text)
+        ends.append(end)
+    if sys.byteorder == "big":
+        ends.byteswap()
+
+    body = b"".join((
+        _COUNTS.pack(
+            state.attempts, len(messages), len(types), len(state.missing_fields), question, current
+        ),
+        ends.tobytes(), roles, types, "".join(strings).encode("utf-8"),
+    ))
+    flags = 0
+    if compress_over is not None and len(body) > compress_over:
+        body = zlib.compress(body, 1)
+        flags |= FLAG_ZLIB
+    return _HEADER.pack(MAGIC, CODEC_VERSION, flags) + body
+
+
+def _body(data: bytes) -> Tuple[int, bytes]:
+    if len(data) < _HEADER.size:
+        raise StateCodecError("Truncated state snapshot")
+    magic, version, flags = _HEADER.unpack_from(data)
+    if magic != MAGIC:
+        raise StateCodecError("Not a state snapshot")
+    if version > CODEC_VERSION:
+        raise StateCodecError(f"State snapshot version {version} is newer than {CODEC_VERSION}")
+    body = bytes(data[_HEADER.size:])
+    if flags & FLAG_ZLIB:
+        try:
+            body = zlib.decompress(body)
+        except zlib.error as e:
+            raise StateCodecError(f"Corrupt state snapshot: {e}") from e
+    return version, body
+
+
+def _request(types: bytes, names: List[str], values: List[str]) -> Dict[str, Any]:
+    request: Dict[str, Any] = {}
+    for tag, name, text in zip(types, names, values):
+        # Fields dropped from PartialRequest since the snapshot was written are ignored
+        if name not in _KNOWN_FIELDS:
+            continue
+        if tag == _STR:
+            request[name] = text
+        elif tag == _INT:
+            request[name] = int(text)
+        elif tag == _FALSE or tag == _TRUE:
+            request[name] = tag == _TRUE
+        elif tag == _JSON:
+            request[name] = json.loads(text)
+        else:
+            raise StateCodecError(f"Unknown value tag {tag}")
+    return request
+
+
+def _fields(body: bytes) -> Dict[str, Any]:
+    """ConversationState fields of a version 2 snapshot body"""
+    try:
+        attempts, count, fields, missing, question, current = _COUNTS.unpack_from(body)
+        strings_count = _HEAD_STRINGS + 2 * count + 2 * fields + missing
+        offset = _COUNTS.size + 4 * strings_count
+        ends = array("I")
+        ends.frombytes(body[_COUNTS.size:offset])
+        if sys.byteorder == "big":
+            ends.byteswap()
+        roles = body[offset:offset + count]
+        types = body[offset + count:offset + count + fields]
+        table = body[offset + count + fields:].decode("utf-8")
+    except (struct.error, ValueError) as e:
+        raise StateCodecError(f"Truncated state snapshot: {e}") from e
+    if len(ends) != strings_count or len(types) != fields or ends[-1] != len(table):
+        raise StateCodecError("Truncated state snapshot")
+
+    starts = ends[:-1]
+    starts.insert(0, 0)
+    strings = [table[start:end] for start, end in zip(starts, ends)]
+    request_at = _HEAD_STRINGS + 2 * count
+    missing_at = request_at + 2 * fields
+    stamps = strings[_HEAD_STRINGS + 1:request_at:2]
+    try:
+        messages = [
+            {"role": ROLES[role], "content": content, "timestamp": timestamp}
+            for role, content, timestamp in zip(roles, strings[_HEAD_STRINGS:request_at:2], stamps)
+        ]
+        question_text = (
+            None if question == _NONE else strings[4] if question == _LITERAL
+            else messages[question]["content"]
+        )
+        current_text = (
+            None if current == _NONE else strings[5] if current == _LITERAL
+            else messages[current]["content"]
+        )
+    except IndexError as e:
+        raise StateCodecError(f"Corrupt state snapshot: {e}") from e
+    if "" in stamps:
+        # Messages that had no timestamp
+        for message in messages:
+            if not message["timestamp"]:
+                del message["timestamp"]
+    return {
+        "current_message": current_text,
+        "sender_id": strings[0],
+        "conversation_id": strings[1],
+        "partial_request": _request(types, strings[request_at:missing_at:2], strings[request_at + 1:missing_at:2]),
+        "missing_fields": strings[missing_at:],
+        "messages": messages,
+        "history_summary": strings[3],
+        "current_question": question_text,
+        "status": sys.intern(strings[2]),
+        "attempts": attempts,
+    }
+
+
+class _Reader:
+    """Sequential reader of the version 1 layout"""
+
+    __slots__ = ("data", "offset")
+
+    def __init__(self, data: bytes):
+        self.data = data
+        self.offset = 0
+
+    def take(self, size: int) -> bytes:
+        end = self.offset + size
+        if end > len(self.data):
+            raise StateCodecError("Truncated state snapshot")
+        chunk = self.data[self.offset:end]
+        self.offset = end
+        return chunk
+
+    def unpack(self, layout: struct.Struct) -> int:
+        return layout.unpack(self.take(layout.size))[0]
+
+    def text(self) -> str:
+        return self.take(self.unpack(_U32)).decode("utf-8")
+
+    def array(self, typecode: str) -> array:
+        values = array(typecode)
+        values.frombytes(self.take(self.unpack(_U32) * values.itemsize))
+        if sys.byteorder == "big":
+            values.byteswap()
+        return values
+
+    def value(self) -> Any:
+        tag = self.take(1)[0]
+        if tag == _FALSE:
+            return False
+        if tag == _TRUE:
+            return True
+        if tag == _INT:
+            return self.unpack(_I64)
+        if tag == _STR:
+            return self.text()
+        if tag == _JSON:
+            return json.loads(self.text())
+        raise StateCodecError(f"Unknown value tag {tag}")
+
+
+def _fields_v1(body: bytes) -> Dict[str, Any]:
+    """ConversationState fields of a version 1 snapshot body, still found until their TTL runs out"""
+    reader = _Reader(body)
+    sender_id, conversation_id, status, history_summary = (reader.text() for _ in range(4))
+    attempts = reader.unpack(_I32)
+    question_index = reader.unpack(_I32)
+    request: Dict[str, Any] = {}
+    for _ in range(reader.unpack(_U32)):
+        name = reader.text()
+        value = reader.value()
+        if name in _KNOWN_FIELDS:
+            request[name] = value
+    roles = reader.array("b")
+    timestamps = reader.array("q")
+    ends = reader.array("I")
+    text = reader.take(reader.unpack(_U32))
+
+    messages = []
+    start = 0
+    for role, timestamp, end in zip(roles, timestamps, ends):
+        messages.append({
+            "role": ROLES[role],
+            "content": text[start:end].decode("utf-8"),
+            "timestamp": datetime.fromtimestamp(timestamp).isoformat()
+        })
+        start = end
+    return {
+        "sender_id": sender_id,
+        "conversation_id": conversation_id,
+        "partial_request": request,
+        "messages": messages,
+        "history_summary": history_summary,
+        "current_question": messages[question_index]["content"] if 0 <= question_index < len(messages) else None,
+        "status": sys.intern(status),
+        "attempts": attempts,
+    }
+
+
+def decode_state(data: bytes) -> ConversationState:
+    """Conversation state from a binary snapshot"""
+    version, body = _body(data)
+    if version >= 2:
+        return ConversationState.model_validate(_fields(body))
+    state = ConversationState.model_validate(_fields_v1(body))
+    # Version 1 did not store them; they follow from the request
+    state.missing_fields = state.partial_request.get_missing_fields()
+    return state
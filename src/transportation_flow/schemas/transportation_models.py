@@ -47,6 +47,12 @@ class TransportationRequest(BaseModel):
             phone = f"+57{phone}"
         return phone
 
+# Filled from the addresses by the place gazetteer, never by the model
+PLACE_CODE_FIELDS = (
+    'codigo_ciudad_inicio', 'codigo_lugar_inicio',
+    'codigo_ciudad_terminacion', 'codigo_lugar_terminacion'
+)
+
 class PartialRequest(BaseModel):
     """Partial request for step-by-step collection"""
     nombre_solicitante: Optional[str] = None
@@ -58,6 +64,11 @@ class PartialRequest(BaseModel):
     direccion_terminacion: Optional[str] = None
     cantidad_pasajeros: Optional[int] = None
     equipaje_carga: Optional[bool] = None
+    # Gazetteer codes for the addresses (DANE municipality, IATA airport or landmark)
+    codigo_ciudad_inicio: Optional[str] = None
+    codigo_lugar_inicio: Optional[str] = None
+    codigo_ciudad_terminacion: Optional[str] = None
+    codigo_lugar_terminacion: Optional[str] = None
     raw_message: Optional[str] = Field(default="", description="Original message from user")  
     
     def get_missing_fields(self) -> List[str]:
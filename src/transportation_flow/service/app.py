@@ -0,0 +1,114 @@
+"""HTTP gateway for the transportation conversation flow"""
+import asyncio
+from contextlib import asynccontextmanager
+from typing import Optional
+
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, PlainTextResponse
+
+from transportation_flow.crews.ollama import READINESS, ModelWarmer
+from transportation_flow.metrics import render_metrics
+from transportation_flow.schemas.api_models import InboundMessage, TurnResponse
+from transportation_flow.service.conversations import ConversationService, create_conversation_service
+from transportation_flow.service.dedup import create_duplicate_filter
+from transportation_flow.service.sharding import ShardPublisher
+from transportation_flow.settings import get_settings
+
+
+def _to_response(sender_id: str, result: dict) -> TurnResponse:
+    return TurnResponse(
+        sender_id=sender_id,
+        conversation_id=result.get("conversation_id"),
+        status=result.get("status", "error"),
+        reply=result.get("question") or result.get("summary"),
+        missing_fields=result.get("missing_fields") or [],
+        error=result.get("error"),
+        retry_after=result.get("retry_after"),
+    )
+
+
+def create_app(service: Optional[ConversationService] = None) -> FastAPI:
+    """Build the FastAPI application around a conversation service"""
+
+    @asynccontextmanager
+    async def lifespan(app: FastAPI):
+        settings = get_settings()
+        app.state.publisher = None
+        app.state.conversations = service
+        warmer = None
+        if service is None and settings.inbound_streams:
+            # Turns run on the worker pool; the gateway only queues messages by shard
+            if not settings.redis_url:
+                raise RuntimeError("TRANSPORT_INBOUND_STREAMS needs TRANSPORT_REDIS_URL")
+            app.state.publisher = ShardPublisher.from_url(
+                settings.redis_url,
+                shards=settings.worker_shards,
+                duplicates=create_duplicate_filter(
+                    settings.dedup_mode,
+                    settings.redis_url,
+                    ttl_seconds=settings.dedup_ttl_seconds,
+                    bloom_capacity=settings.dedup_bloom_capacity
+                ),
+                dedup_bucket_seconds=settings.dedup_bucket_seconds
+            )
+        else:
+            # Load the models in the background; /ready reports when they are warm
+            warmer = ModelWarmer().start() if settings.ollama_warmup else None
+            app.state.conversations = service or create_conversation_service(settings)
+            # Import the flow off the event loop so the worker starts serving at once
+            app.state.conversations.preload()
+        yield
+        if warmer is not None:
+            warmer.stop()
+        if app.state.conversations is not None:
+            app.state.conversations.shutdown()
+
+    app = FastAPI(title="Transportation Flow", lifespan=lifespan)
+
+    @app.post("/conversations/{sender_id}/messages", response_model=TurnResponse)
+    async def post_message(sender_id: str, inbound: InboundMessage, request: Request):
+        publisher: Optional[ShardPublisher] = request.app.state.publisher
+        if publisher is not None:
+            entry_id = await asyncio.to_thread(
+                publisher.publish, sender_id, inbound.message, inbound.message_id
+            )
+            if entry_id is None:
+                return TurnResponse(sender_id=sender_id, status="duplicate")
+            # The reply is delivered from the outbound stream once a worker runs the turn
+            return JSONResponse(TurnResponse(sender_id=sender_id, status="queued").model_dump(), status_code=202)
+
+        conversations: ConversationService = request.app.state.conversations
+        result = await conversations.handle_message(
+            sender_id, inbound.message, message_id=inbound.message_id
+        )
+        response = _to_response(sender_id, result)
+        if response.status == "busy":
+            # Backpressure: the LLM queue is full, the sender should retry later
+            return JSONResponse(
+                response.model_dump(),
+                status_code=503,
+                headers={"Retry-After": str(int(response.retry_after or 1))}
+            )
+        return response
+
+    @app.get("/ready")
+    async def ready():
+        report = READINESS.report()
+        return JSONResponse(report, status_code=200 if report["ready"] else 503)
+
+    @app.get("/metrics", response_class=PlainTextResponse)
+    async def metrics():
+        return PlainTextResponse(render_metrics(), media_type="text/plain; version=0.0.4")
+
+    return app
+
+
+app = create_app()
+
+
+def serve():
+    """Run the HTTP gateway with uvicorn"""
+    import uvicorn
+
+    settings = get_settings()
+    uvicorn.run(app, host=settings.host, port=settings.port)
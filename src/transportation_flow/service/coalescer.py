@@ -0,0 +1,71 @@
+"""Per-sender debounce buffer for bursts of short messages.
+
+WhatsApp users split one request across several quick messages ("Hola",
+"necesito transporte", "para mañana", "somos 4"). Running the flow for each
+one costs an extraction and a question per fragment, and the questions are
+outdated by the time they arrive. The coalescer holds a sender's messages
+until `window` seconds pass without a new one (or `max_wait` since the
+first), then hands the whole burst to the newest caller; earlier callers are
+told their message was folded into it. The burst carries the idempotency key
+of each message, so a burst that is refused can release all of them.
+"""
+import asyncio
+from typing import Dict, List, Optional, Tuple
+
+
+class _Burst:
+    __slots__ = ("messages", "keys", "started", "last_arrival")
+
+    def __init__(self, now: float):
+        self.messages: List[str] = []
+        self.keys: List[str] = []
+        self.started = now
+        self.last_arrival = now
+
+
+class MessageCoalescer:
+    """Merges a sender's messages that arrive within `window` seconds of each other"""
+
+    def __init__(self, window: float, max_wait: Optional[float] = None):
+        self.window = window
+        self.max_wait = max_wait if max_wait is not None else window * 4
+        self._bursts: Dict[str, _Burst] = {}
+
+    def pending(self, sender_id: str) -> int:
+        """Messages buffered for `sender_id` and not yet handed out"""
+        burst = self._bursts.get(sender_id)
+        return len(burst.messages) if burst else 0
+
+    async def add(
+        self,
+        sender_id: str,
+        message: str,
+        key: Optional[str] = None
+    ) -> Optional[Tuple[List[str], List[str]]]:
+        """Buffer `message`; the burst's messages and keys if this caller should run it, else None"""
+        if self.window <= 0:
+            return [message], [key] if key is not None else []
+
+        loop = asyncio.get_running_loop()
+        burst = self._bursts.get(sender_id)
+        if burst is None:
+            burst = self._bursts[sender_id] = _Burst(loop.time())
+        burst.messages.append(message)
+        if key is not None:
+            burst.keys.append(key)
+        burst.last_arrival = loop.time()
+        position = len(burst.messages)
+
+        while True:
+            deadline = min(burst.last_arrival + self.window, burst.started + self.max_wait)
+            delay = deadline - loop.time()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            if len(burst.messages) != position or self._bursts.get(sender_id) is not burst:
+                # A newer message joined the burst and will run it
+                return None
+            if delay <= 0:
+                break
+
+        del self._bursts[sender_id]
+        return burst.messages, burst.keys
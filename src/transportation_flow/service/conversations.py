@@ -0,0 +1,307 @@
+"""Asynchronous conversation service driving TransportationSystemFlow.
+
+Each inbound message becomes one flow turn. Turns run on a bounded executor
+behind a concurrency limiter, so the event loop keeps accepting requests for
+hundreds of conversations while only a handful of turns talk to Ollama. When
+every turn slot is taken, waiting turns are admitted by how many fields their
+conversation still lacks, fewest first, like crew calls in the scheduler.
+"""
+import asyncio
+import heapq
+import itertools
+import weakref
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Callable, Dict, List, Optional, Tuple
+
+from transportation_flow.crews.scheduler import get_scheduler
+from transportation_flow.metrics import (
+    COALESCED_BURST_SIZE, COALESCED_MESSAGES, DUPLICATE_MESSAGES, LLM_QUEUE_REJECTIONS
+)
+from transportation_flow.schemas.conversation_state import ConversationState
+from transportation_flow.schemas.transportation_models import PartialRequest
+from transportation_flow.service.coalescer import MessageCoalescer
+from transportation_flow.service.dedup import (
+    DEFAULT_BUCKET_SECONDS, DuplicateFilter, create_duplicate_filter, message_keys
+)
+from transportation_flow.service.state_store import InMemoryStateStore, StateStore, create_state_store
+
+FlowFactory = Callable[..., Any]
+
+# Coalesced fragments are joined on separate lines, as the customer typed them
+BURST_SEPARATOR = "\n"
+# A conversation not started yet lacks every required field
+NEW_CONVERSATION_PRIORITY = len(PartialRequest().get_missing_fields())
+
+
+def _import_flow() -> None:
+    import transportation_flow.main  # noqa: F401
+
+
+def _default_flow_factory(**state):
+    from transportation_flow.main import TransportationSystemFlow
+    return TransportationSystemFlow(**state)
+
+
+def run_turn(
+    flow_factory: FlowFactory,
+    state: Optional[ConversationState],
+    sender_id: str,
+    message: str
+) -> Tuple[Dict[str, Any], ConversationState]:
+    """Run one flow turn for a message, starting from an existing state"""
+    if state is None:
+        flow = flow_factory()
+        result = flow.kickoff(inputs={
+            "current_message": message,
+            "sender_id": sender_id
+        })
+    else:
+        # Resume at process_user_message; the start step already ran
+        flow = flow_factory(**state.model_dump())
+        result = flow.continue_conversation(message)
+    if not isinstance(result, dict):
+        result = {"status": "error", "error": f"Unexpected flow result: {result!r}"}
+
+    return result, ConversationState.model_validate(flow.state.model_dump())
+
+
+def is_finished(result: Dict[str, Any]) -> bool:
+    """Whether a turn result closes the conversation"""
+    return result.get("status") == "complete" and bool(result.get("final_result"))
+
+
+class TurnLimiter:
+    """Turn slots for the event loop; waiters with lower priority values go first"""
+
+    def __init__(self, capacity: int):
+        self.capacity = capacity
+        self.in_use = 0
+        self._waiting: List[Tuple[int, int, asyncio.Future]] = []
+        self._tickets = itertools.count()
+
+    @property
+    def depth(self) -> int:
+        """Turns waiting for a slot"""
+        return len(self._waiting)
+
+    def free(self) -> bool:
+        """Whether a turn would get a slot right away"""
+        return self.in_use < self.capacity and not self._waiting
+
+    async def acquire(self, priority: int = 0) -> None:
+        if self.free():
+            self.in_use += 1
+            return
+        entry = (priority, next(self._tickets), asyncio.get_running_loop().create_future())
+        heapq.heappush(self._waiting, entry)
+        try:
+            await entry[2]
+        except asyncio.CancelledError:
+            if entry[2].cancelled():
+                if entry in self._waiting:
+                    self._waiting.remove(entry)
+                    heapq.heapify(self._waiting)
+            else:
+                # Granted just before the cancellation; hand the slot on
+                self.release()
+            raise
+
+    def release(self) -> None:
+        while self._waiting:
+            future = heapq.heappop(self._waiting)[2]
+            # Skip waiters cancelled before their task got to drop out of the queue
+            if not future.done():
+                # The slot passes straight to the next waiter, so in_use stays the same
+                future.set_result(None)
+                return
+        self.in_use -= 1
+
+    @asynccontextmanager
+    async def slot(self, priority: int = 0) -> AsyncIterator[None]:
+        await self.acquire(priority)
+        try:
+            yield
+        finally:
+            self.release()
+
+
+class ConversationService:
+    """Serves conversation turns without one thread per user"""
+
+    def __init__(
+        self,
+        max_concurrent_turns: int = 8,
+        flow_factory: FlowFactory = _default_flow_factory,
+        store: Optional[StateStore] = None,
+        coalesce_window: float = 0.0,
+        coalesce_max_wait: Optional[float] = None,
+        duplicates: Optional[DuplicateFilter] = None,
+        dedup_bucket_seconds: float = DEFAULT_BUCKET_SECONDS
+    ):
+        self.max_concurrent_turns = max_concurrent_turns
+        self._flow_factory = flow_factory
+        self.store = store or InMemoryStateStore()
+        self.coalescer = MessageCoalescer(coalesce_window, coalesce_max_wait)
+        self.duplicates = duplicates
+        self.dedup_bucket_seconds = dedup_bucket_seconds
+        self._limiter: Optional[TurnLimiter] = None
+        self._executor = ThreadPoolExecutor(
+            max_workers=max_concurrent_turns,
+            thread_name_prefix="flow-turn"
+        )
+        self._sender_locks: "weakref.WeakValueDictionary[str, asyncio.Lock]" = (
+            weakref.WeakValueDictionary()
+        )
+        self.in_flight = 0
+        # Turns admitted but still waiting for their sender's lock or a turn slot
+        self.queued = 0
+
+    @property
+    def limiter(self) -> TurnLimiter:
+        # Created lazily so it binds to the loop that serves requests
+        if self._limiter is None:
+            self._limiter = TurnLimiter(self.max_concurrent_turns)
+        return self._limiter
+
+    def _priority(self, sender_id: str) -> int:
+        missing = self.store.missing_count(sender_id)
+        return NEW_CONVERSATION_PRIORITY if missing is None else missing
+
+    def _sender_lock(self, sender_id: str) -> asyncio.Lock:
+        lock = self._sender_locks.get(sender_id)
+        if lock is None:
+            lock = asyncio.Lock()
+            self._sender_locks[sender_id] = lock
+        return lock
+
+    def _process(
+        self,
+        sender_id: str,
+        message: str,
+        guard: Optional[Callable[[], bool]] = None
+    ) -> Dict[str, Any]:
+        scheduler = get_scheduler()
+        if scheduler.saturated():
+            # Refuse before touching the conversation so a retry starts clean
+            return {"status": "busy", "retry_after": scheduler.retry_after()}
+        state = self.store.load(sender_id)
+        result, new_state = run_turn(self._flow_factory, state, sender_id, message)
+        if result.get("status") == "busy":
+            # The message was not handled; keep the stored state for the retry
+            return result
+        if guard is not None and not guard():
+            # The conversation moved to another worker mid-turn; its new owner runs the message
+            return {"status": "handed_off"}
+        if is_finished(result):
+            self.store.delete(sender_id)
+        else:
+            self.store.save(new_state)
+        result.setdefault("conversation_id", new_state.conversation_id)
+        return result
+
+    async def handle_message(
+        self,
+        sender_id: str,
+        message: str,
+        message_id: Optional[str] = None
+    ) -> Dict[str, Any]:
+        """Process one inbound message and return the flow's turn result"""
+        # Webhook retries of a message already taken are answered without a turn
+        key = None
+        if self.duplicates is not None:
+            keys = message_keys(sender_id, message, message_id, self.dedup_bucket_seconds)
+            key = keys[0]
+            if self.duplicates.check_and_mark_any(keys):
+                DUPLICATE_MESSAGES.inc()
+                return {"status": "duplicate"}
+
+        keys = [key] if key is not None else []
+        try:
+            # Wait out a burst of quick messages and run one turn for all of them
+            burst = await self.coalescer.add(sender_id, message, key)
+            if burst is None:
+                COALESCED_MESSAGES.inc()
+                return {"status": "coalesced"}
+            messages, keys = burst
+            COALESCED_BURST_SIZE.observe(len(messages))
+            result = await self.take_turn(sender_id, BURST_SEPARATOR.join(messages))
+        except Exception:
+            # e.g. the state store is unreachable: nothing was handled
+            self._forget(keys)
+            raise
+        if result.get("status") in ("busy", "error"):
+            self._forget(keys)
+        return result
+
+    def _forget(self, keys: List[str]) -> None:
+        """Let the retries of messages that were not handled get through"""
+        for key in keys:
+            self.duplicates.forget(key)
+
+    async def take_turn(
+        self,
+        sender_id: str,
+        message: str,
+        guard: Optional[Callable[[], bool]] = None
+    ) -> Dict[str, Any]:
+        """Run one turn for a message that is already deduplicated and coalesced.
+
+        When `guard` is given, the new state is only saved if it still returns True.
+        """
+        # Refuse before queueing: turns waiting here are invisible to the LLM scheduler,
+        # so both queues together are held to its limit
+        scheduler = get_scheduler()
+        if self.queued + scheduler.depth >= scheduler.max_queue:
+            LLM_QUEUE_REJECTIONS.inc(reason="queue_full", crew="turn")
+            return {"status": "busy", "retry_after": scheduler.retry_after(queued=self.queued)}
+
+        self.queued += 1
+        admitted = False
+        try:
+            # Turns of the same conversation run in order; different senders in parallel
+            async with self._sender_lock(sender_id):
+                priority = 0
+                if not self.limiter.free():
+                    # Conversations closer to done go first, so they finish and free their
+                    # state; only worth a store lookup when turns are waiting
+                    priority = await asyncio.to_thread(self._priority, sender_id)
+                async with self.limiter.slot(priority):
+                    self.queued -= 1
+                    admitted = True
+                    self.in_flight += 1
+                    try:
+                        loop = asyncio.get_running_loop()
+                        return await loop.run_in_executor(
+                            self._executor, self._process, sender_id, message, guard
+                        )
+                    finally:
+                        self.in_flight -= 1
+        finally:
+            if not admitted:
+                self.queued -= 1
+
+    def preload(self) -> None:
+        """Import the flow and crewAI on the executor, ahead of the first turn"""
+        if self._flow_factory is _default_flow_factory:
+            self._executor.submit(_import_flow)
+
+    def shutdown(self) -> None:
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+
+def create_conversation_service(settings) -> ConversationService:
+    """Service wired to the configured state store and duplicate filter"""
+    return ConversationService(
+        max_concurrent_turns=settings.max_concurrent_turns,
+        store=create_state_store(settings.redis_url, settings.state_ttl_seconds),
+        coalesce_window=settings.coalesce_window_ms / 1000,
+        coalesce_max_wait=settings.coalesce_max_wait_ms / 1000,
+        duplicates=create_duplicate_filter(
+            settings.dedup_mode,
+            settings.redis_url,
+            ttl_seconds=settings.dedup_ttl_seconds,
+            bloom_capacity=settings.dedup_bloom_capacity
+        ),
+        dedup_bucket_seconds=settings.dedup_bucket_seconds
+    )
@@ -0,0 +1,239 @@
+"""Duplicate suppression for inbound webhook messages.
+
+Messaging providers retry a webhook when it is not acknowledged in time, and
+a turn here takes seconds of LLM time, so the same message regularly arrives
+twice. Each inbound message gets an idempotency key: the provider's message
+id when there is one, otherwise a hash of the sender, the normalized text and
+a time bucket. A text retry may land in the bucket after the original, so the
+previous bucket's key is checked too. The key is checked and recorded in one
+step before the message reaches the flow, and the retry is answered without
+running any crew.
+
+Keys are kept in Redis with a TTL when workers share state, in memory
+otherwise. For very high volume, a pair of rotating counting Bloom filters
+remembers keys in fixed memory at the cost of a small false-positive rate
+(a genuine message mistaken for a retry).
+"""
+import hashlib
+import math
+import threading
+import time
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from typing import List, Optional
+
+from transportation_flow.extraction.cache import normalize_message
+
+DEFAULT_TTL_SECONDS = 24 * 60 * 60
+DEFAULT_BUCKET_SECONDS = 30
+
+
+def message_key(
+    sender_id: str,
+    message: str,
+    message_id: Optional[str] = None,
+    bucket_seconds: float = DEFAULT_BUCKET_SECONDS,
+    now: Optional[float] = None
+) -> str:
+    """Idempotency key of an inbound message"""
+    if message_id:
+        return f"id:{sender_id}:{message_id}"
+    # Without a provider id, the same text from the same sender within a bucket is a retry
+    bucket = int((time.time() if now is None else now) // bucket_seconds)
+    raw = f"{sender_id}\x00{normalize_message(message)}\x00{bucket}"
+    return "text:" + hashlib.sha1(raw.encode("utf-8")).hexdigest()
+
+
+def message_keys(
+    sender_id: str,
+    message: str,
+    message_id: Optional[str] = None,
+    bucket_seconds: float = DEFAULT_BUCKET_SECONDS,
+    now: Optional[float] = None
+) -> List[str]:
+    """Key to record for an inbound message, then the keys an earlier copy may hold"""
+    if message_id:
+        return [message_key(sender_id, message, message_id)]
+    now = time.time() if now is None else now
+    # A retry a few seconds after a bucket boundary still matches the original
+    return [
+        message_key(sender_id, message, None, bucket_seconds, now),
+        message_key(sender_id, message, None, bucket_seconds, now - bucket_seconds),
+    ]
+
+
+class DuplicateFilter(ABC):
+    """Remembers idempotency keys for `ttl_seconds`"""
+
+    ttl_seconds: int = DEFAULT_TTL_SECONDS
+
+    @abstractmethod
+    def check_and_mark(self, key: str) -> bool:
+        """Record `key`; True if it had already been recorded"""
+
+    @abstractmethod
+    def seen(self, key: str) -> bool:
+        """Whether `key` is recorded, without recording it"""
+
+    @abstractmethod
+    def forget(self, key: str) -> None:
+        """Drop `key` so the same message is accepted again (e.g. after a refused turn)"""
+
+    def check_and_mark_any(self, keys: List[str]) -> bool:
+        """Record the first of `keys`; True if any of them had already been recorded"""
+        if self.check_and_mark(keys[0]):
+            return True
+        return any(self.seen(key) for key in keys[1:])
+
+
+class InMemoryDuplicateFilter(DuplicateFilter):
+    """Process-local keys with expiry, capped at `max_entries`"""
+
+    def __init__(self, ttl_seconds: int = DEFAULT_TTL_SECONDS, max_entries: int = 100_000):
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self._keys: "OrderedDict[str, float]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def check_and_mark(self, key: str) -> bool:
+        now = time.monotonic()
+        with self._lock:
+            # Keys are inserted in expiry order, so expired ones sit at the front
+            while self._keys and next(iter(self._keys.values())) <= now:
+                self._keys.popitem(last=False)
+            if key in self._keys:
+                return True
+            self._keys[key] = now + self.ttl_seconds
+            if len(self._keys) > self.max_entries:
+                self._keys.popitem(last=False)
+            return False
+
+    def seen(self, key: str) -> bool:
+        with self._lock:
+            expires = self._keys.get(key)
+            return expires is not None and expires > time.monotonic()
+
+    def forget(self, key: str) -> None:
+        with self._lock:
+            self._keys.pop(key, None)
+
+
+class RedisDuplicateFilter(DuplicateFilter):
+    """Keys shared by all workers; `SET NX EX` checks and records in one round trip"""
+
+    def __init__(self, client, ttl_seconds: int = DEFAULT_TTL_SECONDS, prefix: str = "transport"):
+        self.client = client
+        self.ttl_seconds = ttl_seconds
+        self.prefix = prefix
+
+    @classmethod
+    def from_url(cls, url: str, **kwargs) -> "RedisDuplicateFilter":
+        import redis
+
+        return cls(redis.Redis.from_url(url), **kwargs)
+
+    def _key(self, key: str) -> str:
+        return f"{self.prefix}:inbound:{key}"
+
+    def check_and_mark(self, key: str) -> bool:
+        return not self.client.set(self._key(key), 1, nx=True, ex=self.ttl_seconds)
+
+    def seen(self, key: str) -> bool:
+        return bool(self.client.exists(self._key(key)))
+
+    def forget(self, key: str) -> None:
+        self.client.delete(self._key(key))
+
+
+class _CountingBloom:
+    __slots__ = ("counters", "hashes")
+
+    def __init__(self, size: int, hashes: int):
+        self.counters = bytearray(size)
+        self.hashes = hashes
+
+    def positions(self, key: str) -> List[int]:
+        digest = hashlib.blake2b(key.encode("utf-8"), digest_size=16).digest()
+        first, second = int.from_bytes(digest[:8], "little"), int.from_bytes(digest[8:], "little")
+        size = len(self.counters)
+        return [(first + i * second) % size for i in range(self.hashes)]
+
+    def contains(self, positions: List[int]) -> bool:
+        return all(self.counters[p] for p in positions)
+
+    def add(self, positions: List[int]) -> None:
+        for p in positions:
+            if self.counters[p] < 255:
+                self.counters[p] += 1
+
+    def remove(self, positions: List[int]) -> None:
+        for p in positions:
+            if 0 < self.counters[p] < 255:
+                self.counters[p] -= 1
+
+
+class BloomDuplicateFilter(DuplicateFilter):
+    """Fixed-memory filter for high volume; may rarely flag a new message as a duplicate.
+
+    Two generations of counting Bloom filters, each sized for `capacity` keys,
+    rotate every `ttl_seconds`, so a key is remembered for one to two TTLs.
+    """
+
+    def __init__(
+        self,
+        capacity: int = 1_000_000,
+        error_rate: float = 0.001,
+        ttl_seconds: int = DEFAULT_TTL_SECONDS
+    ):
+        self.ttl_seconds = ttl_seconds
+        self.size = max(8, int(-capacity * math.log(error_rate) / math.log(2) ** 2))
+        self.hashes = max(1, round(self.size / capacity * math.log(2)))
+        self._current = _CountingBloom(self.size, self.hashes)
+        self._previous = _CountingBloom(self.size, self.hashes)
+        self._rotated_at = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _rotate(self) -> None:
+        if time.monotonic() - self._rotated_at >= self.ttl_seconds:
+            self._previous = self._current
+            self._current = _CountingBloom(self.size, self.hashes)
+            self._rotated_at = time.monotonic()
+
+    def check_and_mark(self, key: str) -> bool:
+        positions = self._current.positions(key)
+        with self._lock:
+            self._rotate()
+            if self._current.contains(positions) or self._previous.contains(positions):
+                return True
+            self._current.add(positions)
+            return False
+
+    def seen(self, key: str) -> bool:
+        positions = self._current.positions(key)
+        with self._lock:
+            self._rotate()
+            return self._current.contains(positions) or self._previous.contains(positions)
+
+    def forget(self, key: str) -> None:
+        positions = self._current.positions(key)
+        with self._lock:
+            for generation in (self._current, self._previous):
+                if generation.contains(positions):
+                    generation.remove(positions)
+                    return
+
+
+def create_duplicate_filter(
+    mode: str = "exact",
+    redis_url: Optional[str] = None,
+    ttl_seconds: int = DEFAULT_TTL_SECONDS,
+    bloom_capacity: int = 1_000_000
+) -> Optional[DuplicateFilter]:
+    """Filter for the configured mode: 'exact' (Redis or in-memory), 'bloom' or 'off'"""
+    if mode == "off":
+        return None
+    if mode == "bloom":
+        return BloomDuplicateFilter(capacity=bloom_capacity, ttl_seconds=ttl_seconds)
+    if redis_url:
+        return RedisDuplicateFilter.from_url(redis_url, ttl_seconds=ttl_seconds)
+    return InMemoryDuplicateFilter(ttl_seconds=ttl_seconds)
@@ -0,0 +1,561 @@
+"""Horizontal worker mode: inbound messages sharded over Redis streams.
+
+The gateway (or any producer) appends each inbound message to one of
+`shards` streams, chosen by a stable hash of the sender_id, so all of a
+sender's messages land on the same stream in arrival order. Shards, not
+senders, are spread over the live workers with a consistent-hash ring. A
+worker joining or leaving only moves the shards adjacent to it on the ring.
+The sender-to-shard map never changes, so a conversation never has two
+streams.
+
+Workers announce themselves with heartbeats in a sorted set. Each worker
+computes the same ring from the live members. A worker only reads a shard
+while it holds that shard's lease key. A shard that moves away is drained
+first: no new entries are read, the turns already running finish, and only
+then is the lease released, so the next owner never runs a turn alongside
+the last one. Leases are renewed on a task of their own, more often than
+they expire, however long the turns take, and are renewed or released only
+through a compare-and-set script on the owner. A turn that finishes after its
+worker lost the lease anyway (e.g. a stalled process) neither saves the
+conversation nor acknowledges its entries, and the next owner runs it again.
+Each stream has one consumer group. Entries are acknowledged after their
+turn, and the next owner of a shard claims whatever the previous one left
+unacknowledged (e.g. after a crash). Within a worker, a sender's entries run
+one turn at a time, while different senders run in parallel through the
+ConversationService. Entries of a sender that queued up while its previous
+turn ran are merged into one turn, as the gateway's coalescer would, but
+without waiting out a quiet window. Turn results are appended to an outbound
+stream for delivery.
+
+Webhook retries are dropped by the publisher, before they are queued. The
+workers run turns without a duplicate check of their own, since an entry
+claimed after a crash was already recorded and must still be served.
+"""
+import asyncio
+import bisect
+import contextlib
+import hashlib
+import json
+import os
+import signal
+import socket
+import time
+from collections import deque
+from typing import Any, Deque, Dict, Iterable, List, Optional, Set, Tuple
+
+from transportation_flow.metrics import (
+    COALESCED_BURST_SIZE, COALESCED_MESSAGES, DUPLICATE_MESSAGES, SHARD_HANDOVERS, STREAM_MESSAGES
+)
+from transportation_flow.service.conversations import BURST_SEPARATOR, ConversationService
+from transportation_flow.service.dedup import DEFAULT_BUCKET_SECONDS, DuplicateFilter, message_keys
+
+DEFAULT_SHARDS = 64
+GROUP = "workers"
+# Points per worker on the hash ring; more points even out the shard spread
+RING_REPLICAS = 64
+
+# A stream entry read by a worker: its id and decoded fields
+Entry = Tuple[str, Dict[str, str]]
+
+# Compare-and-set on a lease key: only the worker named in it may extend or drop it.
+# Checking and acting in one script keeps a lease that expired between the two from
+# being extended or deleted under its new owner.
+RENEW_LEASE = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+    return redis.call('PEXPIRE', KEYS[1], ARGV[2])
+end
+return 0
+"""
+RELEASE_LEASE = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+    return redis.call('DEL', KEYS[1])
+end
+return 0
+"""
+
+
+def _hash(key: str) -> int:
+    # Stable across processes, unlike hash()
+    return int.from_bytes(hashlib.md5(key.encode("utf-8")).digest()[:8], "big")
+
+
+def _text(value: Any) -> Any:
+    return value.decode("utf-8") if isinstance(value, bytes) else value
+
+
+def shard_for(sender_id: str, shards: int = DEFAULT_SHARDS) -> int:
+    """Shard whose stream carries every message of `sender_id`"""
+    return _hash(sender_id) % shards
+
+
+def stream_key(prefix: str, shard: int) -> str:
+    return f"{prefix}:shard:{shard}:inbound"
+
+
+class HashRing:
+    """Consistent-hash ring mapping keys to nodes"""
+
+    def __init__(self, nodes: Iterable[str] = (), replicas: int = RING_REPLICAS):
+        self.replicas = replicas
+        self._points: List[Tuple[int, str]] = []
+        for node in nodes:
+            self.add(node)
+
+    @property
+    def nodes(self) -> Set[str]:
+        return {node for _, node in self._points}
+
+    def add(self, node: str) -> None:
+        for i in range(self.replicas):
+            bisect.insort(self._points, (_hash(f"{node}#{i}"), node))
+
+    def remove(self, node: str) -> None:
+        self._points = [point for point in self._points if point[1] != node]
+
+    def node_for(self, key: str) -> Optional[str]:
+        """Node owning `key`: the first point clockwise from the key's hash"""
+        if not self._points:
+            return None
+        index = bisect.bisect(self._points, (_hash(key), "")) % len(self._points)
+        return self._points[index][1]
+
+
+class ShardPublisher:
+    """Appends inbound messages to the stream of their sender's shard"""
+
+    def __init__(
+        self,
+        client,
+        shards: int = DEFAULT_SHARDS,
+        prefix: str = "transport",
+        maxlen: int = 100_000,
+        duplicates: Optional[DuplicateFilter] = None,
+        dedup_bucket_seconds: float = DEFAULT_BUCKET_SECONDS
+    ):
+        self.client = client
+        self.shards = shards
+        self.prefix = prefix
+        self.maxlen = maxlen
+        self.duplicates = duplicates
+        self.dedup_bucket_seconds = dedup_bucket_seconds
+
+    @classmethod
+    def from_url(cls, url: str, **kwargs) -> "ShardPublisher":
+        import redis
+
+        return cls(redis.Redis.from_url(url), **kwargs)
+
+    def publish(self, sender_id: str, message: str, message_id: Optional[str] = None) -> Optional[str]:
+        """Queue a message for the worker owning the sender's shard.
+
+        Returns the entry id, or None when the message is a retry of one already queued.
+        """
+        # Dropped here rather than on the worker: an entry reclaimed after a crash
+        # carries a key that is already recorded, and must still run
+        key = None
+        if self.duplicates is not None:
+            keys = message_keys(sender_id, message, message_id, self.dedup_bucket_seconds)
+            key = keys[0]
+            if self.duplicates.check_and_mark_any(keys):
+                DUPLICATE_MESSAGES.inc()
+                return None
+        fields = {"sender_id": sender_id, "message": message}
+        if message_id:
+            fields["message_id"] = message_id
+        stream = stream_key(self.prefix, shard_for(sender_id, self.shards))
+        try:
+            return _text(self.client.xadd(stream, fields, maxlen=self.maxlen, approximate=True))
+        except Exception:
+            # Not queued, so the provider's retry must be accepted
+            if key is not None:
+                self.duplicates.forget(key)
+            raise
+
+
+class ShardWorker:
+    """Consumes the shards the ring assigns to this worker and runs their turns"""
+
+    def __init__(
+        self,
+        client,
+        service: ConversationService,
+        worker_id: Optional[str] = None,
+        shards: int = DEFAULT_SHARDS,
+        prefix: str = "transport",
+        lease_seconds: float = 15.0,
+        heartbeat_seconds: float = 5.0,
+        max_in_flight: int = 32,
+        block_ms: int = 1000,
+        outbound_maxlen: int = 100_000
+    ):
+        if heartbeat_seconds >= lease_seconds:
+            raise ValueError("heartbeat_seconds must be shorter than lease_seconds")
+        self.client = client
+        self._renew_lease = client.register_script(RENEW_LEASE)
+        self._release_lease = client.register_script(RELEASE_LEASE)
+        self.service = service
+        self.worker_id = worker_id or f"{socket.gethostname()}-{os.getpid()}"
+        self.shards = shards
+        self.prefix = prefix
+        self.lease_seconds = lease_seconds
+        self.heartbeat_seconds = heartbeat_seconds
+        self.max_in_flight = max_in_flight
+        self.block_ms = block_ms
+        self.outbound_maxlen = outbound_maxlen
+        self.owned: Set[int] = set()
+        self._draining: Set[int] = set()
+        self._streams = {stream_key(prefix, shard): shard for shard in range(shards)}
+        self._groups: Set[int] = set()
+        # Per shard, the tasks running its senders' turns
+        self._in_flight: Dict[int, Set[asyncio.Task]] = {}
+        self._queues: Dict[str, Deque[Entry]] = {}
+        self._runners: Dict[str, asyncio.Task] = {}
+        self._entries = 0
+        self._background: Set[asyncio.Task] = set()
+        self._rebalancing = asyncio.Lock()
+        self._heartbeat: Optional[asyncio.Task] = None
+        self._closing = False
+
+    @property
+    def _workers_key(self) -> str:
+        return f"{self.prefix}:workers"
+
+    @property
+    def outbound_key(self) -> str:
+        return f"{self.prefix}:outbound"
+
+    def _lease_key(self, shard: int) -> str:
+        return f"{self.prefix}:shard:{shard}:owner"
+
+    @property
+    def _lease_ms(self) -> int:
+        return int(self.lease_seconds * 1000)
+
+    def in_flight(self) -> int:
+        """Entries dispatched and not yet acknowledged"""
+        return self._entries
+
+    # Membership and leases (blocking Redis calls, run off the event loop)
+
+    def members(self) -> List[str]:
+        """Live workers, after recording this worker's heartbeat"""
+        now = time.time()
+        self.client.zadd(self._workers_key, {self.worker_id: now})
+        self.client.zremrangebyscore(self._workers_key, "-inf", now - self.lease_seconds)
+        return sorted(_text(member) for member in self.client.zrange(self._workers_key, 0, -1))
+
+    def assignment(self, members: Iterable[str]) -> Set[int]:
+        """Shards the ring gives this worker among `members`"""
+        ring = HashRing(members)
+        return {shard for shard in range(self.shards) if ring.node_for(f"shard:{shard}") == self.worker_id}
+
+    def _holds(self, shard: int) -> bool:
+        return _text(self.client.get(self._lease_key(shard))) == self.worker_id
+
+    def _acquire(self, shard: int) -> bool:
+        key = self._lease_key(shard)
+        if self.client.set(key, self.worker_id, nx=True, px=self._lease_ms):
+            return True
+        # Still ours, e.g. from before a restart under the same worker id
+        return self._renew(shard)
+
+    def _renew(self, shard: int) -> bool:
+        return bool(self._renew_lease(keys=[self._lease_key(shard)], args=[self.worker_id, self._lease_ms]))
+
+    def _release(self, shard: int) -> None:
+        self._release_lease(keys=[self._lease_key(shard)], args=[self.worker_id])
+
+    def _ensure_group(self, shard: int) -> None:
+        if shard in self._groups:
+            return
+        try:
+            # From the start of the stream, so messages queued before any worker ran are served
+            self.client.xgroup_create(stream_key(self.prefix, shard), GROUP, id="0", mkstream=True)
+        except Exception as e:
+            if "BUSYGROUP" not in str(e):
+                raise
+        self._groups.add(shard)
+
+    def _reclaim(self, shard: int) -> List[Tuple[Any, Dict[Any, Any]]]:
+        """Take over the entries a previous owner read but never acknowledged"""
+        entries: List[Tuple[Any, Dict[Any, Any]]] = []
+        start = "0-0"
+        while True:
+            reply = self.client.xautoclaim(stream_key(self.prefix, shard), GROUP, self.worker_id, 0, start)
+            start, claimed = _text(reply[0]), reply[1]
+            entries.extend(claimed)
+            # A page can claim nothing (its entries were trimmed) with more pages after it
+            if start == "0-0":
+                return entries
+
+    def _rebalance(
+        self,
+        owned: Set[int],
+        draining: Set[int],
+        closing: bool
+    ) -> Tuple[List[Tuple[int, list]], List[int], List[int]]:
+        wanted = self.assignment(self.members())
+        lost, stolen = [], []
+        for shard in sorted(owned):
+            if not self._renew(shard):
+                stolen.append(shard)
+            elif shard not in wanted:
+                lost.append(shard)
+        for shard in draining:
+            self._renew(shard)
+
+        gained = []
+        if closing:
+            # Only keep the leases of the turns still finishing
+            return gained, [], stolen
+        for shard in sorted(wanted - owned - draining):
+            if self._acquire(shard):
+                self._ensure_group(shard)
+                gained.append((shard, self._reclaim(shard)))
+        return gained, lost, stolen
+
+    # Event loop side
+
+    async def rebalance(self) -> None:
+        """Heartbeat, renew leases and take or hand off shards to match the ring"""
+        async with self._rebalancing:
+            # Copies, since the loop keeps changing the sets while the thread reads them
+            gained, lost, stolen = await asyncio.to_thread(
+                self._rebalance, set(self.owned), set(self._draining), self._closing
+            )
+            self._apply(gained, lost, stolen)
+
+    def _apply(self, gained: List[Tuple[int, list]], lost: List[int], stolen: List[int]) -> None:
+        for shard in stolen:
+            # The lease expired and another worker holds it; nothing of ours to release
+            self.owned.discard(shard)
+            SHARD_HANDOVERS.inc(direction="stolen")
+        for shard in lost:
+            self.owned.discard(shard)
+            self._draining.add(shard)
+            self._spawn(self._hand_off(shard))
+            SHARD_HANDOVERS.inc(direction="lost")
+        for shard, entries in gained:
+            self.owned.add(shard)
+            for entry_id, fields in entries:
+                self._dispatch(shard, entry_id, fields)
+            SHARD_HANDOVERS.inc(direction="gained")
+
+    async def _beat(self) -> None:
+        # On its own task, so a long turn or a full worker never lets a lease lapse
+        while True:
+            try:
+                await self.rebalance()
+            except Exception as e:
+                print(f"❌ Worker {self.worker_id} heartbeat failed: {e}")
+            await asyncio.sleep(self.heartbeat_seconds)
+
+    async def _hand_off(self, shard: int) -> None:
+        tasks = self._in_flight.get(shard)
+        if tasks:
+            await asyncio.wait(list(tasks))
+        await asyncio.to_thread(self._release, shard)
+        self._draining.discard(shard)
+
+    def _spawn(self, coroutine) -> asyncio.Task:
+        task = asyncio.ensure_future(coroutine)
+        self._background.add(task)
+        task.add_done_callback(self._background.discard)
+        return task
+
+    def _track(self, shard: int, coroutine) -> None:
+        task = asyncio.ensure_future(coroutine)
+        tasks = self._in_flight.setdefault(shard, set())
+        tasks.add(task)
+        task.add_done_callback(tasks.discard)
+
+    def _serving(self, shard: int) -> bool:
+        return shard in self.owned or shard in self._draining
+
+    def _dispatch(self, shard: int, entry_id: Any, fields: Optional[Dict[Any, Any]]) -> None:
+        entry_id = _text(entry_id)
+        fields = {_text(name): _text(value) for name, value in (fields or {}).items()}
+        self._entries += 1
+        sender_id = fields.get("sender_id")
+        if not sender_id or "message" not in fields:
+            # Trimmed or malformed entry; acknowledge it so it is not claimed forever
+            result = {"status": "error", "error": "Malformed stream entry"}
+            self._track(shard, self._finish(shard, [(entry_id, fields)], result))
+            return
+        self._queues.setdefault(sender_id, deque()).append((entry_id, fields))
+        # A running turn of the sender picks the entry up next, so turns keep their order
+        if sender_id not in self._runners:
+            self._runners[sender_id] = asyncio.ensure_future(self._run_sender(shard, sender_id))
+            self._track(shard, self._runners[sender_id])
+
+    async def _run_sender(self, shard: int, sender_id: str) -> None:
+        queue = self._queues[sender_id]
+
+        def holds() -> bool:
+            return self._holds(shard)
+
+        try:
+            # Once the lease is lost, what is left stays unacknowledged for the next owner
+            while queue and self._serving(shard):
+                batch = list(queue)
+                queue.clear()
+                while True:
+                    # Deduplicated by the publisher already
+                    message = BURST_SEPARATOR.join(fields["message"] for _, fields in batch)
+                    try:
+                        result = await self.service.take_turn(sender_id, message, guard=holds)
+                    except Exception as e:
+                        result = {"status": "error", "error": str(e)}
+                    if result.get("status") != "busy" or not self._serving(shard):
+                        break
+                    # The LLM queue is full; entries that arrive meanwhile join the retry
+                    await asyncio.sleep(result.get("retry_after") or 1)
+                    batch.extend(queue)
+                    queue.clear()
+                if result.get("status") in ("busy", "handed_off"):
+                    self._entries -= len(batch)
+                    STREAM_MESSAGES.inc(len(batch), status="handed_off")
+                    break
+                await self._finish(shard, batch, result)
+        finally:
+            # Normally empty: nothing awaited since the loop last found it so. After an
+            # error or a lost lease the rest is left for the shard's next owner
+            self._entries -= len(queue)
+            del self._queues[sender_id]
+            del self._runners[sender_id]
+
+    async def _finish(self, shard: int, batch: List[Entry], result: Dict[str, Any]) -> None:
+        try:
+            completed = await asyncio.to_thread(self._complete, shard, batch, result)
+        finally:
+            self._entries -= len(batch)
+        if not completed:
+            STREAM_MESSAGES.inc(len(batch), status="handed_off")
+            return
+        if len(batch) > 1:
+            COALESCED_BURST_SIZE.observe(len(batch))
+            COALESCED_MESSAGES.inc(len(batch) - 1)
+            STREAM_MESSAGES.inc(len(batch) - 1, status="coalesced")
+        STREAM_MESSAGES.inc(status=result.get("status", "error"))
+
+    def _complete(self, shard: int, batch: List[Entry], result: Dict[str, Any]) -> bool:
+        if not self._holds(shard):
+            # The lease lapsed mid-turn; the next owner runs these entries again
+            return False
+        # As with the gateway's coalescer, the newest message gets the reply
+        for index, (_, fields) in enumerate(batch):
+            reply = result if index == len(batch) - 1 else {"status": "coalesced"}
+            self.client.xadd(self.outbound_key, {
+                "sender_id": fields.get("sender_id", ""),
+                "message_id": fields.get("message_id", ""),
+                "status": reply.get("status", "error"),
+                "result": json.dumps(reply, ensure_ascii=False, default=str),
+            }, maxlen=self.outbound_maxlen, approximate=True)
+        self.client.xack(stream_key(self.prefix, shard), GROUP, *[entry_id for entry_id, _ in batch])
+        return True
+
+    async def poll_once(self) -> int:
+        """Read new entries of the owned shards and start their turns; returns how many"""
+        room = self.max_in_flight - self.in_flight()
+        if room <= 0:
+            # Bounded, so `stop` is noticed even while every turn is slow
+            await asyncio.wait(
+                [task for tasks in self._in_flight.values() for task in tasks],
+                timeout=self.block_ms / 1000,
+                return_when=asyncio.FIRST_COMPLETED
+            )
+            return 0
+        if not self.owned:
+            await asyncio.sleep(self.block_ms / 1000)
+            return 0
+
+        streams = {stream_key(self.prefix, shard): ">" for shard in sorted(self.owned)}
+        reply = await asyncio.to_thread(
+            self.client.xreadgroup, GROUP, self.worker_id, streams,
+            count=room, block=self.block_ms or None
+        )
+        dispatched = 0
+        for stream, entries in reply or []:
+            shard = self._streams[_text(stream)]
+            if shard not in self.owned:
+                # Handed off while reading; the next owner claims these entries
+                continue
+            for entry_id, fields in entries:
+                self._dispatch(shard, entry_id, fields)
+                dispatched += 1
+        return dispatched
+
+    async def run(self, stop: Optional[asyncio.Event] = None) -> None:
+        """Serve shards until `stop` is set, then leave the pool cleanly"""
+        stop = stop or asyncio.Event()
+        try:
+            await self.rebalance()
+            self._heartbeat = asyncio.ensure_future(self._beat())
+            while not stop.is_set():
+                await self.poll_once()
+        finally:
+            await self.close()
+
+    async def close(self) -> None:
+        """Finish running turns, release every lease and leave the ring"""
+        # The heartbeat keeps the leases alive meanwhile, without taking new shards
+        self._closing = True
+        tasks = [task for tasks in self._in_flight.values() for task in tasks]
+        if tasks:
+            await asyncio.wait(tasks)
+        if self._background:
+            await asyncio.wait(list(self._background))
+        if self._heartbeat is not None:
+            self._heartbeat.cancel()
+            await asyncio.wait([self._heartbeat])
+            self._heartbeat = None
+        shards = self.owned | self._draining
+        self.owned = set()
+        self._draining = set()
+
+        def leave() -> None:
+            for shard in shards:
+                self._release(shard)
+            self.client.zrem(self._workers_key, self.worker_id)
+
+        await asyncio.to_thread(leave)
+
+
+def run_worker():
+    """Run one worker of the pool, until SIGINT or SIGTERM"""
+    import redis
+
+    from transportation_flow.crews.ollama import ModelWarmer
+    from transportation_flow.service.conversations import create_conversation_service
+    from transportation_flow.settings import get_settings
+
+    settings = get_settings()
+    if not settings.redis_url:
+        raise SystemExit("Worker mode needs TRANSPORT_REDIS_URL")
+    warmer = ModelWarmer().start() if settings.ollama_warmup else None
+    service = create_conversation_service(settings)
+    service.preload()
+    worker = ShardWorker(
+        redis.Redis.from_url(settings.redis_url),
+        service,
+        worker_id=settings.worker_id,
+        shards=settings.worker_shards,
+        lease_seconds=settings.worker_lease_seconds,
+        heartbeat_seconds=settings.worker_heartbeat_seconds,
+        max_in_flight=settings.worker_max_in_flight
+    )
+
+    async def main() -> None:
+        stop = asyncio.Event()
+        loop = asyncio.get_running_loop()
+        for signum in (signal.SIGINT, signal.SIGTERM):
+            with contextlib.suppress(NotImplementedError):
+                loop.add_signal_handler(signum, stop.set)
+        await worker.run(stop)
+
+    try:
+        asyncio.run(main())
+    finally:
+        if warmer is not None:
+            warmer.stop()
+        service.shutdown()
@@ -0,0 +1,186 @@
+"""Pluggable persistence for ConversationState between turns.
+
+The state of an open conversation lives in the store, not in a worker, so any
+worker can pick up the next message of any sender.
+"""
+import threading
+import time
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+
+from transportation_flow.schemas.conversation_state import ConversationState
+from transportation_flow.schemas.parked_state import ParkedConversation
+from transportation_flow.schemas.state_codec import (
+    DEFAULT_COMPRESS_OVER, decode_state, encode_state, is_snapshot
+)
+
+DEFAULT_TTL_SECONDS = 24 * 60 * 60
+
+
+class StateStore(ABC):
+    """Saves the active conversation of each sender with a TTL"""
+
+    ttl_seconds: int = DEFAULT_TTL_SECONDS
+
+    @abstractmethod
+    def load(self, sender_id: str) -> Optional[ConversationState]:
+        """Return the sender's active conversation, refreshing its TTL"""
+
+    @abstractmethod
+    def save(self, state: ConversationState) -> None:
+        """Store a conversation under its sender_id and conversation_id"""
+
+    @abstractmethod
+    def delete(self, sender_id: str) -> None:
+        """Forget the sender's active conversation"""
+
+    @abstractmethod
+    def sender_for(self, conversation_id: str) -> Optional[str]:
+        """Look up which sender a conversation belongs to"""
+
+    def missing_count(self, sender_id: str) -> Optional[int]:
+        """Required fields the sender's conversation still lacks; None without one"""
+        state = self.load(sender_id)
+        return None if state is None else len(state.missing_fields)
+
+
+class InMemoryStateStore(StateStore):
+    """Process-local store, for tests and single-process runs.
+
+    Conversations are held parked (see ParkedConversation) and only rebuilt
+    into a ConversationState when loaded for a turn. Every write moves its
+    entry to the back, so entries stay in expiry order and expired ones are
+    swept from the front on each save.
+    """
+
+    def __init__(self, ttl_seconds: int = DEFAULT_TTL_SECONDS):
+        self.ttl_seconds = ttl_seconds
+        self._states: "OrderedDict[str, Tuple[float, ParkedConversation]]" = OrderedDict()
+        self._conversations: "OrderedDict[str, Tuple[float, str]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _sweep(self, now: float) -> None:
+        for table in (self._states, self._conversations):
+            while table and next(iter(table.values()))[0] <= now:
+                table.popitem(last=False)
+
+    def _live(self, table: Dict[str, Tuple[float, Any]], key: str) -> Optional[Any]:
+        entry = table.get(key)
+        if entry is None:
+            return None
+        expires_at, value = entry
+        if expires_at <= time.monotonic():
+            del table[key]
+            return None
+        return value
+
+    def load(self, sender_id: str) -> Optional[ConversationState]:
+        with self._lock:
+            parked = self._live(self._states, sender_id)
+            if parked is None:
+                return None
+            self._states[sender_id] = (time.monotonic() + self.ttl_seconds, parked)
+            self._states.move_to_end(sender_id)
+        return parked.to_state()
+
+    def save(self, state: ConversationState) -> None:
+        parked = ParkedConversation.from_state(state)
+        now = time.monotonic()
+        with self._lock:
+            self._sweep(now)
+            self._states[state.sender_id] = (now + self.ttl_seconds, parked)
+            self._states.move_to_end(state.sender_id)
+            if state.conversation_id:
+                self._conversations[state.conversation_id] = (now + self.ttl_seconds, state.sender_id)
+                self._conversations.move_to_end(state.conversation_id)
+
+    def delete(self, sender_id: str) -> None:
+        with self._lock:
+            entry = self._states.pop(sender_id, None)
+            if entry is not None:
+                self._conversations.pop(entry[1].conversation_id, None)
+
+    def sender_for(self, conversation_id: str) -> Optional[str]:
+        with self._lock:
+            return self._live(self._conversations, conversation_id)
+
+    def missing_count(self, sender_id: str) -> Optional[int]:
+        with self._lock:
+            parked = self._live(self._states, sender_id)
+        return None if parked is None else parked.missing_count()
+
+
+class RedisStateStore(StateStore):
+    """Redis-backed store; every load and save is a single pipelined round trip.
+
+    States are saved as binary snapshots (see state_codec); JSON written by
+    earlier versions is still read.
+    """
+
+    def __init__(
+        self,
+        client,
+        ttl_seconds: int = DEFAULT_TTL_SECONDS,
+        prefix: str = "transport",
+        compress_over: Optional[int] = DEFAULT_COMPRESS_OVER
+    ):
+        self.client = client
+        self.ttl_seconds = ttl_seconds
+        self.prefix = prefix
+        self.compress_over = compress_over
+
+    @classmethod
+    def from_url(cls, url: str, **kwargs) -> "RedisStateStore":
+        import redis
+
+        return cls(redis.Redis.from_url(url), **kwargs)
+
+    def _state_key(self, sender_id: str) -> str:
+        return f"{self.prefix}:state:{sender_id}"
+
+    def _conversation_key(self, conversation_id: str) -> str:
+        return f"{self.prefix}:conversation:{conversation_id}"
+
+    def load(self, sender_id: str) -> Optional[ConversationState]:
+        key = self._state_key(sender_id)
+        pipe = self.client.pipeline(transaction=False)
+        pipe.get(key)
+        pipe.expire(key, self.ttl_seconds)
+        payload, _ = pipe.execute()
+        if payload is None:
+            return None
+        if is_snapshot(payload):
+            return decode_state(payload)
+        return ConversationState.model_validate_json(payload)
+
+    def save(self, state: ConversationState) -> None:
+        pipe = self.client.pipeline(transaction=True)
+        pipe.set(
+            self._state_key(state.sender_id),
+            encode_state(state, self.compress_over),
+            ex=self.ttl_seconds
+        )
+        if state.conversation_id:
+            pipe.set(
+                self._conversation_key(state.conversation_id),
+                state.sender_id,
+                ex=self.ttl_seconds
+            )
+        pipe.execute()
+
+    def delete(self, sender_id: str) -> None:
+        self.client.delete(self._state_key(sender_id))
+
+    def sender_for(self, conversation_id: str) -> Optional[str]:
+        sender_id = self.client.get(self._conversation_key(conversation_id))
+        if isinstance(sender_id, bytes):
+            sender_id = sender_id.decode()
+        return sender_id
+
+
+def create_state_store(redis_url: Optional[str] = None, ttl_seconds: int = DEFAULT_TTL_SECONDS) -> StateStore:
+    """Redis store when a URL is configured, in-memory otherwise"""
+    if redis_url:
+        return RedisStateStore.from_url(redis_url, ttl_seconds=ttl_seconds)
+    return InMemoryStateStore(ttl_seconds=ttl_seconds)
@@ -0,0 +1,225 @@
+"""Runtime settings read from the environment (and `.env`)"""
+import os
+from functools import lru_cache
+from typing import Optional
+
+from dotenv import load_dotenv
+from pydantic import BaseModel, Field
+
+
+def _env_int(name: str, default: int) -> int:
+    value = os.getenv(name)
+    return int(value) if value not in (None, "") else default
+
+
+def _env_float(name: str, default: float) -> float:
+    value = os.getenv(name)
+    return float(value) if value not in (None, "") else default
+
+
+def _env_bool(name: str, default: bool) -> bool:
+    value = os.getenv(name)
+    if value in (None, ""):
+        return default
+    return value.strip().lower() in ("1", "true", "yes", "on")
+
+
+class Settings(BaseModel):
+    """Service configuration"""
+    host: str = Field(default="0.0.0.0", description="HTTP bind address")
+    port: int = Field(default=8000, description="HTTP port")
+    max_concurrent_turns: int = Field(
+        default=8,
+        description="Flow turns allowed to run against the LLM backend at once"
+    )
+    coalesce_window_ms: int = Field(
+        default=1500,
+        description="Quiet time after a sender's last message before their burst runs (0 disables)"
+    )
+    coalesce_max_wait_ms: int = Field(
+        default=6000,
+        description="Longest a burst is held after its first message"
+    )
+    dedup_mode: str = Field(
+        default="exact",
+        description=(
+            "Duplicate suppression for webhook retries: 'exact' (Redis or in-memory keys), "
+            "'bloom' (fixed memory, rare false positives) or 'off'"
+        )
+    )
+    dedup_ttl_seconds: int = Field(
+        default=24 * 60 * 60,
+        description="How long an inbound message is remembered"
+    )
+    dedup_bucket_seconds: int = Field(
+        default=30,
+        description="Window in which identical text without a message id counts as a retry"
+    )
+    dedup_bloom_capacity: int = Field(
+        default=1_000_000,
+        description="Messages per TTL the Bloom filter is sized for"
+    )
+    llm_max_concurrent_calls: int = Field(
+        default=2,
+        description="Crew calls sent to the model server at once (match OLLAMA_NUM_PARALLEL)"
+    )
+    llm_queue_max: int = Field(
+        default=32,
+        description="Crew calls allowed to wait for a slot before new ones are refused"
+    )
+    llm_queue_timeout_seconds: float = Field(
+        default=30.0,
+        description="Longest a crew call waits for a slot before it is refused"
+    )
+    redis_url: Optional[str] = Field(
+        default=None,
+        description="Redis URL for shared state; in-memory when unset"
+    )
+    inbound_streams: bool = Field(
+        default=False,
+        description="Queue inbound messages on sharded Redis streams for `worker` processes"
+    )
+    worker_shards: int = Field(
+        default=64,
+        description="Inbound streams senders are hashed over; must match across gateway and workers"
+    )
+    worker_id: Optional[str] = Field(
+        default=None,
+        description="Name of this worker in the pool; host name and pid when unset"
+    )
+    worker_lease_seconds: float = Field(
+        default=15.0,
+        description="How long a silent worker keeps its shards before they move"
+    )
+    worker_heartbeat_seconds: float = Field(
+        default=5.0,
+        description="How often a worker renews its leases and checks the pool"
+    )
+    worker_max_in_flight: int = Field(
+        default=32,
+        description="Stream entries a worker holds unacknowledged at once"
+    )
+    state_ttl_seconds: int = Field(
+        default=24 * 60 * 60,
+        description="How long an idle conversation is kept"
+    )
+    extraction_cache_size: int = Field(
+        default=1024,
+        description="Extraction results kept in the local LRU cache"
+    )
+    extraction_cache_ttl_seconds: int = Field(
+        default=3600,
+        description="How long a cached extraction result stays valid"
+    )
+    extraction_cache_shared: bool = Field(
+        default=False,
+        description="Share the extraction cache between workers through Redis"
+    )
+    extraction_structured_output: bool = Field(
+        default=True,
+        description="Constrain extraction output to the PartialRequest JSON schema (Ollama format)"
+    )
+    question_mode: str = Field(
+        default="template",
+        description=(
+            "How follow-up questions are phrased: 'template', 'llm' (conversation crew) "
+            "or 'combined' (asked by the extraction call itself)"
+        )
+    )
+    summary_mode: str = Field(
+        default="template",
+        description="How the final summary is written: 'template' or 'llm'"
+    )
+    history_max_messages: int = Field(
+        default=8,
+        description="Messages kept verbatim per conversation; older ones are summarized (0 keeps all)"
+    )
+    history_summary_chars: int = Field(
+        default=600,
+        description="Upper bound on the rolling summary of older messages"
+    )
+    ollama_base_url: str = Field(
+        default="http://localhost:11434",
+        description="Ollama server the crews talk to"
+    )
+    ollama_keep_alive: str = Field(
+        default="30m",
+        description="How long Ollama keeps a model loaded after a request (-1 keeps it forever)"
+    )
+    ollama_max_connections: int = Field(
+        default=16,
+        description="Pooled HTTP connections shared by all crew calls"
+    )
+    ollama_timeout_seconds: float = Field(
+        default=300.0,
+        description="Read timeout for a crew call to Ollama"
+    )
+    ollama_warmup: bool = Field(
+        default=True,
+        description="Load the configured models at startup and report readiness"
+    )
+    ollama_warmup_timeout_seconds: float = Field(
+        default=180.0,
+        description="How long loading one model may take"
+    )
+    ollama_warmup_retry_seconds: float = Field(
+        default=10.0,
+        description="Pause before retrying models that failed to load"
+    )
+    crew_verbose: bool = Field(
+        default=True,
+        description="Print agent and crew reasoning to stdout"
+    )
+    otel_enabled: bool = Field(
+        default=False,
+        description="Emit OpenTelemetry spans for flow steps and crew calls"
+    )
+
+    @classmethod
+    def from_env(cls) -> "Settings":
+        return cls(
+            host=os.getenv("TRANSPORT_HOST", "0.0.0.0"),
+            port=_env_int("TRANSPORT_PORT", 8000),
+            max_concurrent_turns=_env_int("TRANSPORT_MAX_CONCURRENT_TURNS", 8),
+            coalesce_window_ms=_env_int("TRANSPORT_COALESCE_WINDOW_MS", 1500),
+            coalesce_max_wait_ms=_env_int("TRANSPORT_COALESCE_MAX_WAIT_MS", 6000),
+            dedup_mode=os.getenv("TRANSPORT_DEDUP_MODE", "exact").strip().lower(),
+            dedup_ttl_seconds=_env_int("TRANSPORT_DEDUP_TTL_SECONDS", 24 * 60 * 60),
+            dedup_bucket_seconds=_env_int("TRANSPORT_DEDUP_BUCKET_SECONDS", 30),
+            dedup_bloom_capacity=_env_int("TRANSPORT_DEDUP_BLOOM_CAPACITY", 1_000_000),
+            llm_max_concurrent_calls=_env_int("TRANSPORT_LLM_MAX_CONCURRENT_CALLS", 2),
+            llm_queue_max=_env_int("TRANSPORT_LLM_QUEUE_MAX", 32),
+            llm_queue_timeout_seconds=_env_float("TRANSPORT_LLM_QUEUE_TIMEOUT_SECONDS", 30.0),
+            redis_url=os.getenv("TRANSPORT_REDIS_URL") or None,
+            inbound_streams=_env_bool("TRANSPORT_INBOUND_STREAMS", False),
+            worker_shards=_env_int("TRANSPORT_WORKER_SHARDS", 64),
+            worker_id=os.getenv("TRANSPORT_WORKER_ID") or None,
+            worker_lease_seconds=_env_float("TRANSPORT_WORKER_LEASE_SECONDS", 15.0),
+            worker_heartbeat_seconds=_env_float("TRANSPORT_WORKER_HEARTBEAT_SECONDS", 5.0),
+            worker_max_in_flight=_env_int("TRANSPORT_WORKER_MAX_IN_FLIGHT", 32),
+            state_ttl_seconds=_env_int("TRANSPORT_STATE_TTL_SECONDS", 24 * 60 * 60),
+            extraction_cache_size=_env_int("TRANSPORT_EXTRACTION_CACHE_SIZE", 1024),
+            extraction_cache_ttl_seconds=_env_int("TRANSPORT_EXTRACTION_CACHE_TTL_SECONDS", 3600),
+            extraction_cache_shared=_env_bool("TRANSPORT_EXTRACTION_CACHE_SHARED", False),
+            extraction_structured_output=_env_bool("TRANSPORT_EXTRACTION_STRUCTURED_OUTPUT", True),
+            question_mode=os.getenv("TRANSPORT_QUESTION_MODE", "template").strip().lower(),
+            summary_mode=os.getenv("TRANSPORT_SUMMARY_MODE", "template").strip().lower(),
+            history_max_messages=_env_int("TRANSPORT_HISTORY_MAX_MESSAGES", 8),
+            history_summary_chars=_env_int("TRANSPORT_HISTORY_SUMMARY_CHARS", 600),
+            ollama_base_url=os.getenv("OLLAMA_API_BASE") or "http://localhost:11434",
+            ollama_keep_alive=os.getenv("TRANSPORT_OLLAMA_KEEP_ALIVE", "30m"),
+            ollama_max_connections=_env_int("TRANSPORT_OLLAMA_MAX_CONNECTIONS", 16),
+            ollama_timeout_seconds=_env_float("TRANSPORT_OLLAMA_TIMEOUT_SECONDS", 300.0),
+            ollama_warmup=_env_bool("TRANSPORT_OLLAMA_WARMUP", True),
+            ollama_warmup_timeout_seconds=_env_float("TRANSPORT_OLLAMA_WARMUP_TIMEOUT_SECONDS", 180.0),
+            ollama_warmup_retry_seconds=_env_float("TRANSPORT_OLLAMA_WARMUP_RETRY_SECONDS", 10.0),
+            crew_verbose=_env_bool("TRANSPORT_CREW_VERBOSE", True),
+            otel_enabled=_env_bool("TRANSPORT_OTEL_ENABLED", False),
+        )
+
+
+@lru_cache(maxsize=1)
+def get_settings() -> Settings:
+    """Settings for this process, read once"""
+    load_dotenv()
+    return Settings.from_env()
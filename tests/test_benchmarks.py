@@ -0,0 +1,152 @@
+#!/usr/bin/env python
+"""Tests for the benchmark helpers and the stub Ollama server"""
+import requests
+
+from benchmarks.flow_latency import compare, percentiles
+from benchmarks.stub_ollama import CannedResponder, StubOllamaServer
+
+
+def test_stub_answers_generate_and_chat():
+    responder = CannedResponder({"somos 4": {"cantidad_pasajeros": 4}})
+    with StubOllamaServer(responder, latency=0.0) as stub:
+        generated = requests.post(f"{stub.url}/api/generate", json={
+            "model": "qwen3:8b", "prompt": "Analyze this message\nMessage: somos 4\n"
+        }).json()
+        assert generated["response"].endswith('Final Answer: {"cantidad_pasajeros": 4}')
+
+        chat = requests.post(f"{stub.url}/v1/chat/completions", json={
+            "model": "phi3:3.8b",
+            "messages": [{"role": "user", "content": "Missing required fields: cc_nit"}]
+        }).json()
+        assert "Final Answer:" in chat["choices"][0]["message"]["content"]
+        assert stub.stats["by_kind"] == {"extraction": 1, "question": 1}
+
+
+def test_percentiles_and_regression_check():
+    stats = percentiles([0.1] * 95 + [1.0] * 5)
+    assert stats["p50"] == 100.0
+    assert stats["p99"] == 1000.0
+
+    def run(p95):
+        step = {"count": 1, "p95": p95}
+        return {"levels": [{"concurrency": 1, "turn": step, "steps": {
+            "process_user_message": step,
+            "check_completeness_and_respond": {"count": 0},
+            "create_final_summary": {"count": 0},
+        }}]}
+
+    assert compare(run(110), run(100), tolerance=0.2) == []
+    assert len(compare(run(150), run(100), tolerance=0.2)) == 2
+
+
+def test_parked_state_is_smaller_than_pydantic():
+    from benchmarks.state_size import measure
+
+    sizes = measure(conversations=200, turns=3)
+    assert sizes["parked"] < sizes["json"] < sizes["pydantic"]
+
+
+def test_import_profile_parses_importtime_output():
+    from benchmarks.import_time import by_package, compare as compare_imports, parse_importtime
+
+    stderr = "\n".join([
+        "import time: self [us] | cumulative | imported package",
+        "import time:       120 |        120 |     pydantic.fields",
+        "import time:       300 |        420 |   pydantic",
+        "import time:        50 |        470 | transportation_flow.settings",
+    ])
+    rows = parse_importtime(stderr)
+    assert [row["depth"] for row in rows] == [2, 1, 0]
+    assert by_package(rows) == {"pydantic": 420, "transportation_flow": 50}
+
+    def run(total_us):
+        return {"entry_points": {"cli": {"total_us": total_us}}}
+
+    assert compare_imports(run(110_000), run(100_000), tolerance=0.2) == []
+    assert compare_imports(run(150_000), run(100_000), tolerance=0.2) == ["cli: 100ms -> 150ms"]
+
+
+def test_startup_entry_points_do_not_import_crewai():
+    import subprocess
+    import sys
+
+    from benchmarks.import_time import ENTRY_POINTS
+
+    for name, module in ENTRY_POINTS.items():
+        if name == "flow":
+            continue
+        loaded = subprocess.run(
+            [sys.executable, "-c", f"import sys, {module}; print(sorted(sys.modules))"],
+            capture_output=True, text=True, check=True
+        ).stdout
+        assert "'crewai'" not in loaded, name
+        assert "'litellm'" not in loaded, name
+
+
+def test_running_the_flow_module_loads_it_once():
+    import subprocess
+    import sys
+
+    # Run as a script, main is __main__; importing it again would build a second flow class
+    run = subprocess.run(
+        [sys.executable, "-X", "importtime", "-m", "transportation_flow.main"],
+        input="2\nexit\n", capture_output=True, text=True, check=True
+    )
+    assert "Goodbye" in run.stdout
+    imported = [line.rsplit("|", 1)[-1].strip() for line in run.stderr.splitlines()]
+    assert "transportation_flow.main" not in imported
+
+
+def test_replay_keeps_sender_order_and_reports_completion(tmp_path):
+    import asyncio
+
+    from benchmarks.replay import load_log, replay, summarize, write_sample
+
+    log = tmp_path / "conversations.jsonl"
+    written = write_sample(str(log))
+    turns = load_log(str(log))
+    assert len(turns) == written
+    assert turns == sorted(turns, key=lambda turn: turn.timestamp)
+
+    seen = {}
+
+    async def handle(turn):
+        seen.setdefault(turn.sender_id, []).append(turn.message)
+        # Only the first sender's conversation reaches a summary
+        last = turn.sender_id.endswith("0") and len(seen[turn.sender_id]) == 4
+        return {"status": "complete" if last else "waiting_for_response", "final_result": last}
+
+    records = asyncio.run(replay(turns, handle, speed=None, senders=2))
+    for sender_turns in seen.values():
+        recorded = [turn.message for turn in turns if turn.message in sender_turns]
+        assert sender_turns == recorded
+
+    report = summarize(records, llm_calls=8, wall_seconds=1.0)
+    assert report["turns"] == written
+    assert report["conversations"] == 3
+    assert report["completed"] == 1
+    assert report["llm_calls_per_completed"] == 8
+    assert report["turns_per_completed"] == 4
+
+
+def test_state_codec_benchmark_reports_every_format():
+    from benchmarks.state_codec import CODECS, measure
+
+    results = measure(conversations=50, turns=3, repeat=1)
+    assert set(results) == set(CODECS)
+    assert results["codec"]["bytes"] < results["json"]["bytes"]
+    assert results["codec+zlib"]["bytes"] < results["json+zlib"]["bytes"]
+
+
+def test_replay_rejects_speeds_that_are_not_positive(capsys):
+    import pytest
+
+    from benchmarks.replay import main, parse_speed
+
+    assert parse_speed("max") is None
+    assert parse_speed("2.5") == 2.5
+    for speed in ("0", "-1", "fast"):
+        with pytest.raises(SystemExit):
+            main(["conversations.jsonl", "--speed", speed])
+        assert "--speed" in capsys.readouterr().err
+
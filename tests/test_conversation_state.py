@@ -0,0 +1,47 @@
+#!/usr/bin/env python
+"""Tests for the bounded conversation history"""
+from transportation_flow.schemas.conversation_state import ConversationState
+from transportation_flow.schemas.parked_state import ParkedConversation
+
+
+def test_history_keeps_recent_turns_and_folds_the_rest():
+    state = ConversationState()
+    for turn in range(10):
+        state.add_message("user", f"mensaje {turn}")
+        state.add_message("assistant", f"pregunta {turn}")
+
+    folded = state.compact_history(max_messages=4)
+
+    assert folded == 16
+    assert [m["content"] for m in state.messages] == [
+        "mensaje 8", "pregunta 8", "mensaje 9", "pregunta 9"
+    ]
+    # Only the customer's side is summarized
+    assert state.history_summary.startswith("mensaje 0 | mensaje 1")
+    assert "pregunta" not in state.history_summary
+
+
+def test_rolling_summary_is_capped():
+    state = ConversationState()
+    for turn in range(200):
+        state.add_message("user", f"la dirección es Calle {turn} # 10-20, Bogotá")
+        state.compact_history(max_messages=2, max_summary_chars=300)
+
+    assert len(state.messages) == 2
+    assert len(state.history_summary) == 300
+    assert "Calle 197" in state.history_summary
+    assert state.history_size() < 500
+
+
+def test_parked_conversation_round_trips():
+    state = ConversationState(sender_id="573001234567", conversation_id="c-1", attempts=2)
+    state.add_message("user", "Hola, soy Ana María, voy al aeropuerto")
+    state.update_from_partial({"nombre_solicitante": "Ana María", "cantidad_pasajeros": 2})
+    state.add_message("assistant", "¿Desde dónde la recogemos?")
+    state.current_question = "¿Desde dónde la recogemos?"
+    state.current_message = "Hola, soy Ana María, voy al aeropuerto"
+
+    restored = ParkedConversation.from_state(state).to_state()
+
+    assert restored.model_dump() == state.model_dump()
+    assert restored.messages[0]["timestamp"] == state.messages[0]["timestamp"]
@@ -0,0 +1,82 @@
+#!/usr/bin/env python
+"""Tests for the reusable crew pool"""
+import threading
+
+import pytest
+
+from transportation_flow.crews.ollama import CREWS_DIR
+from transportation_flow.crews.pool import CrewPool, load_yaml_once
+
+
+class FakeTask:
+    output = "previous run"
+
+
+class FakeCrew:
+    def __init__(self):
+        self.tasks = [FakeTask()]
+        self.agents = []
+
+
+def test_second_checkout_is_a_hit_and_reset():
+    pool = CrewPool()
+    pool.register("extraction", FakeCrew)
+
+    with pool.checkout("extraction") as first:
+        pass
+    with pool.checkout("extraction") as second:
+        assert second is first
+        assert second.tasks[0].output is None
+
+    stats = pool.stats()["extraction"]
+    assert stats["hits"] == 1
+    assert stats["misses"] == 1
+    assert stats["in_use"] == 0
+    assert stats["hit_rate"] == 0.5
+
+
+def test_concurrent_checkouts_get_distinct_crews():
+    pool = CrewPool(max_idle=2)
+    pool.register("summary", FakeCrew)
+    barrier = threading.Barrier(4)
+    seen = []
+
+    def worker():
+        with pool.checkout("summary") as crew:
+            seen.append(crew)
+            barrier.wait()
+
+    threads = [threading.Thread(target=worker) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert len({id(crew) for crew in seen}) == 4
+    stats = pool.stats()["summary"]
+    assert stats["idle"] == 2
+    assert stats["discarded"] == 2
+
+
+def test_warm_prebuilds_and_unknown_name_fails():
+    pool = CrewPool()
+    pool.register("conversation", FakeCrew)
+    pool.warm("conversation", 2)
+    with pool.checkout("conversation"):
+        pass
+    stats = pool.stats()["conversation"]
+    assert stats["idle"] == 2
+    # Warm builds count towards the average build time, without being misses
+    assert stats["misses"] == 0
+    assert stats["builds"] == 2
+    assert stats["avg_build_seconds"] == stats["build_seconds"] / 2
+
+    with pytest.raises(KeyError):
+        pool.acquire("missing")
+
+
+def test_no_crew_waits_for_console_input():
+    # Customer replies arrive as new turns; human_input would park a worker thread
+    for config_path in CREWS_DIR.glob("*/config/*.yaml"):
+        for name, config in load_yaml_once(config_path).items():
+            assert not config.get("human_input"), f"{config_path.parent.parent.name}: {name}"
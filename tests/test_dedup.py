@@ -0,0 +1,219 @@
+#!/usr/bin/env python
+"""Tests for duplicate suppression of webhook retries"""
+import asyncio
+import threading
+
+import pytest
+
+from transportation_flow.crews import scheduler as scheduler_module
+from transportation_flow.crews.scheduler import CrewScheduler
+from transportation_flow.metrics import DUPLICATE_MESSAGES
+from transportation_flow.schemas.conversation_state import ConversationState
+from transportation_flow.service.conversations import ConversationService
+from transportation_flow.service.dedup import (
+    BloomDuplicateFilter, InMemoryDuplicateFilter, RedisDuplicateFilter, message_key, message_keys
+)
+from transportation_flow.service.state_store import InMemoryStateStore
+
+
+class FakeRedis:
+    def __init__(self):
+        self.data = {}
+
+    def set(self, key, value, nx=False, ex=None):
+        if nx and key in self.data:
+            return None
+        self.data[key] = value
+        return True
+
+    def exists(self, key):
+        return int(key in self.data)
+
+    def delete(self, key):
+        self.data.pop(key, None)
+
+
+class CountingFlow:
+    turns = 0
+
+    def __init__(self, **state):
+        self.state = ConversationState.model_validate(state)
+
+    def kickoff(self, inputs):
+        self.state = ConversationState.model_validate(inputs)
+        return self.continue_conversation(self.state.current_message)
+
+    def continue_conversation(self, message, conversation_id=None):
+        CountingFlow.turns += 1
+        self.state.add_message("user", message)
+        return {"status": "waiting_for_response", "question": "¿Algo más?"}
+
+
+def test_message_keys():
+    assert message_key("573001", "Hola", "wamid.1") == message_key("573001", "hola!", "wamid.1")
+    assert message_key("573001", "Hola", "wamid.1") != message_key("573002", "Hola", "wamid.1")
+    # Without an id, the same text counts as a retry only within its time bucket
+    assert message_key("573001", "Hola", now=0) == message_key("573001", "¡hola!", now=29)
+    assert message_key("573001", "Hola", now=0) != message_key("573001", "Hola", now=31)
+
+
+def test_text_retry_across_a_bucket_boundary_is_a_duplicate():
+    for duplicates in (
+        InMemoryDuplicateFilter(),
+        RedisDuplicateFilter(FakeRedis()),
+        BloomDuplicateFilter(capacity=1000)
+    ):
+        assert not duplicates.check_and_mark_any(message_keys("573001", "somos 4", now=29))
+        assert duplicates.check_and_mark_any(message_keys("573001", "somos 4", now=31))
+        # Two buckets later the same text is a new message
+        assert not duplicates.check_and_mark_any(message_keys("573001", "somos 4", now=95))
+        assert not duplicates.check_and_mark_any(message_keys("573001", "somos 5", now=96))
+
+
+def test_filters_remember_and_forget_keys():
+    for duplicates in (
+        InMemoryDuplicateFilter(),
+        RedisDuplicateFilter(FakeRedis()),
+        BloomDuplicateFilter(capacity=1000)
+    ):
+        assert not duplicates.check_and_mark("id:573001:wamid.1")
+        assert duplicates.check_and_mark("id:573001:wamid.1")
+        assert not duplicates.check_and_mark("id:573001:wamid.2")
+        duplicates.forget("id:573001:wamid.1")
+        assert not duplicates.check_and_mark("id:573001:wamid.1")
+
+
+def test_in_memory_filter_expires_keys():
+    duplicates = InMemoryDuplicateFilter(ttl_seconds=0)
+    assert not duplicates.check_and_mark("a")
+    assert not duplicates.check_and_mark("a")
+
+
+def test_bloom_filter_false_positive_rate():
+    # Checking also records, so the filter ends up holding its full capacity
+    duplicates = BloomDuplicateFilter(capacity=10000, error_rate=0.01)
+    for i in range(5000):
+        duplicates.check_and_mark(f"seen-{i}")
+    false_positives = sum(duplicates.check_and_mark(f"new-{i}") for i in range(5000))
+    assert false_positives < 5000 * 0.03
+
+
+def test_retry_during_a_turn_runs_no_second_turn():
+    CountingFlow.turns = 0
+    release = threading.Event()
+
+    class SlowFlow(CountingFlow):
+        def continue_conversation(self, message, conversation_id=None):
+            release.wait(2)
+            return super().continue_conversation(message)
+
+    store = InMemoryStateStore()
+    service = ConversationService(
+        flow_factory=SlowFlow, store=store, duplicates=InMemoryDuplicateFilter()
+    )
+    duplicates_before = DUPLICATE_MESSAGES.value()
+
+    async def deliver_twice():
+        first = asyncio.create_task(service.handle_message("573001", "somos 4", "wamid.1"))
+        await asyncio.sleep(0.05)
+        retry = await service.handle_message("573001", "somos 4", "wamid.1")
+        release.set()
+        return await first, retry
+
+    first, retry = asyncio.run(deliver_twice())
+    service.shutdown()
+
+    assert first["status"] == "waiting_for_response"
+    assert retry == {"status": "duplicate"}
+    assert CountingFlow.turns == 1
+    assert len(store.load("573001").messages) == 1
+    assert DUPLICATE_MESSAGES.value() == duplicates_before + 1
+
+
+def test_refused_message_can_be_retried(monkeypatch):
+    CountingFlow.turns = 0
+    monkeypatch.setattr(scheduler_module, "_scheduler", CrewScheduler(capacity=1, max_queue=0))
+    service = ConversationService(
+        flow_factory=CountingFlow, store=InMemoryStateStore(), duplicates=InMemoryDuplicateFilter()
+    )
+    busy = asyncio.run(service.handle_message("573001", "Hola", "wamid.1"))
+    assert busy["status"] == "busy"
+
+    monkeypatch.setattr(scheduler_module, "_scheduler", CrewScheduler(capacity=1))
+    retry = asyncio.run(service.handle_message("573001", "Hola", "wamid.1"))
+    service.shutdown()
+    assert retry["status"] == "waiting_for_response"
+    assert CountingFlow.turns == 1
+
+
+def test_refused_burst_releases_every_message(monkeypatch):
+    CountingFlow.turns = 0
+    monkeypatch.setattr(scheduler_module, "_scheduler", CrewScheduler(capacity=1, max_queue=0))
+    service = ConversationService(
+        flow_factory=CountingFlow, store=InMemoryStateStore(), duplicates=InMemoryDuplicateFilter(),
+        coalesce_window=0.05
+    )
+
+    async def burst():
+        return await asyncio.gather(
+            service.handle_message("573001", "Hola", "wamid.1"),
+            service.handle_message("573001", "para mañana", "wamid.2"),
+        )
+
+    assert [r["status"] for r in asyncio.run(burst())] == ["coalesced", "busy"]
+
+    # The provider retries both messages; neither may be taken for a duplicate
+    monkeypatch.setattr(scheduler_module, "_scheduler", CrewScheduler(capacity=1))
+    retried = asyncio.run(burst())
+    service.shutdown()
+    assert [r["status"] for r in retried] == ["coalesced", "waiting_for_response"]
+    assert CountingFlow.turns == 1
+
+
+
+class FlakyStore(InMemoryStateStore):
+    """Fails the first load, like a Redis store during a connection blip"""
+
+    def __init__(self):
+        super().__init__()
+        self.failures = 1
+
+    def load(self, sender_id):
+        if self.failures:
+            self.failures -= 1
+            raise ConnectionError("store unreachable")
+        return super().load(sender_id)
+
+
+def test_message_whose_turn_failed_can_be_retried():
+    CountingFlow.turns = 0
+    service = ConversationService(
+        flow_factory=CountingFlow, store=FlakyStore(), duplicates=InMemoryDuplicateFilter()
+    )
+    with pytest.raises(ConnectionError):
+        asyncio.run(service.handle_message("573001", "Hola", "wamid.1"))
+
+    retry = asyncio.run(service.handle_message("573001", "Hola", "wamid.1"))
+    service.shutdown()
+    assert retry["status"] == "waiting_for_response"
+    assert CountingFlow.turns == 1
+
+
+def test_message_whose_turn_errored_can_be_retried():
+    CountingFlow.turns = 0
+
+    class BrokenFlow(CountingFlow):
+        def continue_conversation(self, message, conversation_id=None):
+            return "not a turn result"
+
+    duplicates = InMemoryDuplicateFilter()
+    broken = ConversationService(flow_factory=BrokenFlow, store=InMemoryStateStore(), duplicates=duplicates)
+    assert asyncio.run(broken.handle_message("573001", "Hola", "wamid.1"))["status"] == "error"
+    broken.shutdown()
+
+    # A redeployed worker sharing the filter takes the provider's retry
+    service = ConversationService(flow_factory=CountingFlow, store=InMemoryStateStore(), duplicates=duplicates)
+    retry = asyncio.run(service.handle_message("573001", "Hola", "wamid.1"))
+    service.shutdown()
+    assert retry["status"] == "waiting_for_response"
+    assert CountingFlow.turns == 1
@@ -0,0 +1,59 @@
+#!/usr/bin/env python
+"""Tests for the extraction result cache"""
+import time
+
+from transportation_flow.extraction.cache import ExtractionCache, normalize_message
+
+
+class FakeRedis:
+    def __init__(self):
+        self.data = {}
+
+    def get(self, key):
+        return self.data.get(key)
+
+    def set(self, key, value, ex=None):
+        self.data[key] = value
+
+
+def test_near_identical_messages_share_an_entry():
+    assert normalize_message("¡Hola, necesito un servicio  de transporte!") == \
+        "hola necesito un servicio de transporte"
+
+    cache = ExtractionCache()
+    cache.set("Sí, con maletas", "", {"equipaje_carga": True})
+    assert cache.get("si con maletas.", "") == {"equipaje_carga": True}
+    assert cache.get("si con maletas", "assistant: ¿Cuántos son?") is None
+
+    stats = cache.stats()
+    assert stats["hits"] == 1
+    assert stats["misses"] == 1
+    assert stats["hit_rate"] == 0.5
+
+
+def test_size_cap_evicts_least_recently_used():
+    cache = ExtractionCache(max_entries=2)
+    cache.set("uno", "", {"a": 1})
+    cache.set("dos", "", {"a": 2})
+    cache.get("uno", "")
+    cache.set("tres", "", {"a": 3})
+
+    assert cache.get("dos", "") is None
+    assert cache.get("uno", "") == {"a": 1}
+    assert cache.stats()["evictions"] == 1
+
+
+def test_entries_expire():
+    cache = ExtractionCache(ttl_seconds=0.01)
+    cache.set("al aeropuerto", "", {"direccion_terminacion": "Aeropuerto"})
+    time.sleep(0.02)
+    assert cache.get("al aeropuerto", "") is None
+
+
+def test_redis_backing_is_shared_between_workers():
+    redis = FakeRedis()
+    ExtractionCache(redis_client=redis).set("al aeropuerto", "", {"direccion_terminacion": "Aeropuerto"})
+
+    other_worker = ExtractionCache(redis_client=redis)
+    assert other_worker.get("Al aeropuerto", "") == {"direccion_terminacion": "Aeropuerto"}
+    assert other_worker.stats()["redis_hits"] == 1
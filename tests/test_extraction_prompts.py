@@ -0,0 +1,56 @@
+#!/usr/bin/env python
+"""Tests for the missing-fields-only extraction prompt"""
+from transportation_flow.crews.pool import CrewPool
+from transportation_flow.extraction.prompts import (
+    LEGACY_PROMPT_CHARS, build_field_prompt, estimated_tokens_saved
+)
+from transportation_flow.service.conversations import run_turn
+
+
+class RecordingCrew:
+    def __init__(self):
+        self.tasks = []
+        self.agents = []
+        self.inputs = []
+
+    def kickoff(self, inputs):
+        self.inputs.append(inputs)
+        return '{"direccion_inicio": "Calle 100 #15-20, Bogotá"}'
+
+
+def test_prompt_lists_only_unknown_fields():
+    field_lines, known_line = build_field_prompt({
+        "nombre_solicitante": "Juan Pérez",
+        "cc_nit": "1020304050",
+        "cantidad_pasajeros": 4,
+        "equipaje_carga": None,
+    })
+
+    assert "nombre_solicitante" not in field_lines
+    assert "- direccion_inicio (pickup address with city)" in field_lines
+    assert "equipaje_carga" in field_lines
+    assert known_line == '{"nombre_solicitante":"Juan Pérez","cc_nit":"1020304050","cantidad_pasajeros":4}'
+    assert len(field_lines) + len(known_line) < LEGACY_PROMPT_CHARS
+    # 570 legacy chars against 330 + 80 narrowed ones, at four chars per token
+    assert estimated_tokens_saved(field_lines, known_line) == 40
+    assert estimated_tokens_saved("", "none") == (LEGACY_PROMPT_CHARS - 4) // 4
+
+
+def test_flow_sends_the_narrowed_prompt(monkeypatch):
+    from transportation_flow import main
+
+    crew = RecordingCrew()
+    pool = CrewPool()
+    pool.register("extraction", lambda: crew)
+    monkeypatch.setattr(main, "get_crew_pool", lambda: pool)
+    main.get_extraction_cache().clear()
+
+    run_turn(
+        main.TransportationSystemFlow, None, "573001234567",
+        "Me recogen en la Calle 100 #15-20, Bogotá, somos 3"
+    )
+
+    inputs = crew.inputs[0]
+    # The rules already found the passenger count, so it is not asked again
+    assert "cantidad_pasajeros" not in inputs["fields_to_extract"]
+    assert inputs["known_info"] == '{"cantidad_pasajeros":3}'
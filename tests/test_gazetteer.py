@@ -0,0 +1,90 @@
+#!/usr/bin/env python
+"""Tests for the offline place gazetteer"""
+import time
+
+from transportation_flow.extraction.gazetteer import (
+    FUZZY_BUDGET, Gazetteer, Place, address_codes, get_gazetteer, max_typos
+)
+from transportation_flow.extraction.structured import ExtractedFields
+from transportation_flow.schemas.transportation_models import PLACE_CODE_FIELDS
+
+
+def test_airports_and_landmarks_resolve_to_their_codes():
+    assert address_codes("Aeropuerto El Dorado") == ("11001", "BOG")
+    assert address_codes("al aeropuerto José María Córdova") == ("05615", "MDE")
+    assert address_codes("Terminal del Salitre") == ("11001", "LMK-BOG-TERMINAL-SALITRE")
+
+
+def test_street_addresses_resolve_to_their_city():
+    assert address_codes("Calle 100 #15-20, Bogotá D.C.") == ("11001", None)
+    assert address_codes("cll 10 # 43-20, MEDELLIN") == ("05001", None)
+    assert address_codes("Carrera 43A, El Poblado, Medellín") == ("05001", "LMK-MDE-EL-POBLADO")
+
+
+def test_typos_are_absorbed_but_short_words_are_not_guessed():
+    assert address_codes("Calle 5 #45-20, Barranquila") == ("08001", None)
+    assert address_codes("aeropuerto jose maria cordoba") == ("05615", "MDE")
+    assert address_codes("conjunto bella vista") == (None, None)
+    assert address_codes("Calle 100 #15-20") == (None, None)
+    assert address_codes(None) == (None, None)
+
+
+def test_addresses_naming_no_place_are_dismissed_quickly():
+    gazetteer = get_gazetteer()
+    misses = [
+        "la casa de mi mama en el conjunto los pinos",
+        "Calle 127 # 15-20 conjunto residencial la arboleda de santa barbara",
+    ]
+    # Runs of connector words, or runs longer than any name from their first word, are not tried
+    assert gazetteer._fuzzy_candidates(misses[0]) == ["la casa", "el conjunto", "conjunto", "los pinos"]
+    assert "la arboleda de santa" not in gazetteer._fuzzy_candidates(misses[1])
+
+    # The fuzzy pass gives up once it has walked its budget of trie nodes
+    crowded = (
+        "aeropuertos josefina marina cordobesa, aeropuertos alfonsina bonilla, terminales santiagos, "
+        "estadios atanasios girardotes, plazuela santamarta, parquesito centrales, castillos sanfelipes, "
+        "muelles turisticos bocagrandes, villas leyvanas, ciudadela universitarias"
+    )
+    unbounded = sum(
+        gazetteer._walk(candidate, max_typos(candidate))[1]
+        for candidate in gazetteer._fuzzy_candidates(crowded)
+    )
+    walked = []
+    walk = gazetteer._walk
+    gazetteer._walk = lambda *args: walked.append(walk(*args)) or walked[-1]
+    try:
+        gazetteer._resolve(crowded)
+    finally:
+        del gazetteer._walk
+    assert unbounded > FUZZY_BUDGET >= sum(visited for _, visited in walked)
+
+    # About 0.3-0.5ms each on a development machine, down from 1.5-2.2ms
+    started = time.perf_counter()
+    for _ in range(20):
+        for address in misses:
+            assert gazetteer._resolve(address) is None
+    assert (time.perf_counter() - started) / 40 < 0.001
+
+
+def test_named_city_picks_between_same_named_places():
+    gazetteer = Gazetteer([
+        (Place("05001", "Medellín", "municipality", "05001", "Antioquia"), []),
+        (Place("11001", "Bogotá", "municipality", "11001", "Bogotá D.C."), []),
+        (Place("LMK-MDE-TERMINAL-SUR", "Terminal del Sur", "landmark", "05001", "Antioquia"), []),
+        (Place("LMK-BOG-TERMINAL-SUR", "Terminal del Sur", "landmark", "11001", "Bogotá D.C."), []),
+    ])
+    assert gazetteer.resolve("Terminal del Sur, Bogotá").place.code == "LMK-BOG-TERMINAL-SUR"
+    assert gazetteer.resolve("terminal del sur medellin").place.code == "LMK-MDE-TERMINAL-SUR"
+
+
+def test_bundled_data_loads_once_and_links_places_to_cities():
+    gazetteer = get_gazetteer()
+    assert gazetteer is get_gazetteer()
+    for code in ("BOG", "MDE", "CLO", "CTG", "LMK-BOG-TERMINAL-SALITRE"):
+        place = gazetteer.get(code)
+        assert gazetteer.city_of(place).kind == "municipality"
+    assert [place.code for place in gazetteer.lookup("ITAGUI")] == ["05360"]
+
+
+def test_model_is_never_asked_for_place_codes():
+    assert not set(PLACE_CODE_FIELDS) & set(ExtractedFields.model_fields)
@@ -0,0 +1,100 @@
+#!/usr/bin/env python
+"""Tests for flow and crew instrumentation"""
+from types import SimpleNamespace
+
+import pytest
+
+from transportation_flow.crews.pool import CrewPool
+from transportation_flow.metrics import (
+    EXTRACTION_PARSES, FLOW_STEP_SECONDS, LLM_CALL_ERRORS, LLM_TOKENS,
+    Counter, Histogram, instrumented_kickoff, render_metrics
+)
+from transportation_flow.service.conversations import run_turn
+
+
+class MeteredCrew:
+    """Crew whose token totals grow across runs, like a pooled crewAI crew"""
+
+    def __init__(self, output, prompt_tokens=100, completion_tokens=20):
+        self.output = output
+        self.tasks = []
+        self.agents = []
+        self.per_run = (prompt_tokens, completion_tokens)
+        self.totals = (0, 0)
+
+    def kickoff(self, inputs):
+        if isinstance(self.output, Exception):
+            raise self.output
+        self.totals = (self.totals[0] + self.per_run[0], self.totals[1] + self.per_run[1])
+        return self.output
+
+    def calculate_usage_metrics(self):
+        return SimpleNamespace(prompt_tokens=self.totals[0], completion_tokens=self.totals[1])
+
+
+def test_histogram_renders_cumulative_buckets():
+    histogram = Histogram("test_seconds", "Test", ("step",), buckets=(0.1, 1.0))
+    histogram.observe(0.05, step="a")
+    histogram.observe(0.5, step="a")
+    histogram.observe(5, step="a")
+
+    text = "\n".join(histogram.render())
+    assert 'test_seconds_bucket{step="a",le="0.1"} 1' in text
+    assert 'test_seconds_bucket{step="a",le="1"} 2' in text
+    assert 'test_seconds_bucket{step="a",le="+Inf"} 3' in text
+    assert 'test_seconds_count{step="a"} 3' in text
+
+    counter = Counter("test_total", "Test")
+    counter.inc()
+    counter.inc(2)
+    assert counter.render()[-1] == "test_total 3"
+
+
+def test_kickoff_records_per_run_token_deltas():
+    crew = MeteredCrew("ok", prompt_tokens=120, completion_tokens=30)
+    prompt_before = LLM_TOKENS.value(crew="metered", kind="prompt")
+
+    instrumented_kickoff("metered", crew, {})
+    instrumented_kickoff("metered", crew, {})
+
+    # Totals are cumulative on the crew, but each run is counted once
+    assert LLM_TOKENS.value(crew="metered", kind="prompt") - prompt_before == 240
+
+    errors_before = LLM_CALL_ERRORS.value(crew="metered")
+    with pytest.raises(RuntimeError):
+        instrumented_kickoff("metered", MeteredCrew(RuntimeError("down")), {})
+    assert LLM_CALL_ERRORS.value(crew="metered") == errors_before + 1
+
+
+def test_flow_turn_is_instrumented(monkeypatch):
+    from transportation_flow import main
+
+    pool = CrewPool()
+    pool.register("extraction", lambda: MeteredCrew("no es json"))
+    monkeypatch.setattr(main, "get_crew_pool", lambda: pool)
+
+    steps_before = FLOW_STEP_SECONDS.count(step="process_user_message")
+    failures_before = EXTRACTION_PARSES.value(outcome="failed")
+
+    result, _ = run_turn(
+        main.TransportationSystemFlow, None, "573001234567", "Necesito ir al aeropuerto El Dorado"
+    )
+
+    assert result["status"] == "error"
+    assert FLOW_STEP_SECONDS.count(step="process_user_message") == steps_before + 1
+    assert EXTRACTION_PARSES.value(outcome="failed") == failures_before + 1
+    assert LLM_TOKENS.value(crew="extraction", kind="prompt") >= 100
+
+    text = render_metrics()
+    assert "# TYPE transport_flow_step_seconds histogram" in text
+    assert "transport_extraction_cache_lookups_total" in text
+
+
+def test_scrape_does_not_build_the_crew_pool(monkeypatch):
+    from transportation_flow.crews import pool as pool_module
+
+    monkeypatch.setattr(pool_module, "_crew_pool", None)
+    text = render_metrics()
+    assert pool_module.existing_crew_pool() is None
+    assert "transport_crew_pool_checkouts_total" not in text
+
@@ -0,0 +1,83 @@
+#!/usr/bin/env python
+"""Tests for model warm-up and the readiness probe, against the stub Ollama server"""
+import httpx
+from fastapi.testclient import TestClient
+
+from benchmarks.stub_ollama import StubOllamaServer
+from transportation_flow.crews.ollama import (
+    READINESS, Readiness, build_llm, configured_models, get_http_client, warm_up_models
+)
+from transportation_flow.service.app import create_app
+from transportation_flow.service.conversations import ConversationService
+from transportation_flow.settings import get_settings
+
+
+def test_models_come_from_agents_yaml():
+    models = configured_models()
+    assert "qwen3:8b" in models
+    assert "phi3:3.8b" in models
+    assert len(models) == len(set(models))
+
+
+def test_warm_up_loads_each_model_once(monkeypatch):
+    readiness = Readiness()
+    with StubOllamaServer(latency=0.0) as stub:
+        monkeypatch.setenv("OLLAMA_API_BASE", stub.url)
+        get_settings.cache_clear()
+        with httpx.Client() as client:
+            assert warm_up_models(["qwen3:8b", "phi3:3.8b"], readiness, client)
+            # Loaded models are not requested again
+            assert warm_up_models(["qwen3:8b", "phi3:3.8b"], readiness, client)
+        assert stub.stats["requests"] == 2
+    get_settings.cache_clear()
+
+    assert readiness.report() == {"ready": True, "models": {"qwen3:8b": "ready", "phi3:3.8b": "ready"}}
+
+
+def test_unreachable_server_is_not_ready(monkeypatch):
+    monkeypatch.setenv("OLLAMA_API_BASE", "http://127.0.0.1:9")
+    get_settings.cache_clear()
+    readiness = Readiness()
+    with httpx.Client() as client:
+        assert not warm_up_models(["qwen3:8b"], readiness, client)
+    get_settings.cache_clear()
+
+    assert readiness.pending() == ["qwen3:8b"]
+    assert readiness.report()["models"] == {"qwen3:8b": "failed"}
+
+
+def test_ready_endpoint_follows_model_state(monkeypatch):
+    monkeypatch.setenv("TRANSPORT_OLLAMA_WARMUP", "false")
+    get_settings.cache_clear()
+    READINESS.reset()
+    try:
+        with TestClient(create_app(ConversationService(max_concurrent_turns=1))) as client:
+            READINESS.expect(["qwen3:8b"])
+            assert client.get("/ready").status_code == 503
+
+            READINESS.mark("qwen3:8b", "ready")
+            response = client.get("/ready")
+            assert response.status_code == 200
+            assert response.json() == {"ready": True, "models": {"qwen3:8b": "ready"}}
+    finally:
+        READINESS.reset()
+        get_settings.cache_clear()
+
+
+def test_crew_llm_calls_go_through_the_pooled_client(monkeypatch):
+    sent = []
+    hooks = get_http_client().event_hooks
+    hooks["request"].append(lambda request: sent.append(request.url.path))
+    try:
+        with StubOllamaServer(latency=0.0) as stub:
+            monkeypatch.setenv("OLLAMA_API_BASE", stub.url)
+            get_settings.cache_clear()
+            llm = build_llm("ollama/qwen3:8b")
+            assert llm.call([{"role": "user", "content": "Hola"}])
+            assert stub.stats["requests"] == 1
+    finally:
+        hooks["request"].pop()
+        get_settings.cache_clear()
+
+    assert sent == ["/api/generate"]
+
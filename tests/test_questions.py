@@ -0,0 +1,35 @@
+#!/usr/bin/env python
+"""Tests for the template question composer"""
+from itertools import combinations
+
+from transportation_flow.responses.questions import FIELD_NAMES, compose_question
+
+
+def test_every_combination_up_to_three_fields_gets_a_question():
+    for size in (1, 2, 3):
+        for fields in combinations(FIELD_NAMES, size):
+            question = compose_question(list(fields), {"cantidad_pasajeros": 2}, attempt=2)
+            assert question.count("¿") >= 1
+            assert "{" not in question
+
+
+def test_only_first_three_fields_are_asked():
+    question = compose_question(
+        ["nombre_solicitante", "celular_contacto", "cantidad_pasajeros", "direccion_inicio"],
+        conversation_id="abc"
+    )
+    assert "recog" not in question.lower()
+
+
+def test_wording_is_stable_per_conversation_but_varies_between_them():
+    fields = ["nombre_solicitante", "celular_contacto"]
+    assert compose_question(fields, conversation_id="c1") == compose_question(fields, conversation_id="c1")
+    variants = {compose_question(fields, conversation_id=f"c{i}") for i in range(30)}
+    assert len(variants) > 3
+
+
+def test_known_name_is_used_in_acknowledgement():
+    question = compose_question(
+        ["cc_nit"], {"nombre_solicitante": "Juan Pérez"}, attempt=2, conversation_id="c1"
+    )
+    assert "Juan" in question
@@ -0,0 +1,117 @@
+#!/usr/bin/env python
+"""Tests for the rule-based extraction fast path"""
+from datetime import date, datetime, timedelta
+
+from transportation_flow.extraction.rules import (
+    SERVICE_TIMEZONE, RuleBasedExtractor, local_today, normalize_date, normalize_schedule,
+    normalize_time
+)
+
+extractor = RuleBasedExtractor(today=date(2025, 7, 1))
+
+
+def test_bare_id_skips_llm():
+    result = extractor.extract("1020304050")
+    assert result.fields == {"cc_nit": "1020304050"}
+    assert not result.needs_llm
+
+
+def test_phone_and_id_with_cues():
+    result = extractor.extract("mi celular es 300 123 4567 y cc 1.020.304.050")
+    assert result.fields["celular_contacto"] == "3001234567"
+    assert result.fields["cc_nit"] == "1020304050"
+    assert not result.needs_llm
+
+
+def test_nit_keeps_check_digit():
+    result = extractor.extract("NIT 900.123.456-7")
+    assert result.fields["cc_nit"] == "900123456-7"
+
+
+def test_date_and_time_with_remaining_text_needs_llm():
+    result = extractor.extract("Quiero un servicio de transporte al aeropuerto mañana a las 3am.")
+    assert result.fields["fecha_inicio_servicio"] == "2025-07-02"
+    assert result.fields["hora_inicio_servicio"] == "03:00"
+    assert result.needs_llm
+
+
+def test_time_periods_and_day_month():
+    result = extractor.extract("el 15 de julio a las 3 de la tarde")
+    assert result.fields["fecha_inicio_servicio"] == "2025-07-15"
+    assert result.fields["hora_inicio_servicio"] == "15:00"
+
+
+def test_midnight_noon_and_fractions_of_an_hour():
+    assert normalize_time("12 de la noche") == "00:00"
+    assert normalize_time("12 de la madrugada") == "00:00"
+    assert normalize_time("12 del día") == "12:00"
+    assert normalize_time("7 y media de la mañana") == "07:30"
+    assert normalize_time("a las 3 y cuarto de la tarde") == "15:15"
+    assert normalize_time("1 menos cuarto de la tarde") == "12:45"
+    assert normalize_time("a las 15 y media") == "15:30"
+    result = extractor.extract("mañana a las 12 de la noche")
+    assert result.fields == {"fecha_inicio_servicio": "2025-07-02", "hora_inicio_servicio": "00:00"}
+    assert not result.needs_llm
+
+
+def test_ambiguous_hour_is_left_to_llm():
+    result = extractor.extract("el viernes a las 3")
+    assert "hora_inicio_servicio" not in result.fields
+    assert result.needs_llm
+
+
+def test_passengers_and_luggage():
+    result = extractor.extract("somos cuatro con maletas")
+    assert result.fields == {"cantidad_pasajeros": 4, "equipaje_carga": True}
+    assert extractor.extract("sin equipaje").fields == {"equipaje_carga": False}
+    assert extractor.extract("no llevamos maletas").fields == {"equipaje_carga": False}
+
+
+def test_greeting_has_nothing_for_llm():
+    result = extractor.extract("Hola, necesito un servicio de transporte")
+    assert result.fields == {}
+    assert not result.needs_llm
+
+
+def test_names_go_to_llm():
+    result = extractor.extract("Soy Juan Pérez")
+    assert result.fields == {}
+    assert result.needs_llm
+
+
+def test_relative_day_counts():
+    assert extractor.extract("dentro de dos dias").fields["fecha_inicio_servicio"] == "2025-07-03"
+    assert extractor.extract("en 10 dias").fields["fecha_inicio_servicio"] == "2025-07-11"
+
+
+def test_model_dates_and_times_are_normalized():
+    today = date(2025, 7, 1)  # a Tuesday
+    fields = normalize_schedule({
+        "fecha_inicio_servicio": "el próximo viernes",
+        "hora_inicio_servicio": "3 de la tarde",
+        "cantidad_pasajeros": 2
+    }, today=today)
+    assert fields == {
+        "fecha_inicio_servicio": "2025-07-04",
+        "hora_inicio_servicio": "15:00",
+        "cantidad_pasajeros": 2
+    }
+    assert normalize_date("pasado mañana", today) == "2025-07-03"
+    assert normalize_date("15 de julio", today) == "2025-07-15"
+    assert normalize_date("2025-07-15T00:00:00", today) == "2025-07-15"
+    assert normalize_time("a las 15h") == "15:00"
+    assert normalize_time("3am") == "03:00"
+    assert normalize_time("15:30:00") == "15:30"
+
+
+def test_unparseable_values_are_kept_for_the_conversation():
+    assert normalize_date("cuando confirme el vuelo") == "cuando confirme el vuelo"
+    # "a las 3" could be morning or afternoon
+    assert normalize_time("a las 3") == "a las 3"
+    assert normalize_time("a las 3 y media") == "a las 3 y media"
+    assert normalize_time(None) is None
+
+
+def test_today_follows_bogota_time():
+    assert SERVICE_TIMEZONE.utcoffset(datetime(2025, 7, 1)) == timedelta(hours=-5)
+    assert local_today() == datetime.now(SERVICE_TIMEZONE).date()
@@ -0,0 +1,184 @@
+#!/usr/bin/env python
+"""Tests for the priority scheduler in front of the crews"""
+import asyncio
+import threading
+import time
+
+import pytest
+
+from transportation_flow.crews import scheduler as scheduler_module
+from transportation_flow.crews.scheduler import CrewScheduler, SchedulerBusy
+from transportation_flow.metrics import LLM_QUEUE_REJECTIONS
+from transportation_flow.schemas.conversation_state import ConversationState
+from transportation_flow.service.conversations import ConversationService
+from transportation_flow.service.state_store import InMemoryStateStore
+
+
+def _wait_for_depth(scheduler, depth):
+    deadline = time.time() + 2
+    while scheduler.depth < depth and time.time() < deadline:
+        time.sleep(0.005)
+    assert scheduler.depth == depth
+
+
+def test_fewer_missing_fields_go_first():
+    scheduler = CrewScheduler(capacity=1, max_queue=8, timeout=5)
+    order = []
+
+    def call(priority):
+        with scheduler.slot(priority=priority):
+            order.append(priority)
+
+    scheduler.acquire()
+    threads = []
+    for priority in (5, 1, 3):
+        thread = threading.Thread(target=call, args=(priority,))
+        thread.start()
+        threads.append(thread)
+        _wait_for_depth(scheduler, len(threads))
+    scheduler.release()
+    for thread in threads:
+        thread.join()
+
+    assert order == [1, 3, 5]
+    assert scheduler.in_use == 0
+
+
+def test_full_queue_and_long_waits_are_refused():
+    scheduler = CrewScheduler(capacity=1, max_queue=1, timeout=0.05)
+    rejected_before = LLM_QUEUE_REJECTIONS.value(reason="timeout", crew="extraction")
+    scheduler.acquire()
+
+    # One caller may wait; it gives up after the timeout
+    waiter_errors = []
+
+    def wait_for_slot():
+        try:
+            scheduler.acquire(crew="extraction")
+        except SchedulerBusy as e:
+            waiter_errors.append(e)
+
+    waiter = threading.Thread(target=wait_for_slot)
+    waiter.start()
+    _wait_for_depth(scheduler, 1)
+    assert scheduler.saturated()
+    with pytest.raises(SchedulerBusy) as busy:
+        scheduler.acquire()
+    assert busy.value.reason == "queue_full"
+    assert busy.value.retry_after > 0
+
+    waiter.join()
+    assert waiter_errors[0].reason == "timeout"
+    assert LLM_QUEUE_REJECTIONS.value(reason="timeout", crew="extraction") == rejected_before + 1
+    assert scheduler.depth == 0
+    scheduler.release()
+
+
+def test_saturated_service_refuses_without_touching_state(monkeypatch):
+    saturated = CrewScheduler(capacity=1, max_queue=0)
+    monkeypatch.setattr(scheduler_module, "_scheduler", saturated)
+    store = InMemoryStateStore()
+
+    def flow_factory(**state):
+        raise AssertionError("the flow must not run while the LLM queue is full")
+
+    service = ConversationService(flow_factory=flow_factory, store=store)
+    result = asyncio.run(service.handle_message("573001234567", "Hola"))
+    service.shutdown()
+
+    assert result["status"] == "busy"
+    assert result["retry_after"] >= 1
+    assert store.load("573001234567") is None
+
+
+def test_overload_is_refused_with_the_default_limits(monkeypatch):
+    # 8 turn slots in front of 2 LLM slots and a queue of 32, as configured by default
+    scheduler = CrewScheduler()
+    monkeypatch.setattr(scheduler_module, "_scheduler", scheduler)
+    release = threading.Event()
+
+    class HoldingFlow:
+        def __init__(self, **state):
+            self.state = ConversationState.model_validate(state)
+
+        def kickoff(self, inputs):
+            self.state = ConversationState.model_validate(inputs)
+            with scheduler.slot():
+                release.wait(5)
+            return {"status": "waiting_for_response", "question": "¿Algo más?"}
+
+    service = ConversationService(flow_factory=HoldingFlow, store=InMemoryStateStore())
+    rejected_before = LLM_QUEUE_REJECTIONS.value(reason="queue_full", crew="turn")
+
+    async def flood():
+        turns = [
+            asyncio.create_task(service.handle_message(f"57300{i:04d}", "Hola"))
+            for i in range(60)
+        ]
+        await asyncio.sleep(0.2)
+        # Refusals come back at once, while the admitted turns are still queued
+        refused = [turn.result() for turn in turns if turn.done()]
+        assert service.queued + scheduler.depth <= scheduler.max_queue
+        release.set()
+        return refused, await asyncio.gather(*turns)
+
+    refused, results = asyncio.run(flood())
+    service.shutdown()
+
+    assert len(refused) >= 60 - 8 - 32
+    assert all(result["status"] == "busy" and result["retry_after"] >= 1 for result in refused)
+    served = [result for result in results if result["status"] == "waiting_for_response"]
+    assert len(served) + len(refused) == 60
+    assert LLM_QUEUE_REJECTIONS.value(reason="queue_full", crew="turn") == rejected_before + len(refused)
+    assert service.queued == 0
+
+
+
+def test_waiting_turns_are_admitted_closest_to_done_first():
+    release = threading.Event()
+    order = []
+
+    class OrderedFlow:
+        def __init__(self, **state):
+            self.state = ConversationState.model_validate(state)
+
+        def kickoff(self, inputs):
+            self.state = ConversationState.model_validate(inputs)
+            # The first turn holds the only turn slot until the rest are queued
+            release.wait(5)
+            return self.continue_conversation(self.state.current_message)
+
+        def continue_conversation(self, message, conversation_id=None):
+            order.append(self.state.sender_id)
+            return {"status": "waiting_for_response", "question": "¿Algo más?"}
+
+    fields = {
+        "nombre_solicitante": "Ana Gómez", "cc_nit": "1020304050", "celular_contacto": "3001234567",
+        "fecha_inicio_servicio": "2026-10-20", "hora_inicio_servicio": "08:00",
+        "direccion_inicio": "Calle 100 #15-20", "cantidad_pasajeros": 2,
+    }
+    store = InMemoryStateStore()
+    # Fields still missing: far 6, mid 3, near 1; a new conversation lacks all 7
+    for sender_id, known in (("far", 1), ("mid", 4), ("near", 6)):
+        state = ConversationState(sender_id=sender_id)
+        state.update_from_partial(dict(list(fields.items())[:known]))
+        store.save(state)
+    service = ConversationService(max_concurrent_turns=1, flow_factory=OrderedFlow, store=store)
+
+    async def saturate():
+        first = asyncio.create_task(service.take_turn("new-1", "Hola"))
+        await asyncio.sleep(0.05)
+        waiting = []
+        for sender_id in ("new-2", "far", "mid", "near"):
+            waiting.append(asyncio.create_task(service.take_turn(sender_id, "ok")))
+            await asyncio.sleep(0.02)
+        assert service.limiter.depth == 4
+        release.set()
+        await asyncio.gather(first, *waiting)
+
+    asyncio.run(saturate())
+    service.shutdown()
+
+    # Arrival order was new-2, far, mid, near
+    assert order == ["new-1", "near", "mid", "far", "new-2"]
+    assert service.limiter.in_use == 0
@@ -0,0 +1,135 @@
+#!/usr/bin/env python
+"""Tests for the async HTTP gateway, using a fake flow instead of the LLM crews"""
+import asyncio
+
+from fastapi.testclient import TestClient
+
+from transportation_flow.schemas.conversation_state import ConversationState
+from transportation_flow.service.app import create_app
+from transportation_flow.service.conversations import ConversationService, run_turn
+from transportation_flow.service.state_store import InMemoryStateStore
+
+
+class FakeFlow:
+    """Stands in for TransportationSystemFlow: asks twice, then completes"""
+
+    def __init__(self, **state):
+        self.state = ConversationState.model_validate(state)
+
+    def kickoff(self, inputs):
+        self.state = ConversationState.model_validate(inputs)
+        self.state.conversation_id = "conv-1"
+        return self.continue_conversation(self.state.current_message)
+
+    def continue_conversation(self, message, conversation_id=None):
+        self.state.add_message("user", message)
+        if len(self.state.messages) < 3:
+            return {"status": "waiting_for_response", "question": "¿Algo más?",
+                    "missing_fields": ["cc_nit"]}
+        return {"status": "complete", "summary": "Listo", "final_result": True}
+
+
+def test_post_message_keeps_state_between_turns():
+    store = InMemoryStateStore()
+    service = ConversationService(max_concurrent_turns=2, flow_factory=FakeFlow, store=store)
+    with TestClient(create_app(service)) as client:
+        first = client.post("/conversations/573001234567/messages", json={"message": "Hola"})
+        assert first.status_code == 200
+        assert first.json()["status"] == "waiting_for_response"
+        assert first.json()["reply"] == "¿Algo más?"
+        assert first.json()["conversation_id"] == "conv-1"
+
+        client.post("/conversations/573001234567/messages", json={"message": "somos 4"})
+        assert len(store.load("573001234567").messages) == 2
+        assert store.sender_for("conv-1") == "573001234567"
+        last = client.post("/conversations/573001234567/messages", json={"message": "ok"})
+        assert last.json()["status"] == "complete"
+        assert last.json()["reply"] == "Listo"
+        assert store.load("573001234567") is None
+
+        # A finished conversation starts over on the next message
+        again = client.post("/conversations/573001234567/messages", json={"message": "Hola"})
+        assert again.json()["status"] == "waiting_for_response"
+
+
+def test_concurrency_is_bounded():
+    peak = 0
+
+    class SlowFlow(FakeFlow):
+        def kickoff(self, inputs):
+            nonlocal peak
+            peak = max(peak, service.in_flight)
+            return super().kickoff(inputs)
+
+    service = ConversationService(max_concurrent_turns=3, flow_factory=SlowFlow)
+
+    async def burst():
+        return await asyncio.gather(*[
+            service.handle_message(f"sender-{i}", "Hola") for i in range(20)
+        ])
+
+    results = asyncio.run(burst())
+    service.shutdown()
+    assert len(results) == 20
+    assert peak <= 3
+
+
+def test_quick_bursts_run_as_one_turn():
+    turns = []
+
+    class RecordingFlow(FakeFlow):
+        def kickoff(self, inputs):
+            turns.append(inputs["current_message"])
+            return super().kickoff(inputs)
+
+    service = ConversationService(flow_factory=RecordingFlow, coalesce_window=0.05)
+
+    async def burst():
+        async def send(delay, sender_id, message):
+            await asyncio.sleep(delay)
+            return await service.handle_message(sender_id, message)
+
+        return await asyncio.gather(
+            send(0.0, "573001234567", "Hola"),
+            send(0.01, "573001234567", "necesito transporte"),
+            send(0.02, "573001234567", "para mañana"),
+            send(0.0, "573009999999", "somos 4"),
+        )
+
+    results = asyncio.run(burst())
+    service.shutdown()
+
+    assert [result["status"] for result in results] == [
+        "coalesced", "coalesced", "waiting_for_response", "waiting_for_response"
+    ]
+    assert sorted(turns) == ["Hola\nnecesito transporte\npara mañana", "somos 4"]
+    assert service.coalescer.pending("573001234567") == 0
+
+
+def test_question_turn_ends_without_waiting_for_input(monkeypatch):
+    from transportation_flow.main import TransportationSystemFlow
+    from transportation_flow.settings import get_settings
+
+    def no_console(*args):
+        raise AssertionError("a turn must not read from the console")
+
+    monkeypatch.setattr("builtins.input", no_console)
+    monkeypatch.setenv("TRANSPORT_QUESTION_MODE", "llm")
+    monkeypatch.setattr(
+        TransportationSystemFlow, "_run_crew",
+        lambda self, crew_name, inputs: "¿Me regala su nombre?"
+    )
+    get_settings.cache_clear()
+    try:
+        result, state = run_turn(TransportationSystemFlow, None, "573001234567", "1020304050")
+        assert result["status"] == "waiting_for_response"
+        assert state.status == "waiting_for_response"
+        assert state.current_question == "¿Me regala su nombre?"
+
+        # The reply is a new event resumed from the saved state
+        result, state = run_turn(TransportationSystemFlow, state, "573001234567", "3001234567")
+        assert result["status"] == "waiting_for_response"
+        assert state.partial_request.cc_nit == "1020304050"
+        assert state.partial_request.celular_contacto == "3001234567"
+    finally:
+        get_settings.cache_clear()
@@ -0,0 +1,467 @@
+#!/usr/bin/env python
+"""Tests for sharded stream workers, against an in-process fake of Redis"""
+import asyncio
+import json
+import threading
+import time
+
+import pytest
+
+from transportation_flow.schemas.conversation_state import ConversationState
+from transportation_flow.service.conversations import ConversationService
+from transportation_flow.service.dedup import RedisDuplicateFilter
+from transportation_flow.service.sharding import (
+    GROUP, HashRing, ShardPublisher, ShardWorker, shard_for, stream_key
+)
+from transportation_flow.service.state_store import InMemoryStateStore
+
+SHARDS = 8
+
+
+class FakeRedis:
+    """The string, sorted-set and stream commands the workers use"""
+
+    def __init__(self):
+        self.lock = threading.RLock()
+        self.values = {}
+        self.zsets = {}
+        self.streams = {}
+        self.groups = {}
+        self.sequence = 0
+        self.round_trips = 0
+
+    def _live(self, key):
+        entry = self.values.get(key)
+        if entry is not None and entry[1] is not None and entry[1] <= time.monotonic():
+            del self.values[key]
+            return None
+        return entry
+
+    def set(self, key, value, nx=False, px=None, ex=None):
+        with self.lock:
+            if nx and self._live(key) is not None:
+                return None
+            ttl = px / 1000 if px else ex
+            self.values[key] = (value, time.monotonic() + ttl if ttl else None)
+            return True
+
+    def get(self, key):
+        with self.lock:
+            self.round_trips += 1
+            entry = self._live(key)
+            return entry[0].encode() if entry else None
+
+    def delete(self, key):
+        with self.lock:
+            self.round_trips += 1
+            self.values.pop(key, None)
+
+    def register_script(self, script):
+        # The two lease scripts: compare the owner, then extend or drop the key, atomically
+        def run(keys, args):
+            with self.lock:
+                self.round_trips += 1
+                entry = self._live(keys[0])
+                if entry is None or entry[0] != args[0]:
+                    return 0
+                if "PEXPIRE" in script:
+                    self.values[keys[0]] = (entry[0], time.monotonic() + args[1] / 1000)
+                else:
+                    del self.values[keys[0]]
+                return 1
+        return run
+
+    def zadd(self, key, mapping):
+        with self.lock:
+            self.zsets.setdefault(key, {}).update(mapping)
+
+    def zremrangebyscore(self, key, low, high):
+        with self.lock:
+            members = self.zsets.get(key, {})
+            for member in [m for m, score in members.items() if score <= high]:
+                del members[member]
+
+    def zrange(self, key, start, end):
+        with self.lock:
+            return [member.encode() for member in sorted(self.zsets.get(key, {}))]
+
+    def zrem(self, key, member):
+        with self.lock:
+            self.zsets.get(key, {}).pop(member, None)
+
+    def xadd(self, key, fields, maxlen=None, approximate=True):
+        with self.lock:
+            self.sequence += 1
+            entry_id = f"{self.sequence}-0"
+            encoded = {name.encode(): str(value).encode() for name, value in fields.items()}
+            self.streams.setdefault(key, []).append((entry_id, encoded))
+            return entry_id.encode()
+
+    def xgroup_create(self, key, group, id="$", mkstream=False):
+        with self.lock:
+            if (key, group) in self.groups:
+                raise Exception("BUSYGROUP Consumer Group name already exists")
+            entries = self.streams.setdefault(key, [])
+            last = 0 if id == "0" else len(entries)
+            self.groups[key, group] = {"delivered": last, "pending": {}}
+
+    def xreadgroup(self, group, consumer, streams, count=None, block=None):
+        with self.lock:
+            reply = []
+            for key in streams:
+                state = self.groups[key, group]
+                entries = self.streams[key][state["delivered"]:][:count]
+                state["delivered"] += len(entries)
+                for entry_id, _ in entries:
+                    state["pending"][entry_id] = consumer
+                if entries:
+                    reply.append((key.encode(), entries))
+        if not reply and block:
+            time.sleep(0.005)
+        return reply
+
+    def xautoclaim(self, key, group, consumer, min_idle_time, start_id="0-0", count=100):
+        with self.lock:
+            pending = self.groups[key, group]["pending"]
+            entries = dict(self.streams[key])
+            sequence = lambda entry_id: int(entry_id.split("-")[0])
+            ids = sorted((i for i in pending if sequence(i) >= sequence(start_id)), key=sequence)
+            page, rest = ids[:count], ids[count:]
+            claimed, deleted = [], []
+            for entry_id in page:
+                if entry_id in entries:
+                    pending[entry_id] = consumer
+                    claimed.append((entry_id, entries[entry_id]))
+                else:
+                    # Trimmed from the stream while pending
+                    del pending[entry_id]
+                    deleted.append(entry_id.encode())
+            return [(rest[0] if rest else "0-0").encode(), claimed, deleted]
+
+    def xack(self, key, group, *ids):
+        with self.lock:
+            pending = self.groups[key, group]["pending"]
+            return sum(pending.pop(entry_id, None) is not None for entry_id in ids)
+
+    def outbound(self):
+        return [
+            {name.decode(): value.decode() for name, value in fields.items()}
+            for _, fields in self.streams.get("transport:outbound", [])
+        ]
+
+
+class RecordingFlow:
+    """Records the messages each sender's turns saw, in the order they ran"""
+
+    seen = []
+
+    def __init__(self, **state):
+        self.state = ConversationState.model_validate(state)
+
+    def kickoff(self, inputs):
+        self.state = ConversationState.model_validate(inputs)
+        return self.continue_conversation(self.state.current_message)
+
+    def continue_conversation(self, message, conversation_id=None):
+        time.sleep(0.002)
+        RecordingFlow.seen.append((self.state.sender_id, message))
+        self.state.add_message("user", message)
+        return {"status": "waiting_for_response", "question": "¿Algo más?"}
+
+
+def _worker(client, worker_id, store=None, duplicates=None, coalesce_window=0.0, **kwargs):
+    service = ConversationService(
+        max_concurrent_turns=4,
+        flow_factory=RecordingFlow,
+        store=store or InMemoryStateStore(),
+        duplicates=duplicates,
+        coalesce_window=coalesce_window
+    )
+    kwargs.setdefault("heartbeat_seconds", 0.02)
+    return ShardWorker(client, service, worker_id=worker_id, shards=SHARDS, block_ms=10, **kwargs)
+
+
+def test_senders_always_map_to_the_same_shard():
+    assert shard_for("573001234567", SHARDS) == shard_for("573001234567", SHARDS)
+    assert {shard_for(f"57300{i}", SHARDS) for i in range(200)} == set(range(SHARDS))
+
+
+def test_ring_moves_few_keys_when_a_worker_joins():
+    keys = [f"shard:{i}" for i in range(1000)]
+    ring = HashRing(["a", "b", "c"])
+    before = {key: ring.node_for(key) for key in keys}
+    ring.add("d")
+    moved = [key for key in keys if ring.node_for(key) != before[key]]
+    # Only keys taken over by the new worker move, about a quarter of them
+    assert all(ring.node_for(key) == "d" for key in moved)
+    assert 0.1 < len(moved) / len(keys) < 0.4
+    ring.remove("d")
+    assert {key: ring.node_for(key) for key in keys} == before
+
+
+def test_shards_are_handed_over_when_workers_join_and_leave():
+    client = FakeRedis()
+    first = _worker(client, "worker-a")
+    second = _worker(client, "worker-b")
+
+    async def scenario():
+        await first.rebalance()
+        assert first.owned == set(range(SHARDS))
+
+        # The newcomer waits until the current owner has released the shards it gives up
+        await second.rebalance()
+        assert second.owned == set()
+        await first.rebalance()
+        await asyncio.sleep(0.01)
+        await second.rebalance()
+        assert first.owned and second.owned
+        assert first.owned | second.owned == set(range(SHARDS))
+        assert not first.owned & second.owned
+
+        await first.close()
+        await second.rebalance()
+        assert second.owned == set(range(SHARDS))
+        await second.close()
+
+    asyncio.run(scenario())
+
+
+def test_each_sender_is_served_in_order_across_workers():
+    RecordingFlow.seen = []
+    client = FakeRedis()
+    publisher = ShardPublisher(client, shards=SHARDS)
+    senders = [f"57300{i}" for i in range(12)]
+    for turn in range(5):
+        for sender_id in senders:
+            publisher.publish(sender_id, f"mensaje {turn}", message_id=f"{sender_id}-{turn}")
+
+    store = InMemoryStateStore()
+    workers = [_worker(client, f"worker-{name}", store) for name in "abc"]
+
+    async def serve():
+        stop = asyncio.Event()
+        running = [asyncio.create_task(worker.run(stop)) for worker in workers]
+        for _ in range(500):
+            if len(client.outbound()) == len(senders) * 5:
+                break
+            await asyncio.sleep(0.01)
+        stop.set()
+        await asyncio.gather(*running)
+
+    asyncio.run(serve())
+
+    for sender_id in senders:
+        # Entries that queued up behind a running turn are merged into the next one
+        turns = [message for sender, message in RecordingFlow.seen if sender == sender_id]
+        messages = [line for turn in turns for line in turn.split("\n")]
+        assert messages == [f"mensaje {turn}" for turn in range(5)]
+        assert len(store.load(sender_id).messages) == len(turns)
+    results = client.outbound()
+    assert len(results) == len(senders) * 5
+    replies = [json.loads(result["result"]) for result in results if result["status"] != "coalesced"]
+    assert all(reply["question"] == "¿Algo más?" for reply in replies)
+    assert all(not group["pending"] for group in client.groups.values())
+    assert client.zsets["transport:workers"] == {}
+
+
+def test_unacknowledged_entries_are_claimed_by_the_next_owner():
+    RecordingFlow.seen = []
+    client = FakeRedis()
+    publisher = ShardPublisher(client, shards=SHARDS)
+    publisher.publish("573001", "Hola")
+    publisher.publish("573001", "somos 4")
+    shard = shard_for("573001", SHARDS)
+    crashed = _worker(client, "worker-a", lease_seconds=0.05)
+
+    async def scenario():
+        await crashed.rebalance()
+        # Reads the entries, then dies without running or acknowledging them
+        client.xreadgroup(GROUP, "worker-a", {stream_key("transport", shard): ">"})
+        await asyncio.sleep(0.1)
+
+        survivor = _worker(client, "worker-b")
+        await survivor.rebalance()
+        assert shard in survivor.owned
+        while survivor.in_flight():
+            await asyncio.sleep(0.01)
+        await survivor.close()
+
+    asyncio.run(scenario())
+    assert RecordingFlow.seen == [("573001", "Hola\nsomos 4")]
+    assert not client.groups[stream_key("transport", shard), GROUP]["pending"]
+
+
+def test_reclaim_pages_past_entries_trimmed_from_the_stream():
+    client = FakeRedis()
+    publisher = ShardPublisher(client, shards=SHARDS)
+    for turn in range(150):
+        publisher.publish("573001", f"mensaje {turn}")
+    shard = shard_for("573001", SHARDS)
+    key = stream_key("transport", shard)
+    crashed = _worker(client, "worker-a")
+    crashed._ensure_group(shard)
+    client.xreadgroup(GROUP, "worker-a", {key: ">"})
+    # The oldest 100 were trimmed (MAXLEN) while still pending, so the first page claims none
+    del client.streams[key][:100]
+
+    reclaimed = _worker(client, "worker-b")._reclaim(shard)
+    assert [fields[b"message"] for _, fields in reclaimed] == [
+        f"mensaje {turn}".encode() for turn in range(100, 150)
+    ]
+
+
+def test_leases_are_only_renewed_or_released_by_their_owner():
+    client = FakeRedis()
+    worker = _worker(client, "worker-a", lease_seconds=0.05)
+    lease = "transport:shard:3:owner"
+    assert worker._acquire(3)
+
+    # Checking the owner and acting on the lease is one atomic round trip, so the
+    # lease cannot expire and change hands between the check and the act
+    client.round_trips = 0
+    assert worker._renew(3)
+    assert client.round_trips == 1
+
+    # It expired during a stall and worker-b took it
+    client.set(lease, "worker-b", px=60_000)
+    assert not worker._renew(3)
+    client.round_trips = 0
+    worker._release(3)
+    assert client.round_trips == 1
+    assert client.get(lease) == b"worker-b"
+    assert client.values[lease][1] > time.monotonic() + 30
+
+
+def test_retries_are_dropped_before_queueing_and_reclaimed_entries_still_run():
+    RecordingFlow.seen = []
+    client = FakeRedis()
+    duplicates = RedisDuplicateFilter(client)
+    publisher = ShardPublisher(client, shards=SHARDS, duplicates=duplicates)
+    assert publisher.publish("573001", "Hola", message_id="wamid.1") is not None
+    # The provider's retry of the same webhook
+    assert publisher.publish("573001", "Hola", message_id="wamid.1") is None
+    shard = shard_for("573001", SHARDS)
+    assert len(client.streams[stream_key("transport", shard)]) == 1
+    crashed = _worker(client, "worker-a", lease_seconds=0.05)
+
+    async def scenario():
+        await crashed.rebalance()
+        client.xreadgroup(GROUP, "worker-a", {stream_key("transport", shard): ">"})
+        await asyncio.sleep(0.1)
+
+        # The survivor's service shares the key store that recorded the message
+        survivor = _worker(client, "worker-b", duplicates=duplicates)
+        await survivor.rebalance()
+        while survivor.in_flight():
+            await asyncio.sleep(0.01)
+        await survivor.close()
+
+    asyncio.run(scenario())
+    assert RecordingFlow.seen == [("573001", "Hola")]
+    assert client.outbound()[0]["status"] == "waiting_for_response"
+
+
+def test_queued_entries_of_a_sender_run_as_one_turn_without_waiting():
+    RecordingFlow.seen = []
+    client = FakeRedis()
+    publisher = ShardPublisher(client, shards=SHARDS)
+    for message in ("Hola", "necesito transporte", "para mañana"):
+        publisher.publish("573001", message)
+    # The service's own coalescer would hold each burst for the window
+    worker = _worker(client, "worker-a", coalesce_window=0.5)
+
+    async def serve():
+        stop = asyncio.Event()
+        running = asyncio.create_task(worker.run(stop))
+        started = time.monotonic()
+        while len(client.outbound()) < 3 and time.monotonic() - started < 5:
+            await asyncio.sleep(0.005)
+        elapsed = time.monotonic() - started
+        stop.set()
+        await running
+        return elapsed
+
+    assert asyncio.run(serve()) < 0.5
+    assert RecordingFlow.seen == [("573001", "Hola\nnecesito transporte\npara mañana")]
+    results = client.outbound()
+    assert [result["status"] for result in results] == ["coalesced", "coalesced", "waiting_for_response"]
+    assert json.loads(results[-1]["result"])["question"] == "¿Algo más?"
+    assert all(not group["pending"] for group in client.groups.values())
+
+
+class BlockingFlow(RecordingFlow):
+    """Holds each turn until the test releases it"""
+
+    release = threading.Event()
+
+    def kickoff(self, inputs):
+        BlockingFlow.release.wait(5)
+        return super().kickoff(inputs)
+
+
+def _blocking_worker(client, store, **kwargs):
+    BlockingFlow.release = threading.Event()
+    service = ConversationService(max_concurrent_turns=1, flow_factory=BlockingFlow, store=store)
+    return ShardWorker(
+        client, service, worker_id="worker-a", shards=SHARDS, block_ms=10, max_in_flight=1, **kwargs
+    )
+
+
+def _serve_until(worker, client, during):
+    async def serve():
+        stop = asyncio.Event()
+        running = asyncio.create_task(worker.run(stop))
+        while not worker.in_flight():
+            await asyncio.sleep(0.005)
+        await during()
+        BlockingFlow.release.set()
+        for _ in range(200):
+            if client.outbound() or not worker.in_flight():
+                break
+            await asyncio.sleep(0.01)
+        stop.set()
+        await running
+
+    asyncio.run(serve())
+
+
+def test_leases_outlive_turns_longer_than_the_lease():
+    RecordingFlow.seen = []
+    client = FakeRedis()
+    store = InMemoryStateStore()
+    ShardPublisher(client, shards=SHARDS).publish("573001", "Hola")
+    shard = shard_for("573001", SHARDS)
+    # The only turn slot is taken, so the worker is waiting on it rather than polling
+    worker = _blocking_worker(client, store, lease_seconds=0.1, heartbeat_seconds=0.03)
+
+    async def during():
+        await asyncio.sleep(0.3)
+        assert worker._holds(shard)
+
+    _serve_until(worker, client, during)
+    assert RecordingFlow.seen == [("573001", "Hola")]
+    assert store.load("573001") is not None
+    assert client.outbound()[0]["status"] == "waiting_for_response"
+
+
+def test_turn_finishing_after_its_lease_was_taken_is_left_for_the_new_owner():
+    RecordingFlow.seen = []
+    client = FakeRedis()
+    store = InMemoryStateStore()
+    ShardPublisher(client, shards=SHARDS).publish("573001", "Hola")
+    shard = shard_for("573001", SHARDS)
+    worker = _blocking_worker(client, store, heartbeat_seconds=0.02)
+
+    async def during():
+        # The worker stalled past its lease and another one took the shard
+        client.set(f"transport:shard:{shard}:owner", "worker-b", px=60_000)
+
+    _serve_until(worker, client, during)
+    assert store.load("573001") is None
+    assert client.outbound() == []
+    assert client.groups[stream_key("transport", shard), GROUP]["pending"]
+
+
+def test_heartbeat_must_be_shorter_than_the_lease():
+    with pytest.raises(ValueError):
+        _worker(FakeRedis(), "worker-a", lease_seconds=5, heartbeat_seconds=5)
@@ -0,0 +1,99 @@
+#!/usr/bin/env python
+"""Tests for the binary state snapshot codec"""
+import struct
+from datetime import datetime
+
+import pytest
+
+from transportation_flow.schemas.conversation_state import ConversationState
+from transportation_flow.schemas.state_codec import (
+    CODEC_VERSION, FLAG_ZLIB, MAGIC, StateCodecError, decode_state, encode_state, is_snapshot
+)
+
+# Written by version 1 of the codec, which kept whole-second timestamps and no current_message
+V1_SNAPSHOT = bytes.fromhex(
+    "54465301000c00000035373330303132333435363706000000636f6e762d371400000077616974696e675f"
+    "666f725f726573706f6e7365000000000100000001000000030000001200000063616e74696461645f7061"
+    "73616a65726f7302030000000000000018000000636f6469676f5f6c756761725f7465726d696e6163696f"
+    "6e0303000000424f470b0000007261775f6d657373616765030000000002000000000102000000a7aa6368"
+    "00000000a8aa63680000000002000000150000002700000027000000536f6d6f73203320616c206165726f"
+    "70756572746fc2bf50617261207175c3a92066656368613f"
+)
+
+
+def _state(turns=2):
+    state = ConversationState(sender_id="573001234567", conversation_id="conv-7")
+    for turn in range(turns):
+        state.add_message("user", f"Soy José Núñez, vamos {turn + 2} al aeropuerto 🚐")
+        state.add_message("assistant", f"¿Para qué fecha lo necesita? #{turn}")
+        state.current_question = f"¿Para qué fecha lo necesita? #{turn}"
+    state.update_from_partial({
+        "nombre_solicitante": "José Núñez",
+        "cantidad_pasajeros": 3,
+        "equipaje_carga": False,
+        "codigo_lugar_terminacion": "BOG",
+    })
+    state.history_summary = "Hola | necesito transporte"
+    state.status = "waiting_for_response"
+    state.attempts = 2
+    return state
+
+
+def test_round_trip_is_exact():
+    state = _state()
+    state.current_message = "Soy José Núñez, vamos 3 al aeropuerto 🚐"
+    snapshot = encode_state(state)
+    assert is_snapshot(snapshot)
+
+    restored = decode_state(snapshot)
+    assert restored.model_dump() == state.model_dump()
+    assert restored.partial_request.equipaje_carga is False
+    assert restored.current_question == "¿Para qué fecha lo necesita? #1"
+    assert len(snapshot) < len(state.model_dump_json().encode("utf-8"))
+
+    # Text that repeats no message, and a missing timestamp, survive too
+    state.current_question = "¿Confirma?"
+    state.current_message = None
+    del state.messages[0]["timestamp"]
+    assert decode_state(encode_state(state)).model_dump() == state.model_dump()
+
+
+def test_large_snapshots_are_compressed():
+    state = _state(turns=20)
+    compressed = encode_state(state, compress_over=0)
+    plain = encode_state(state, compress_over=None)
+    assert compressed[len(MAGIC) + 1] & FLAG_ZLIB
+    assert not plain[len(MAGIC) + 1] & FLAG_ZLIB
+    assert len(compressed) < len(plain)
+    assert decode_state(compressed).model_dump() == decode_state(plain).model_dump()
+
+
+def test_request_fields_are_stored_by_name():
+    snapshot = encode_state(_state(), compress_over=None)
+    # A field this version does not know about is skipped, the rest survive
+    renamed = snapshot.replace(b"nombre_solicitante", b"nombre_solicitantX")
+    request = decode_state(renamed).partial_request
+    assert request.nombre_solicitante is None
+    assert request.cantidad_pasajeros == 3
+    assert request.codigo_lugar_terminacion == "BOG"
+
+
+def test_version_1_snapshots_are_still_read():
+    restored = decode_state(V1_SNAPSHOT)
+    assert restored.sender_id == "573001234567"
+    assert restored.partial_request.cantidad_pasajeros == 3
+    assert restored.current_question == "¿Para qué fecha?"
+    assert restored.missing_fields == restored.partial_request.get_missing_fields()
+    assert [m["content"] for m in restored.messages] == ["Somos 3 al aeropuerto", "¿Para qué fecha?"]
+    assert restored.messages[0]["timestamp"] == datetime.fromtimestamp(0x6863aaa7).isoformat()
+
+
+def test_unreadable_snapshots_are_rejected():
+    snapshot = encode_state(_state())
+    newer = struct.pack("<3sBB", MAGIC, CODEC_VERSION + 1, 0) + snapshot[5:]
+    with pytest.raises(StateCodecError):
+        decode_state(newer)
+    with pytest.raises(StateCodecError):
+        decode_state(snapshot[:20])
+    with pytest.raises(StateCodecError):
+        decode_state(b'{"sender_id": "573001234567"}')
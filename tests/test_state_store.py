@@ -0,0 +1,198 @@
+#!/usr/bin/env python
+"""Tests for conversation state persistence and resuming the flow from it"""
+import time
+
+from transportation_flow.crews.pool import CrewPool
+from transportation_flow.extraction.cache import get_extraction_cache
+from transportation_flow.schemas.conversation_state import ConversationState
+from transportation_flow.service.conversations import run_turn
+from transportation_flow.service.state_store import InMemoryStateStore, RedisStateStore
+from transportation_flow.settings import Settings
+
+
+class FakePipeline:
+    def __init__(self, client):
+        self.client = client
+        self.commands = []
+
+    def __getattr__(self, name):
+        def queue(*args, **kwargs):
+            self.commands.append((name, args, kwargs))
+        return queue
+
+    def execute(self):
+        self.client.round_trips += 1
+        return [getattr(self.client, name)(*args, **kwargs) for name, args, kwargs in self.commands]
+
+
+class FakeRedis:
+    def __init__(self):
+        self.data = {}
+        self.round_trips = 0
+
+    def pipeline(self, transaction=True):
+        return FakePipeline(self)
+
+    def set(self, key, value, ex=None):
+        self.data[key] = value.encode() if isinstance(value, str) else value
+
+    def get(self, key):
+        return self.data.get(key)
+
+    def expire(self, key, seconds):
+        return key in self.data
+
+    def delete(self, key):
+        self.data.pop(key, None)
+
+
+def _state():
+    state = ConversationState(sender_id="573001234567", conversation_id="conv-9")
+    state.add_message("user", "Hola")
+    state.update_from_partial({"cantidad_pasajeros": 3})
+    return state
+
+
+def test_redis_store_uses_one_round_trip_each_way():
+    client = FakeRedis()
+    store = RedisStateStore(client, ttl_seconds=60)
+
+    store.save(_state())
+    assert client.round_trips == 1
+
+    loaded = store.load("573001234567")
+    assert client.round_trips == 2
+    assert loaded.partial_request.cantidad_pasajeros == 3
+    assert loaded.messages[0]["content"] == "Hola"
+    assert store.sender_for("conv-9") == "573001234567"
+
+
+def test_redis_store_reads_json_saved_by_earlier_versions():
+    client = FakeRedis()
+    store = RedisStateStore(client, ttl_seconds=60)
+    client.set("transport:state:573001234567", _state().model_dump_json())
+
+    loaded = store.load("573001234567")
+    assert loaded.partial_request.cantidad_pasajeros == 3
+
+    store.save(loaded)
+    assert client.data["transport:state:573001234567"].startswith(b"TFS")
+
+
+def test_in_memory_store_expires():
+    store = InMemoryStateStore(ttl_seconds=0.01)
+    store.save(_state())
+    time.sleep(0.02)
+    assert store.load("573001234567") is None
+
+
+def test_in_memory_store_drops_closed_and_expired_conversations():
+    store = InMemoryStateStore(ttl_seconds=0.05)
+    store.save(_state())
+    store.delete("573001234567")
+    assert store.sender_for("conv-9") is None
+
+    for i in range(50):
+        store.save(ConversationState(sender_id=f"57300{i}", conversation_id=f"conv-{i}"))
+    time.sleep(0.06)
+    # Saving another conversation sweeps the expired ones without them being looked up
+    store.save(_state())
+    assert len(store._states) == 1
+    assert len(store._conversations) == 1
+
+
+class FakeCrew:
+    def __init__(self, output):
+        self.output = output
+        self.tasks = []
+        self.agents = []
+
+    def kickoff(self, inputs):
+        return self.output
+
+
+def test_flow_resumes_from_stored_state(monkeypatch):
+    from transportation_flow import main
+
+    pool = CrewPool()
+    pool.register("extraction", lambda: FakeCrew('{"nombre_solicitante": "Juan Pérez"}'))
+    pool.register("conversation", lambda: FakeCrew("¿Me regala su número de celular?"))
+    pool.register("summary", lambda: FakeCrew("Resumen"))
+    monkeypatch.setattr(main, "get_crew_pool", lambda: pool)
+
+    store = InMemoryStateStore()
+    result, state = run_turn(main.TransportationSystemFlow, None, "573001234567", "1020304050")
+    assert result["status"] == "waiting_for_response"
+    store.save(state)
+
+    # A different worker picks the conversation up from the store
+    result, resumed = run_turn(
+        main.TransportationSystemFlow, store.load("573001234567"), "573001234567", "somos 2"
+    )
+    assert result["status"] == "waiting_for_response"
+    assert resumed.conversation_id == state.conversation_id
+    assert resumed.partial_request.cc_nit == "1020304050"
+    assert resumed.partial_request.cantidad_pasajeros == 2
+    assert [m["role"] for m in resumed.messages] == ["user", "assistant", "user", "assistant"]
+
+
+def test_first_turn_without_rule_matches_is_not_complete(monkeypatch):
+    from transportation_flow import main
+
+    pool = CrewPool()
+    pool.register("extraction", lambda: FakeCrew("{}"))
+    monkeypatch.setattr(main, "get_crew_pool", lambda: pool)
+
+    result, state = run_turn(
+        main.TransportationSystemFlow, None, "573001234567", "Buenas tardes, necesito un servicio de transporte"
+    )
+    assert result["status"] == "waiting_for_response"
+    assert "nombre_solicitante" in state.missing_fields
+
+
+def test_combined_mode_asks_from_the_extraction_call(monkeypatch):
+    from transportation_flow import main
+
+    pool = CrewPool()
+    pool.register("extract_and_ask", lambda: FakeCrew(
+        '{"fields": {"direccion_terminacion": "Aeropuerto El Dorado"}, '
+        '"question": "¿Desde dónde lo recogemos?"}'
+    ))
+    monkeypatch.setattr(main, "get_crew_pool", lambda: pool)
+    monkeypatch.setattr(main, "get_settings", lambda: Settings(question_mode="combined"))
+    get_extraction_cache().clear()
+
+    result, state = run_turn(
+        main.TransportationSystemFlow, None, "573001234567", "Necesito ir al aeropuerto El Dorado"
+    )
+    assert result["question"] == "¿Desde dónde lo recogemos?"
+    assert state.partial_request.direccion_terminacion == "Aeropuerto El Dorado"
+    # No conversation crew is registered, so one call did both jobs
+    assert pool.stats()["extract_and_ask"]["misses"] == 1
+
+
+def test_combined_mode_makes_no_extra_call_for_rule_and_cache_turns(monkeypatch):
+    from transportation_flow import main
+
+    pool = CrewPool()
+    pool.register("extract_and_ask", lambda: FakeCrew(
+        '{"fields": {"direccion_terminacion": "Aeropuerto El Dorado"}, '
+        '"question": "¿Desde dónde lo recogemos?"}'
+    ))
+    monkeypatch.setattr(main, "get_crew_pool", lambda: pool)
+    monkeypatch.setattr(main, "get_settings", lambda: Settings(question_mode="combined"))
+    get_extraction_cache().clear()
+
+    # Answered by rules alone, then twice the same message, the second time from the cache
+    turns = [
+        ("573001", "1020304050"),
+        ("573002", "Necesito ir al aeropuerto"),
+        ("573003", "Necesito ir al aeropuerto"),
+    ]
+    for sender_id, message in turns:
+        result, _ = run_turn(main.TransportationSystemFlow, None, sender_id, message)
+        assert result["status"] == "waiting_for_response"
+        assert result["question"]
+    # No conversation crew is registered: the only model call is the one extraction
+    stats = pool.stats()["extract_and_ask"]
+    assert stats["hits"] + stats["misses"] == 1
@@ -0,0 +1,154 @@
+#!/usr/bin/env python
+"""Tests for structured extraction output and the JSON salvager"""
+import json
+from types import SimpleNamespace
+
+import pytest
+
+from benchmarks.stub_ollama import StubOllamaServer, classify_prompt
+from transportation_flow.crews.ollama import get_http_client
+from transportation_flow.crews.pool import CrewPool, _register_default_crews
+from transportation_flow.extraction.structured import (
+    ExtractedFields, coerce_fields, parse_crew_output, salvage_json
+)
+from transportation_flow.metrics import EXTRACTION_PARSES, render_metrics
+from transportation_flow.service.conversations import run_turn
+from transportation_flow.settings import get_settings
+
+
+class CannedCrew:
+    def __init__(self, output):
+        self.output = output
+        self.tasks = []
+        self.agents = []
+
+    def kickoff(self, inputs):
+        return self.output
+
+
+def test_schema_is_derived_from_partial_request():
+    properties = ExtractedFields.model_json_schema()["properties"]
+    assert "cantidad_pasajeros" in properties
+    assert "raw_message" not in properties
+
+
+@pytest.mark.parametrize("output", [
+    '```json\n{"cc_nit": "1020304050", "cantidad_pasajeros": 4}\n```',
+    'Claro, aquí está: {"cc_nit": "1020304050", "cantidad_pasajeros": 4,} Saludos.',
+    '<think>El usuario da {cédula}...</think>{"cc_nit": "1020304050", "cantidad_pasajeros": 4}',
+    '{"cc_nit": "1020304050", "cantidad_pasajeros": 4, "direccion_inicio": "Calle 10 #',
+])
+def test_salvager_recovers_decorated_or_truncated_json(output):
+    data = salvage_json(output)
+    assert data["cc_nit"] == "1020304050"
+    assert data["cantidad_pasajeros"] == 4
+    assert "direccion_inicio" not in data
+
+
+def test_salvager_keeps_braces_inside_strings():
+    data = salvage_json('Resultado: {"caracteristicas": "silla {bebé}", "x": [1, {"y": 2}]} fin')
+    assert data == {"caracteristicas": "silla {bebé}", "x": [1, {"y": 2}]}
+
+    with pytest.raises(json.JSONDecodeError):
+        salvage_json("no hay datos")
+
+
+def test_parse_prefers_structured_output():
+    result = SimpleNamespace(json_dict={"cantidad_pasajeros": 2})
+    assert parse_crew_output(result) == ({"cantidad_pasajeros": 2}, "structured")
+    assert parse_crew_output('{"cantidad_pasajeros": 2}') == ({"cantidad_pasajeros": 2}, "json")
+    assert parse_crew_output('```{"cantidad_pasajeros": 2}```')[1] == "salvaged"
+
+
+def test_coerce_fields_fixes_types_and_drops_garbage():
+    fields = coerce_fields({
+        "cc_nit": 1020304050,
+        "cantidad_pasajeros": "3",
+        "equipaje_carga": "tal vez",
+        "direccion_inicio": "Calle 100 #15-20, Bogotá",
+        "otro": "x",
+    })
+    assert fields == {
+        "cc_nit": "1020304050",
+        "cantidad_pasajeros": 3,
+        "direccion_inicio": "Calle 100 #15-20, Bogotá",
+    }
+
+
+def test_flow_salvages_fenced_output(monkeypatch):
+    from transportation_flow import main
+
+    pool = CrewPool()
+    pool.register("extraction", lambda: CannedCrew(
+        'Aquí está el JSON:\n```json\n{"direccion_inicio": "Calle 100 #15-20, Bogotá"}\n```'
+    ))
+    monkeypatch.setattr(main, "get_crew_pool", lambda: pool)
+    main.get_extraction_cache().clear()
+    salvaged_before = EXTRACTION_PARSES.value(outcome="salvaged")
+
+    result, state = run_turn(
+        main.TransportationSystemFlow, None, "573001234567", "Me recogen en la Calle 100 #15-20"
+    )
+
+    assert result["status"] == "waiting_for_response"
+    assert state.partial_request.direccion_inicio == "Calle 100 #15-20, Bogotá"
+    assert EXTRACTION_PARSES.value(outcome="salvaged") == salvaged_before + 1
+    assert 'transport_extraction_parses_total{outcome="salvaged"}' in render_metrics()
+
+
+def _run_real_crews(monkeypatch, extraction_reply):
+    """One turn through the real extraction crew, against a stub model"""
+    from transportation_flow import main
+
+    formats = []
+
+    def record(request):
+        if request.url.path == "/api/generate":
+            formats.append(json.loads(request.read()).get("format"))
+
+    def reply(prompt):
+        return extraction_reply if classify_prompt(prompt) == "extraction" else "OK"
+
+    hooks = get_http_client().event_hooks["request"]
+    hooks.append(record)
+    try:
+        with StubOllamaServer(reply, latency=0.0) as stub:
+            monkeypatch.setenv("OLLAMA_API_BASE", stub.url)
+            monkeypatch.setenv("TRANSPORT_CREW_VERBOSE", "false")
+            get_settings.cache_clear()
+            assert get_settings().extraction_structured_output
+            pool = CrewPool()
+            _register_default_crews(pool)
+            monkeypatch.setattr(main, "get_crew_pool", lambda: pool)
+            main.get_extraction_cache().clear()
+            result, state = run_turn(
+                main.TransportationSystemFlow, None, "573001234567", "Me recogen en la casa de mi tía"
+            )
+            requests = stub.stats["requests"]
+    finally:
+        hooks.remove(record)
+        get_settings.cache_clear()
+    return result, state, requests, formats
+
+
+def test_structured_mode_salvages_malformed_output_in_one_call(monkeypatch):
+    salvaged_before = EXTRACTION_PARSES.value(outcome="salvaged")
+    result, state, requests, formats = _run_real_crews(
+        monkeypatch, 'Claro: {"direccion_inicio": "Calle 100 #15-20, Bogotá", "celular_contacto": "300'
+    )
+
+    assert result["status"] == "waiting_for_response"
+    assert state.partial_request.direccion_inicio == "Calle 100 #15-20, Bogotá"
+    # No hidden second call to convert the output
+    assert requests == 1
+    assert "direccion_inicio" in formats[0]["properties"]
+    assert EXTRACTION_PARSES.value(outcome="salvaged") == salvaged_before + 1
+
+
+def test_structured_mode_counts_output_that_cannot_be_read(monkeypatch):
+    failed_before = EXTRACTION_PARSES.value(outcome="failed")
+    result, _, requests, _ = _run_real_crews(monkeypatch, "No encontré datos en el mensaje")
+
+    assert result["status"] == "error"
+    assert requests == 1
+    assert EXTRACTION_PARSES.value(outcome="failed") == failed_before + 1
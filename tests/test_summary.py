@@ -0,0 +1,42 @@
+#!/usr/bin/env python
+"""Tests for the built-in summary renderer"""
+from transportation_flow.responses.summary import render_summary
+from transportation_flow.schemas.transportation_models import PartialRequest
+
+
+def test_summary_matches_crew_format():
+    request = PartialRequest(
+        nombre_solicitante="Juan Pérez",
+        cc_nit="1020304050",
+        celular_contacto="3001234567",
+        fecha_inicio_servicio="2025-07-15",
+        hora_inicio_servicio="15:00",
+        direccion_inicio="Calle 100 #15-20, Bogotá",
+        direccion_terminacion="Aeropuerto El Dorado",
+        cantidad_pasajeros=4,
+        equipaje_carga=True,
+    )
+    assert render_summary(request) == (
+        "¡Perfecto! He registrado su solicitud de servicio:\n"
+        "\n"
+        "📋 **Detalles del Servicio:**\n"
+        "- Cliente: Juan Pérez\n"
+        "- Fecha: 15 de julio de 2025\n"
+        "- Hora: 3:00 PM\n"
+        "- Recogida: Calle 100 #15-20, Bogotá\n"
+        "- Destino: Aeropuerto El Dorado\n"
+        "- Pasajeros: 4\n"
+        "- Equipaje: Sí\n"
+        "\n"
+        "Procederé a generar su cotización..."
+    )
+
+
+def test_free_text_and_missing_values():
+    summary = render_summary(PartialRequest(
+        fecha_inicio_servicio="mañana", hora_inicio_servicio="3am", equipaje_carga=False
+    ))
+    assert "- Fecha: mañana" in summary
+    assert "- Hora: 3am" in summary
+    assert "- Destino: Por confirmar" in summary
+    assert "- Equipaje: No" in summary